@@ -0,0 +1,57 @@
+# bench_bq_load_formats.py
+# Compares the CSV and Parquet load paths of GoogleCloudClient: serialization time and payload size offline,
+# plus the end-to-end load time when a table id and service account are given.
+# Run from the repository root:
+#   python -m benchmarks.bench_bq_load_formats [n_rows]
+#   python -m benchmarks.bench_bq_load_formats [n_rows] <project.dataset.table> <service_account.json>
+
+import io
+import sys
+import time
+
+from benchmarks.synthetic import make_task_details_frame
+
+
+def serialize_csv(df):
+    buffer = io.BytesIO()
+    df.to_csv(buffer, index=False)
+    return buffer.getvalue()
+
+
+def serialize_parquet(df):
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, engine='pyarrow', index=False)
+    return buffer.getvalue()
+
+
+def bench_serialization(df):
+    results = {}
+    for source_format, serialize in [('CSV', serialize_csv), ('PARQUET', serialize_parquet)]:
+        start = time.perf_counter()
+        payload = serialize(df)
+        elapsed = time.perf_counter() - start
+        results[source_format] = (elapsed, len(payload))
+        print(f"{source_format:<8} serialize {elapsed:7.3f}s  payload {len(payload) / 1e6:8.2f} MB")
+    return results
+
+
+def bench_load(df, table_id, service_account_path):
+    from classes.GoogleCloud import GoogleCloudClient
+    results = {}
+    for source_format in ['CSV', 'PARQUET']:
+        gcc = GoogleCloudClient(service_account_path=service_account_path, write_disposition='WRITE_TRUNCATE', source_format=source_format)
+        start = time.perf_counter()
+        gcc.write_to_bigquery_tables({"table_id": f"{table_id}_{source_format.lower()}", "data": df})
+        elapsed = time.perf_counter() - start
+        results[source_format] = elapsed
+        print(f"{source_format:<8} load      {elapsed:7.3f}s")
+    return results
+
+
+if __name__ == '__main__':
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    df = make_task_details_frame(n_rows)
+    print(f"{n_rows:,} task rows")
+    bench_serialization(df)
+    if len(sys.argv) > 3:
+        bench_load(df, sys.argv[2], sys.argv[3])
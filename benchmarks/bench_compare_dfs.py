@@ -0,0 +1,26 @@
+# bench_compare_dfs.py
+# Times compare_dfs at growing table sizes; a flat time per row means it scales linearly.
+# Run from the repository root: python -m benchmarks.bench_compare_dfs [n_rows ...]
+
+import sys
+import time
+
+from benchmarks.synthetic import make_change_frames
+from example_job.example import compare_dfs
+
+
+def bench_compare_dfs(sizes):
+    results = []
+    for n_rows in sizes:
+        df_new, df_stored = make_change_frames(n_rows)
+        start = time.perf_counter()
+        result = compare_dfs(df_new, df_stored, 'permalink_url', '2024-01-02 00:00:00')
+        elapsed = time.perf_counter() - start
+        results.append((n_rows, elapsed, result['change_status'].value_counts().to_dict()))
+        print(f"{n_rows:>10,} rows  {elapsed:8.3f}s  {elapsed / n_rows * 1e6:6.2f} us/row  {results[-1][2]}")
+    return results
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    bench_compare_dfs(sizes)
@@ -0,0 +1,52 @@
+# bench_date_transforms.py
+# Microbenchmark: the example job's old row-by-row date formatting and weeks bucketing (.apply per value)
+# vs the vectorized classes/Transforms.py functions, on the same task details frame.
+# Run from the repository root: python -m benchmarks.bench_date_transforms [n_rows]
+
+import datetime
+import sys
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import make_task_details_frame
+from classes.Transforms import to_datetime_columns, weeks_ago_buckets
+from example_job.example import date_cols_to_convert
+
+
+def transform_row_by_row(df):
+    # the example job's transforms before classes/Transforms.py, kept here as the baseline
+    def try_to_convert_to_formatted_date(x):
+        try:
+            return pd.to_datetime(x).strftime('%Y-%m-%d')
+        except:
+            return None
+    for col in date_cols_to_convert:
+        df[col] = df[col].apply(try_to_convert_to_formatted_date)
+    modified_at = df['modified_at'].apply(lambda x: datetime.datetime.strptime(x, '%Y-%m-%d'))
+    weeks = modified_at.apply(lambda x: (datetime.datetime.now() - x).days // 7)
+    df['last_update_n_weeks_ago'] = weeks.apply(lambda x: '4+' if x > 4 else str(x))
+    return df
+
+
+def transform_vectorized(df):
+    df = to_datetime_columns(df, date_cols_to_convert)
+    df['last_update_n_weeks_ago'] = weeks_ago_buckets(df['modified_at'])
+    return df
+
+
+def bench_date_transforms(n_rows):
+    df = make_task_details_frame(n_rows)
+    results = {}
+    for label, transform in [('row by row', transform_row_by_row), ('vectorized', transform_vectorized)]:
+        frame = df.copy()
+        start = time.perf_counter()
+        transform(frame)
+        elapsed = time.perf_counter() - start
+        results[label] = elapsed
+        print(f"{label:<12} {elapsed * 1000:10.1f} ms  {n_rows / elapsed:14,.0f} rows/s")
+    return results
+
+
+if __name__ == '__main__':
+    bench_date_transforms(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,40 @@
+# bench_flatten.py
+# Microbenchmark: AsanaClient.helper_flatten_dict + column selection vs TaskFlattener.flatten_batch,
+# both building the example job's cols DataFrame from raw task details.
+# Run from the repository root: python -m benchmarks.bench_flatten [n_tasks]
+
+import sys
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import make_tasks
+from classes.Asana import AsanaClient
+from classes.Flattener import TaskFlattener
+from example_job.example import cols
+
+
+def flatten_with_helper(tasks):
+    # AsanaClient without __init__, the helpers don't touch the API
+    client = AsanaClient.__new__(AsanaClient)
+    return pd.DataFrame(map(client.helper_clean_task_data, tasks)).reindex(columns=cols)
+
+
+def flatten_with_task_flattener(tasks):
+    return pd.DataFrame(TaskFlattener(cols).flatten_batch(tasks), columns=cols)
+
+
+def bench_flatten(n_tasks):
+    tasks = make_tasks(n_tasks)
+    results = {}
+    for label, flatten in [('helper_flatten_dict', flatten_with_helper), ('TaskFlattener', flatten_with_task_flattener)]:
+        start = time.perf_counter()
+        flatten(tasks)
+        elapsed = time.perf_counter() - start
+        results[label] = elapsed
+        print(f"{label:<20} {elapsed:7.3f}s  {n_tasks / elapsed:12,.0f} tasks/s")
+    return results
+
+
+if __name__ == '__main__':
+    bench_flatten(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,88 @@
+# bench_startup.py
+# Import time of the entry points and cold-start time of a small main() export, each in a fresh Python process.
+# The entry points should import without pandas, pyarrow, asana or the Google Cloud libraries (see classes/LazyImport.py),
+# and a run with a warm response cache should not call users/me, teams or projects again.
+# Run from the repository root: python -m benchmarks.bench_startup [--repeat 5] [--tasks 100]
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.mock_asana import MockAsanaServer, MockWorkspace
+
+# entry points timed by the benchmark (and the regression suite)
+ENTRY_POINTS = ['main', 'load_to_bq', 'sharded_runner', 'example_job.example', 'example_job.events']
+
+# modules that should only be imported once their code path runs
+HEAVY_MODULES = ['pandas', 'numpy', 'pyarrow', 'asana', 'google.cloud.bigquery']
+
+IMPORT_SCRIPT = """
+import json, sys, time
+started_at = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - started_at
+print(json.dumps({{'seconds': seconds, 'loaded': [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+MAIN_SCRIPT = """
+import main
+main.main('3Q Digital', {output_dir!r}, 'mock-token', cache_path={cache_path!r}, client_options={{'base_url': {base_url!r}}}, requests_per_minute=10**7)
+"""
+
+
+def time_import(module, repeat=5):
+    """
+    Best import time of module over repeat fresh processes, and the heavy modules the import pulled in.
+    """
+    timings = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-c', IMPORT_SCRIPT.format(module=module, heavy=HEAVY_MODULES)],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        timings.append(result['seconds'])
+    return min(timings), result['loaded']
+
+
+def time_cold_start(server, output_dir, cache_path):
+    """
+    Wall time of a fresh process running main() against the mock API (interpreter start, imports and the whole export),
+    and the number of API requests it made.
+    """
+    requests_before = server.request_count
+    started_at = time.perf_counter()
+    subprocess.run(
+        [sys.executable, '-c', MAIN_SCRIPT.format(output_dir=output_dir, cache_path=cache_path, base_url=server.base_url)],
+        capture_output=True, check=True,
+    )
+    return time.perf_counter() - started_at, server.request_count - requests_before
+
+
+def run_startup_benchmarks(n_tasks=100, repeat=5):
+    results = {}
+    for module in ENTRY_POINTS:
+        seconds, loaded = time_import(module, repeat)
+        results[f"import_{module}"] = seconds
+        if loaded:
+            print(f"import {module} loads {', '.join(loaded)} eagerly")
+    # the first run fills the response cache, the second one starts from it (no users/me, teams or projects calls)
+    with MockAsanaServer(MockWorkspace(n_tasks)) as server, tempfile.TemporaryDirectory() as output_dir:
+        cache_path = f"{output_dir}/cache.sqlite"
+        results['cold_start_main'], cold_requests = time_cold_start(server, output_dir, cache_path)
+        results['cold_start_main_warm_cache'], warm_requests = time_cold_start(server, output_dir, cache_path)
+    print(f"main() made {cold_requests} API requests with an empty cache and {warm_requests} with a warm one")
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time entry point imports and the cold start of a small export.")
+    parser.add_argument('--repeat', type=int, default=5, help="fresh processes per import (the best time is kept)")
+    parser.add_argument('--tasks', type=int, default=100, help="tasks in the mock workspace of the cold-start run")
+    args = parser.parse_args()
+
+    for name, seconds in run_startup_benchmarks(args.tasks, args.repeat).items():
+        print(f"{name:<40} {seconds:8.3f}s")
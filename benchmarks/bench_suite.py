@@ -0,0 +1,98 @@
+# bench_suite.py
+# Regression suite: times main() crawling the mock Asana API (benchmarks/mock_asana.py) and the CPU hot spots
+# (compare_dfs, helper_flatten_dict, load_schema_builder) on generated data, without network access,
+# plus the entry point import times and main() cold start from benchmarks/bench_startup.py.
+# Save a run with --save and compare later runs against it with --baseline; the exit code is 1 if anything got slower
+# than the baseline by more than --tolerance.
+# Run from the repository root: python -m benchmarks.bench_suite [--sizes 1k 10k] [--latency 0.01] [--save FILE] [--baseline FILE]
+
+import argparse
+import json
+import logging
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_startup import run_startup_benchmarks
+from benchmarks.mock_asana import WORKSPACE_SIZES, MockAsanaServer, MockWorkspace
+from benchmarks.synthetic import make_change_frames, make_task_details_frame, make_tasks
+from classes.Asana import AsanaClient
+from classes.GoogleCloud import GoogleCloudClient
+from example_job.example import compare_dfs
+import main
+
+
+def time_call(function, *args, repeat=1, **kwargs):
+    # best of repeat runs, so one noisy run doesn't read as a regression
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args, **kwargs)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def bench_main(n_tasks, latency, rate_limit_every, max_workers, **main_kwargs):
+    # a full crawl (teams, projects, tasks, details, flatten, csv) against the mock API, without rate limiting on our side
+    with MockAsanaServer(MockWorkspace(n_tasks), latency=latency, rate_limit_every=rate_limit_every, retry_after=0.1) as server:
+        with tempfile.TemporaryDirectory() as output_dir:
+            return time_call(
+                main.main, '3Q Digital', output_dir, 'mock-token', max_workers=max_workers,
+                requests_per_minute=10**7, client_options={'base_url': server.base_url}, **main_kwargs,
+            )
+
+
+def run_suite(sizes, latency, rate_limit_every, max_workers, n_rows):
+    results = {}
+    for size in sizes:
+        results[f"main_{size}"] = bench_main(WORKSPACE_SIZES[size], latency, rate_limit_every, max_workers)
+        # details 10 per batch API request, plus the subtask hierarchy
+        results[f"main_batch_subtasks_{size}"] = bench_main(WORKSPACE_SIZES[size], latency, rate_limit_every, max_workers, batch=True, subtasks=True)
+    df_new, df_stored = make_change_frames(n_rows)
+    results[f"compare_dfs_{n_rows}"] = time_call(compare_dfs, df_new, df_stored, 'permalink_url', '2024-01-02 00:00:00', repeat=3)
+    # clients without __init__, the helpers don't touch the APIs
+    asana_client = AsanaClient.__new__(AsanaClient)
+    tasks = make_tasks(n_rows // 10)
+    results[f"helper_flatten_dict_{len(tasks)}"] = time_call(lambda: [asana_client.helper_flatten_dict(task) for task in tasks], repeat=3)
+    gcc = GoogleCloudClient.__new__(GoogleCloudClient)
+    results[f"load_schema_builder_{n_rows}"] = time_call(gcc.load_schema_builder, make_task_details_frame(n_rows), repeat=3)
+    results.update(run_startup_benchmarks())
+    return results
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    regressions = []
+    for name, seconds in results.items():
+        previous = baseline.get(name)
+        change = f"{(seconds / previous - 1) * 100:+7.1f}%" if previous else "    new"
+        if previous and seconds > previous * (1 + tolerance):
+            regressions.append(name)
+            change += "  REGRESSION"
+        print(f"{name:<40} {seconds:9.3f}s  {change}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time the crawl against a mock Asana API and the CPU hot spots.")
+    parser.add_argument('--sizes', nargs='*', default=['1k'], choices=sorted(WORKSPACE_SIZES), help="mock workspace sizes to crawl")
+    parser.add_argument('--latency', type=float, default=0.01, help="seconds of latency per mock API request")
+    parser.add_argument('--rate-limit-every', type=int, default=0, help="answer every Nth mock request with a 429")
+    parser.add_argument('--max-workers', type=int, default=10)
+    parser.add_argument('--rows', type=int, default=100_000, help="rows for compare_dfs and load_schema_builder (a tenth as tasks for helper_flatten_dict)")
+    parser.add_argument('--save', help="write the results to this JSON file")
+    parser.add_argument('--baseline', help="compare against results saved by an earlier --save")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed slowdown against the baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    # the crawl logs progress at INFO, keep the suite output readable
+    logging.getLogger().setLevel(logging.WARNING)
+    results = run_suite(args.sizes, args.latency, args.rate_limit_every, args.max_workers, args.rows)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = compare_to_baseline(results, baseline, args.tolerance)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    sys.exit(1 if regressions else 0)
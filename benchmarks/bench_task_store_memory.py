@@ -0,0 +1,47 @@
+# bench_task_store_memory.py
+# Memory benchmark: holding task details as a list of raw dicts (like main.py's task_detail_list)
+# vs TaskStore columns, for all helper_flatten_dict columns and for the example job's cols.
+# Run from the repository root: python -m benchmarks.bench_task_store_memory [n_tasks]
+
+import sys
+import time
+import tracemalloc
+
+from benchmarks.synthetic import iter_tasks
+from classes.Asana import AsanaClient
+from classes.Flattener import TaskFlattener
+from classes.TaskStore import TaskStore
+from example_job.example import cols
+
+
+def hold_raw_dicts(n_tasks):
+    return list(iter_tasks(n_tasks))
+
+
+def hold_task_store(n_tasks):
+    # AsanaClient without __init__, the helpers don't touch the API
+    client = AsanaClient.__new__(AsanaClient)
+    return TaskStore(client.helper_clean_task_data).extend(iter_tasks(n_tasks))
+
+
+def hold_task_store_cols(n_tasks):
+    return TaskStore(TaskFlattener(cols).flatten, columns=cols).extend(iter_tasks(n_tasks))
+
+
+def bench_task_store_memory(n_tasks):
+    results = {}
+    for label, hold in [('list of dicts', hold_raw_dicts), ('TaskStore (all cols)', hold_task_store), ('TaskStore (cols)', hold_task_store_cols)]:
+        tracemalloc.start()
+        start = time.perf_counter()
+        held = hold(n_tasks)
+        elapsed = time.perf_counter() - start
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del held
+        results[label] = current
+        print(f"{label:<22} held {current / 2**20:8.1f} MiB  ({current / n_tasks:7,.0f} B/task)  peak {peak / 2**20:8.1f} MiB  {elapsed:6.2f}s")
+    return results
+
+
+if __name__ == '__main__':
+    bench_task_store_memory(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,434 @@
+# mock_asana.py
+# Local mock of the Asana API endpoints AsanaClient uses (including the batch API), serving a generated workspace
+# with custom fields and subtasks, with configurable latency, pagination and injected 429s.
+# Point a client at it with AsanaClient(token, client_options={'base_url': server.base_url}).
+# Run standalone from the repository root: python -m benchmarks.mock_asana [--tasks N] [--latency S] [--port P]
+
+import argparse
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.synthetic import compact, make_task
+
+# named workspace sizes for the benchmark suite
+WORKSPACE_SIZES = {'1k': 1_000, '10k': 10_000, '100k': 100_000}
+
+
+class MockWorkspace:
+    # the custom fields every generated task has (see synthetic.make_task)
+    CUSTOM_FIELDS = [
+        {'gid': '7001', 'name': 'Priority', 'resource_type': 'custom_field', 'resource_subtype': 'enum'},
+        {'gid': '7002', 'name': 'Estimate', 'resource_type': 'custom_field', 'resource_subtype': 'number'},
+    ]
+
+    def __init__(self, n_tasks, name='3Q Digital', n_teams=20, tasks_per_project=100, seed=0, subtask_every=10, subtasks_per_task=2):
+        """
+        A generated workspace of n_tasks tasks, spread over projects of tasks_per_project tasks and n_teams teams.
+        Every subtask_every-th task has subtasks_per_task subtasks, and the first of those has one subtask of its own.
+        Task details are generated on request (deterministically from the seed), so even 100k tasks use little memory.
+        """
+        self.n_tasks = n_tasks
+        self.subtask_every = subtask_every
+        self.subtasks_per_task = subtasks_per_task
+        self.name = name
+        self.gid = '1'
+        self.seed = seed
+        self.tasks_per_project = tasks_per_project
+        n_projects = max(1, math.ceil(n_tasks / tasks_per_project))
+        self.teams = [compact('team', 100 + t, f"Team {t}") for t in range(min(n_teams, n_projects))]
+        self.projects = [
+            {**compact('project', 200000 + p, f"Project {p}"), 'team': self.teams[p % len(self.teams)]}
+            for p in range(n_projects)
+        ]
+        self.projects_by_gid = {project['gid']: p for p, project in enumerate(self.projects)}
+        # events API log, appended to by touch; a sync token is a position in it
+        self.events = []
+        self.deleted = set()
+        self.events_lock = threading.Lock()
+
+
+    def me(self):
+        return {
+            'gid': '42', 'name': 'Mock User', 'resource_type': 'user',
+            'workspaces': [compact('workspace', self.gid, self.name)],
+        }
+
+
+    def team_projects(self, team_gid):
+        return [project for project in self.projects if project['team']['gid'] == team_gid]
+
+
+    def project_task_indexes(self, project_gid):
+        p = self.projects_by_gid.get(project_gid)
+        if p is None:
+            return range(0)
+        return range(p * self.tasks_per_project, min((p + 1) * self.tasks_per_project, self.n_tasks))
+
+
+    def task(self, i):
+        """
+        Build the detail of task i (as tasks.find_by_id returns it, without the client-side project/team enrichment).
+        """
+        project = self.projects[i // self.tasks_per_project]
+        task = make_task(i, random.Random(self.seed * 1_000_003 + i), compact('project', project['gid'], project['name']), project['team']['name'])
+        task['workspace'] = compact('workspace', self.gid, self.name)
+        task['num_subtasks'] = len(self.subtask_gids(task['gid']))
+        self.helper_add_field_subtypes(task)
+        del task['project_name'], task['team_name']
+        return task
+
+
+    def subtask_gids(self, task_gid):
+        # subtasks of task i are 5000000 + i * 10 + s, the first one has subtask 6000000 + i * 10
+        gid = int(task_gid)
+        if 1000000 <= gid < 1000000 + self.n_tasks and self.subtask_every and (gid - 1000000) % self.subtask_every == 0:
+            return [str(5000000 + (gid - 1000000) * 10 + s) for s in range(self.subtasks_per_task)]
+        if 5000000 <= gid < 6000000 and gid % 10 == 0:
+            return [str(gid + 1000000)]
+        return []
+
+
+    def subtask(self, task_gid):
+        """
+        Build the detail of a subtask: a task outside any project, with its parent task.
+        """
+        gid = int(task_gid)
+        parent_gid = str(1000000 + (gid - 5000000) // 10) if gid < 6000000 else str(gid - 1000000)
+        if task_gid not in self.subtask_gids(parent_gid) or self.task_by_gid(parent_gid) is None:
+            return None
+        task = make_task(gid, random.Random(self.seed * 1_000_003 + gid))
+        task.update({
+            'gid': task_gid, 'name': f"Subtask {task_gid}", 'parent': compact('task', parent_gid, f"Task {parent_gid}"),
+            'permalink_url': f"https://app.asana.com/0/0/{task_gid}", 'projects': [], 'memberships': [],
+            'workspace': compact('workspace', self.gid, self.name), 'num_subtasks': len(self.subtask_gids(task_gid)),
+        })
+        self.helper_add_field_subtypes(task)
+        del task['project_name'], task['team_name']
+        return task
+
+
+    def helper_add_field_subtypes(self, task):
+        # the API sends resource_subtype next to the older type key of every custom field
+        for field in task['custom_fields']:
+            field['resource_subtype'] = field['type']
+
+
+    def task_by_gid(self, task_gid):
+        """
+        Get the detail of a task or subtask by gid (None if there is no such task).
+        """
+        if not task_gid.isdigit():
+            return None
+        if int(task_gid) >= 5000000:
+            return self.subtask(task_gid)
+        i = self.task_index(task_gid)
+        return self.task(i) if i is not None else None
+
+
+    def touch(self, i, action='changed'):
+        """
+        Record an event on task i (e.g. 'changed' or 'deleted'), as seen by the events API of its project.
+        """
+        project = self.projects[i // self.tasks_per_project]
+        with self.events_lock:
+            if action == 'deleted':
+                self.deleted.add(i)
+            self.events.append({
+                'action': action, 'type': 'task',
+                'resource': {**compact('task', 1000000 + i, f"Task {i}"), 'resource_subtype': 'default_task'},
+                'parent': compact('project', project['gid'], project['name']),
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime()),
+            })
+
+
+    def task_index(self, task_gid):
+        i = int(task_gid) - 1000000 if task_gid.isdigit() else -1
+        return i if 0 <= i < self.n_tasks and i not in self.deleted else None
+
+
+class MockAsanaServer:
+    def __init__(self, workspace, latency=0.0, rate_limit_every=0, retry_after=1.0, host='127.0.0.1', port=0):
+        """
+        Serve workspace over HTTP on host:port (port 0 picks a free one) from a background thread.
+        Every request waits latency seconds, and with rate_limit_every=N every Nth request is answered
+        with a 429 and a Retry-After of retry_after seconds.
+        """
+        self.workspace = workspace
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.host = host
+        self.port = port
+        self.request_count = 0
+        self.rate_limited_count = 0
+        self.lock = threading.Lock()
+        self.httpd = None
+
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}/api/1.0"
+
+
+    def start(self):
+        # the Asana client authenticates through requests-oauthlib, which refuses plain http unless told otherwise
+        os.environ.setdefault('OAUTHLIB_INSECURE_TRANSPORT', '1')
+        self.httpd = ThreadingHTTPServer((self.host, self.port), MockAsanaHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.mock = self
+        self.port = self.httpd.server_address[1]
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+
+    def __enter__(self):
+        return self.start()
+
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+    def should_rate_limit(self):
+        with self.lock:
+            self.request_count += 1
+            limited = bool(self.rate_limit_every) and self.request_count % self.rate_limit_every == 0
+            if limited:
+                self.rate_limited_count += 1
+            return limited
+
+
+class MockAsanaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, with Nagle's algorithm every keep-alive response waited for a delayed ACK
+    disable_nagle_algorithm = True
+
+    # events returned per events API page (has_more is set when there are more)
+    MAX_EVENTS = 1000
+
+    # (method, path pattern, handler method name)
+    ROUTES = [
+        ('GET', r'/users/me', 'get_me'),
+        ('GET', r'/organizations/(\d+)/teams', 'get_teams'),
+        ('GET', r'/teams/(\d+)/projects', 'get_team_projects'),
+        ('GET', r'/workspaces/(\d+)/projects', 'get_workspace_projects'),
+        ('GET', r'/projects/(\d+)/tasks', 'get_project_tasks'),
+        ('GET', r'/tasks', 'get_tasks'),
+        ('GET', r'/tasks/(\d+)', 'get_task'),
+        ('GET', r'/tasks/(\d+)/subtasks', 'get_subtasks'),
+        ('GET', r'/workspaces/(\d+)/custom_fields', 'get_custom_fields'),
+        ('GET', r'/events', 'get_events'),
+        ('POST', r'/batch', 'post_batch'),
+    ]
+
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+
+    def dispatch(self, method):
+        mock = self.server.mock
+        url = urlparse(self.path)
+        self.query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get('Content-Length', 0))
+        self.body = json.loads(self.rfile.read(length)) if length else {}
+        self.batch_responses = None
+        if mock.latency:
+            time.sleep(mock.latency)
+        if mock.should_rate_limit():
+            return self.send_json(429, {'errors': [{'message': 'You have made too many requests recently.'}]}, {'Retry-After': str(mock.retry_after)})
+        self.route(method, re.sub(r'^/api/1\.0', '', url.path))
+
+
+    def route(self, method, path):
+        for route_method, pattern, handler_name in self.ROUTES:
+            match = re.fullmatch(pattern, path)
+            if route_method == method and match:
+                return getattr(self, handler_name)(self.server.mock.workspace, *match.groups())
+        self.send_json(404, {'errors': [{'message': f"Unknown path {path}"}]})
+
+
+    def get_me(self, workspace):
+        self.send_json(200, {'data': workspace.me()})
+
+
+    def get_teams(self, workspace, workspace_gid):
+        self.send_page(workspace.teams if workspace_gid == workspace.gid else [])
+
+
+    def get_team_projects(self, workspace, team_gid):
+        self.send_page([compact('project', project['gid'], project['name']) for project in workspace.team_projects(team_gid)])
+
+
+    def get_workspace_projects(self, workspace, workspace_gid):
+        projects = workspace.projects if workspace_gid == workspace.gid else []
+        if 'opt_fields' not in self.query:
+            projects = [compact('project', project['gid'], project['name']) for project in projects]
+        self.send_page(projects, selectable=True)
+
+
+    def get_project_tasks(self, workspace, project_gid):
+        self.send_page(self.helper_task_listing(workspace, workspace.project_task_indexes(project_gid)), selectable=True)
+
+
+    def get_tasks(self, workspace):
+        # the generic tasks endpoint, filtered by project and modified_since
+        tasks = self.helper_task_listing(workspace, workspace.project_task_indexes(self.query.get('project', '')), full=True)
+        modified_since = self.query.get('modified_since')
+        if modified_since:
+            tasks = [task for task in tasks if task['modified_at'] >= modified_since]
+        self.send_page(tasks, selectable=True)
+
+
+    def get_task(self, workspace, task_gid):
+        task = workspace.task_by_gid(task_gid)
+        if task is None:
+            return self.send_json(404, {'errors': [{'message': f"Unknown task {task_gid}"}]})
+        self.send_json(200, {'data': self.helper_select_fields(task)})
+
+
+    def get_subtasks(self, workspace, task_gid):
+        if workspace.task_by_gid(task_gid) is None:
+            return self.send_json(404, {'errors': [{'message': f"Unknown task {task_gid}"}]})
+        subtasks = [workspace.subtask(gid) for gid in workspace.subtask_gids(task_gid)]
+        if 'opt_fields' not in self.query:
+            subtasks = [compact('task', subtask['gid'], subtask['name']) for subtask in subtasks]
+        self.send_page(subtasks, selectable=True)
+
+
+    def get_custom_fields(self, workspace, workspace_gid):
+        self.send_page(workspace.CUSTOM_FIELDS if workspace_gid == workspace.gid else [], selectable=True)
+
+
+    def post_batch(self, workspace):
+        # every action is routed like a request of its own, its response is collected instead of sent
+        actions = (self.body.get('data') or {}).get('actions') or []
+        if len(actions) > 10:
+            return self.send_json(400, {'errors': [{'message': 'A batch request can have at most 10 actions.'}]})
+        responses = []
+        for action in actions:
+            url = urlparse(action['relative_path'])
+            options = action.get('options') or {}
+            self.query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            if options.get('fields'):
+                self.query['opt_fields'] = ','.join(options['fields'])
+            for key in ('limit', 'offset'):
+                if key in options:
+                    self.query[key] = str(options[key])
+            self.batch_responses = []
+            self.route(action.get('method', 'get').upper(), url.path)
+            responses.extend(self.batch_responses)
+        self.batch_responses = None
+        self.send_json(200, {'data': responses})
+
+
+    def get_events(self, workspace):
+        # events of a project since the sync token; a missing or unknown token gets a 412 with a fresh one, like Asana
+        with workspace.events_lock:
+            events = list(workspace.events)
+        sync = self.query.get('sync', '')
+        fresh_sync = f"sync-{len(events)}"
+        if not re.fullmatch(r'sync-\d+', sync) or int(sync[5:]) > len(events):
+            return self.send_json(412, {'sync': fresh_sync, 'errors': [{'message': 'Sync token invalid or too old.'}]})
+        resource = self.query.get('resource')
+        position = int(sync[5:])
+        page = [event for event in events[position:position + self.MAX_EVENTS] if event['parent']['gid'] == resource]
+        next_position = min(position + self.MAX_EVENTS, len(events))
+        self.send_json(200, {'data': page, 'sync': f"sync-{next_position}", 'has_more': next_position < len(events)})
+
+
+    def helper_task_listing(self, workspace, task_indexes, full=False):
+        # compact tasks, unless fields were asked for (then they are selected from the full detail)
+        if full or 'opt_fields' in self.query:
+            return [workspace.task(i) for i in task_indexes]
+        return [compact('task', 1000000 + i, f"Task {i}") for i in task_indexes]
+
+
+    def send_page(self, items, selectable=False):
+        limit = int(self.query.get('limit', 100))
+        offset = int(self.query.get('offset', 0))
+        page = items[offset:offset + limit]
+        if selectable:
+            page = [self.helper_select_fields(item) for item in page]
+        next_page = None
+        if offset + limit < len(items):
+            next_page = {'offset': str(offset + limit), 'path': self.path, 'uri': self.path}
+        self.send_json(200, {'data': page, 'next_page': next_page})
+
+
+    def send_json(self, status, body, headers=None):
+        if self.batch_responses is not None:
+            return self.batch_responses.append({'status_code': status, 'headers': headers or {}, 'body': body})
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+    def helper_select_fields(self, item):
+        # apply opt_fields like Asana does: the gid is always kept, dotted fields select inside nested objects
+        fields = self.query.get('opt_fields')
+        if not fields:
+            return item
+        tree = {}
+        for field in fields.split(','):
+            node = tree
+            for part in field.split('.'):
+                node = node.setdefault(part, {})
+        return self.helper_select_tree(item, tree)
+
+
+    def helper_select_tree(self, value, tree):
+        if isinstance(value, list):
+            return [self.helper_select_tree(item, tree) for item in value]
+        if not isinstance(value, dict) or not tree:
+            return value
+        selected = {'gid': value['gid']} if 'gid' in value else {}
+        for key, subtree in tree.items():
+            if key in value:
+                selected[key] = self.helper_select_tree(value[key], subtree)
+        return selected
+
+
+    def log_message(self, format, *args):
+        # keep benchmark output clean
+        pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve a generated workspace on a local mock of the Asana API.")
+    parser.add_argument('--tasks', type=int, default=WORKSPACE_SIZES['1k'], help="number of tasks in the workspace")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds every request waits")
+    parser.add_argument('--rate-limit-every', type=int, default=0, help="answer every Nth request with a 429")
+    parser.add_argument('--retry-after', type=float, default=1.0, help="Retry-After seconds of injected 429s")
+    parser.add_argument('--port', type=int, default=8080)
+    args = parser.parse_args()
+
+    server = MockAsanaServer(MockWorkspace(args.tasks), args.latency, args.rate_limit_every, args.retry_after, port=args.port).start()
+    print(f"Serving {args.tasks} tasks at {server.base_url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,137 @@
+# synthetic.py - generated data for the benchmarks (no Asana or BigQuery access needed)
+
+import datetime
+import random
+
+import pandas as pd
+
+
+def make_change_frames(n_rows, seed=0):
+    """
+    Build a (new data, stored table) pair of dataframes shaped like the example job's output.
+    About 90% of ids exist in both (5% of those with a newer modified_at), 5% are new and 5% deleted.
+    """
+    rng = random.Random(seed)
+    start = datetime.date(2023, 1, 1)
+    n_deleted = n_rows // 20
+    stored = pd.DataFrame({
+        'gid': [str(1000000 + i) for i in range(n_rows)],
+        'permalink_url': [f"https://app.asana.com/0/0/{1000000 + i}/f" for i in range(n_rows)],
+        'name': [f"Task {i}" for i in range(n_rows)],
+        'modified_at': [(start + datetime.timedelta(days=rng.randrange(365))).strftime('%Y-%m-%d') for _ in range(n_rows)],
+        'change_status': 'existing',
+        'last_change_seen': '2023-01-01 00:00:00',
+    })
+    new = stored.iloc[n_deleted:, :4].copy()
+    updated = new.sample(frac=0.05, random_state=seed).index
+    new.loc[updated, 'modified_at'] = '2024-01-01'
+    added = pd.DataFrame({
+        'gid': [str(9000000 + i) for i in range(n_deleted)],
+        'permalink_url': [f"https://app.asana.com/0/0/{9000000 + i}/f" for i in range(n_deleted)],
+        'name': [f"New task {i}" for i in range(n_deleted)],
+        'modified_at': '2024-01-01',
+    })
+    return pd.concat([new, added], ignore_index=True), stored
+
+
+def make_task_details_frame(n_rows, seed=0):
+    """
+    Build a flattened task details dataframe with the example job's columns, including multiline notes.
+    """
+    rng = random.Random(seed)
+    start = datetime.datetime(2023, 1, 1)
+    teams = [f"Team {i}" for i in range(20)]
+    people = [f"Person {i}" for i in range(200)]
+    return pd.DataFrame({
+        'gid': [str(1000000 + i) for i in range(n_rows)],
+        'assignee_gid': [str(rng.randrange(200)) for _ in range(n_rows)],
+        'assignee_name': [rng.choice(people) for _ in range(n_rows)],
+        'workspace_gid': '1',
+        'workspace_name': '3Q Digital',
+        'team_name': [rng.choice(teams) for _ in range(n_rows)],
+        'projects_gid': [str(rng.randrange(2000)) for _ in range(n_rows)],
+        'projects_name': [f"Project {rng.randrange(2000)}" for _ in range(n_rows)],
+        'name': [f"Task {i}" for i in range(n_rows)],
+        'notes': [f"Line one of task {i}, with a comma\nline two \"quoted\"\n" * rng.randrange(1, 4) for i in range(n_rows)],
+        'permalink_url': [f"https://app.asana.com/0/0/{1000000 + i}/f" for i in range(n_rows)],
+        'completed': [rng.random() < 0.5 for _ in range(n_rows)],
+        'modified_at': [(start + datetime.timedelta(minutes=rng.randrange(525600))).strftime('%Y-%m-%d') for _ in range(n_rows)],
+        'created_at': [(start + datetime.timedelta(minutes=rng.randrange(525600))).strftime('%Y-%m-%d') for _ in range(n_rows)],
+        'completed_at': None,
+        'due_on': None,
+        'followers_gid': [str(rng.randrange(200)) for _ in range(n_rows)],
+        'followers_name': [rng.choice(people) for _ in range(n_rows)],
+        'memberships_section_gid': [str(rng.randrange(50)) for _ in range(n_rows)],
+        'memberships_section_name': [f"Section {rng.randrange(50)}" for _ in range(n_rows)],
+        'resource_type': 'task',
+    })
+
+
+def make_tasks(n_tasks, seed=0):
+    """
+    Build task detail dicts shaped like Asana's tasks.find_by_id response (plus the project_name/team_name enrichment).
+    """
+    return list(iter_tasks(n_tasks, seed))
+
+
+def iter_tasks(n_tasks, seed=0):
+    """
+    Generate the make_tasks task details one at a time, like a streamed fetch.
+    """
+    rng = random.Random(seed)
+    for i in range(n_tasks):
+        yield make_task(i, rng)
+
+
+def compact(resource_type, gid, name):
+    return {'gid': str(gid), 'name': name, 'resource_type': resource_type}
+
+
+def make_task(i, rng, project=None, team_name=None):
+    """
+    Build task detail number i, drawing its random fields from rng.
+    project (a compact project dict) and team_name are random unless given.
+    """
+    start = datetime.datetime(2023, 1, 1)
+
+    def timestamp():
+        return (start + datetime.timedelta(minutes=rng.randrange(525600))).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+    project = project or compact('project', 2000 + rng.randrange(2000), f"Project {i % 2000}")
+    return {
+        'gid': str(1000000 + i),
+        'assignee': compact('user', rng.randrange(200), f"Person {rng.randrange(200)}") if rng.random() < 0.8 else None,
+        'assignee_status': 'upcoming',
+        'completed': rng.random() < 0.5,
+        'completed_at': timestamp() if rng.random() < 0.5 else None,
+        'created_at': timestamp(),
+        'due_at': None,
+        'due_on': None,
+        'followers': [compact('user', rng.randrange(200), f"Person {rng.randrange(200)}") for _ in range(rng.randrange(1, 5))],
+        'hearted': False,
+        'hearts': [],
+        'liked': False,
+        'likes': [],
+        'memberships': [{'project': project, 'section': compact('section', 5000 + rng.randrange(50), f"Section {rng.randrange(50)}")}],
+        'modified_at': timestamp(),
+        'name': f"Task {i}",
+        'notes': f"Notes for task {i}\nsecond line",
+        'num_hearts': 0,
+        'num_likes': 0,
+        'parent': None,
+        'permalink_url': f"https://app.asana.com/0/{project['gid']}/{1000000 + i}",
+        'projects': [project],
+        'resource_type': 'task',
+        'start_on': None,
+        'tags': [],
+        'resource_subtype': 'default_task',
+        'workspace': compact('workspace', 1, '3Q Digital'),
+        'custom_fields': [
+            {'gid': '7001', 'name': 'Priority', 'resource_type': 'custom_field', 'type': 'enum',
+             'enum_value': compact('enum_option', 7100 + rng.randrange(3), rng.choice(['Low', 'Medium', 'High'])), 'display_value': None},
+            {'gid': '7002', 'name': 'Estimate', 'resource_type': 'custom_field', 'type': 'number',
+             'number_value': rng.randrange(1, 40), 'display_value': None},
+        ],
+        'project_name': project['name'],
+        'team_name': team_name or f"Team {rng.randrange(20)}",
+    }
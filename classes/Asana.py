@@ -1,16 +1,66 @@
 # Asana.py
 
-import asana
+import functools
+import hashlib
 import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from classes.Flattener import CustomFieldFlattener
+from classes.Instrumentation import Metrics, endpoint_from_url
+from classes.LazyImport import lazy_import
+from classes.RateLimiter import TokenBucket
+
+asana = lazy_import('asana')
+requests = lazy_import('requests')
 
 class AsanaClient:
-    def __init__(self, personal_access_token):
+    # largest page size accepted by Asana's collection endpoints
+    MAX_PAGE_SIZE = 100
+    # most actions accepted by Asana's batch API in one request
+    MAX_BATCH_ACTIONS = 10
+
+    def __init__(self, personal_access_token, max_workers=10, requests_per_minute=1500, max_retries=5, cache=None, metrics=None, client_options=None, rate_limiter=None):
         """
         Initialize an Asana client with the provided personal access token.
+        max_workers and requests_per_minute bound the concurrent task detail fetcher.
+        cache (e.g. a ResponseCache) serves users.me, teams, projects and unchanged task details from disk.
+        metrics (a Metrics, shared with GoogleCloudClient) records every API request; a new one is used if not given.
+        client_options are set on the underlying asana.Client (e.g. {'base_url': ...} to use a mock API).
+        rate_limiter replaces the client's own TokenBucket (e.g. a SharedTokenBucket shared by several processes).
+        Every request of the client goes through the rate limiter, including listings and their pages.
         """
         self.client = asana.Client.access_token(personal_access_token)
-        self.me = self.client.users.me()
-        self.workspace_id_list = self.me['workspaces']
+        self.client.options.update(client_options or {})
+        self.metrics = metrics or Metrics()
+        # every response of the underlying requests session (including retried and rate limited ones) is recorded
+        self.client.session.hooks['response'].append(self.helper_record_response)
+        # nested pools (e.g. subtask listings feeding batched detail fetches) keep up to twice max_workers connections busy
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max_workers * 2)
+        self.client.session.mount('https://', adapter)
+        self.client.session.mount('http://', adapter)
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.rate_limiter = rate_limiter or TokenBucket(requests_per_minute)
+        # the rate limiter sits in front of the requests session, so no call (and no page or retry of one) can bypass it
+        self.client.session.request = self.helper_rate_limited(self.client.session.request)
+        self.cache = cache
+        # users.me is cached per token, without storing the token itself
+        self.token_key = hashlib.sha256(personal_access_token.encode()).hexdigest()[:16]
+
+
+    @functools.cached_property
+    def me(self):
+        """
+        The token's user (users.me), fetched on first use instead of when the client is created, and kept in the cache
+        across runs, so a run with a warm cache starts without a blocking API call.
+        """
+        return self.helper_cached('me', self.token_key, lambda: self.helper_call_with_rate_limit(self.client.users.me))
+
+
+    @functools.cached_property
+    def workspace_id_list(self):
+        return self.me['workspaces']
 
 
     def get_workspace_id_by_workspace_name(self, workspace_name):
@@ -23,18 +73,33 @@ class AsanaClient:
         return None
 
 
-    def get_projects_from_workspace(self, workspace_id):
+    def get_projects_from_workspace(self, workspace_id, opt_fields=None):
         """
         Get the projects within a given workspace.
         """
-        return self.client.projects.find_by_workspace(workspace_id, {'archived': False})
+        options = {'fields': opt_fields, 'page_size': self.MAX_PAGE_SIZE} if opt_fields else {}
+        return self.client.projects.find_by_workspace(workspace_id, {'archived': False}, **options)
+
+
+    def get_projects_with_team_from_workspace(self, workspace_id):
+        """
+        Get every project of a workspace with its team_name from one paginated listing
+        (the same shape get_projects_for_team yields, without a projects call per team).
+        """
+        def fetch():
+            projects = self.get_projects_from_workspace(workspace_id, opt_fields=['name', 'team.name'])
+            return [
+                {'gid': project['gid'], 'name': project['name'], 'team_name': (project.get('team') or {}).get('name')}
+                for project in projects
+            ]
+        return self.helper_cached('projects', f"workspace:{workspace_id}", fetch)
 
 
     def get_projects_from_team(self, team_id):
         """
         Get the projects within a given team.
         """
-        return self.client.projects.find_by_team(team_id, {'archived': False})
+        return self.helper_cached('projects', team_id, lambda: list(self.client.projects.find_by_team(team_id, {'archived': False})))
 
 
     def get_teams(self, workspace_id):
@@ -43,22 +108,304 @@ class AsanaClient:
         """
         # teams = self.get_teams(workspace_id)
         # return [team for team in teams]
-        return self.client.teams.find_by_organization(workspace_id, {'archived': False})
+        return self.helper_cached('teams', workspace_id, lambda: list(self.client.teams.find_by_organization(workspace_id, {'archived': False})))
 
 
-    def list_tasks_by_project(self, project_id):
+    def list_tasks_by_project(self, project_id, opt_fields=None, modified_since=None):
         """
         List the tasks within a given project.
+        If opt_fields is given, those fields are returned on every task in pages of the maximum size,
+        so no separate get_task_details_by_gid call is needed per task.
+        If modified_since (ISO 8601) is given, only tasks modified since then are returned.
         """
-        tasks = self.client.tasks.find_by_project(project_id, {'archived': False})
+        options = {'fields': opt_fields, 'page_size': self.MAX_PAGE_SIZE} if opt_fields else {}
+        if modified_since:
+            # the project tasks endpoint has no modified_since filter, the generic tasks endpoint does
+            tasks = self.client.tasks.find_all({'project': project_id, 'modified_since': modified_since}, **options)
+        else:
+            tasks = self.client.tasks.find_by_project(project_id, {'archived': False}, **options)
         return [task for task in tasks]
 
 
-    def get_task_details_by_gid(self, task_gid):
+    def get_task_details_by_gid(self, task_gid, modified_at=None):
         """
         Get the details of a task with a given task ID.
+        With a cache and the task's modified_at (from the listing), an unchanged task is served from the cache.
+        """
+        if modified_at is None:
+            return self.helper_call_with_rate_limit(self.client.tasks.find_by_id, task_gid)
+        return self.helper_cached('task', task_gid, lambda: self.helper_call_with_rate_limit(self.client.tasks.find_by_id, task_gid), version=modified_at)
+
+
+    def get_task_details_concurrently(self, task_list, max_workers=None, enrich_keys=('project_name', 'team_name')):
+        """
+        Get the details of every task in task_list using a bounded pool of worker threads.
+        Details are yielded as they complete (not in input order), with enrich_keys copied over from the listed task.
+        """
+        fetch = lambda task: self.get_task_details_by_gid(task['gid'], task.get('modified_at'))
+        for task, task_detail in self.helper_map_bounded(fetch, task_list, max_workers or self.max_workers):
+            for key in enrich_keys:
+                if key in task:
+                    task_detail[key] = task[key]
+            yield task_detail
+
+
+    def get_task_details_batched(self, task_list, opt_fields=None, max_workers=None, enrich_keys=('project_name', 'team_name', 'subtask_level')):
+        """
+        Get the details of every task in task_list like get_task_details_concurrently, but MAX_BATCH_ACTIONS tasks
+        per request through the batch API, with up to max_workers batch requests in flight.
+        Tasks that no longer exist (or are no longer visible) are skipped. Unchanged tasks come from the cache as usual.
+        """
+        chunks = self.helper_chunk_iterable(task_list, self.MAX_BATCH_ACTIONS)
+        fetch = lambda chunk: self.helper_fetch_task_batch(chunk, opt_fields)
+        for chunk, task_details in self.helper_map_bounded(fetch, chunks, max_workers or self.max_workers):
+            for task, task_detail in zip(chunk, task_details):
+                if task_detail is None:
+                    continue
+                for key in enrich_keys:
+                    if key in task:
+                        task_detail[key] = task[key]
+                yield task_detail
+
+
+    def get_subtasks_batched(self, task_list, opt_fields=None, max_depth=5, max_workers=None, enrich_keys=('project_name', 'team_name')):
+        """
+        List the subtasks of every task in task_list, and theirs, down to max_depth levels, MAX_BATCH_ACTIONS parents
+        per batch API request. Each subtask has opt_fields (compact without them) plus its parent, its subtask_level
+        (1 for a direct subtask) and the enrich_keys of its top-level task.
+        Tasks with a known num_subtasks of 0 are not listed.
+        """
+        fields = list(opt_fields or ['name', 'modified_at']) + ['parent.name', 'num_subtasks']
+        parents = (task for task in task_list if task.get('num_subtasks') != 0)
+        for level in range(1, max_depth + 1):
+            children = []
+            chunks = self.helper_chunk_iterable(parents, self.MAX_BATCH_ACTIONS)
+            fetch = lambda chunk: self.helper_list_subtask_batch(chunk, fields)
+            for chunk, subtask_lists in self.helper_map_bounded(fetch, chunks, max_workers or self.max_workers):
+                for parent, subtasks in zip(chunk, subtask_lists):
+                    for subtask in subtasks:
+                        subtask['subtask_level'] = level
+                        for key in enrich_keys:
+                            if key in parent:
+                                subtask[key] = parent[key]
+                        yield subtask
+                        if subtask.get('num_subtasks') != 0:
+                            children.append(subtask)
+            if not children:
+                return
+            parents = children
+
+
+    def get_task_details_with_subtasks(self, task_detail_list, opt_fields=None, max_depth=5, max_workers=None):
+        """
+        Yield every task detail of task_detail_list, then the details of their subtasks (see get_subtasks_batched).
+        Only the gid, num_subtasks and enrichment of each task are kept until the subtasks are listed, so
+        task_detail_list can be a lazy generator. Without opt_fields the listed subtasks are detailed through the batch API.
+        """
+        parents = []
+        for task_detail in task_detail_list:
+            task_detail['subtask_level'] = 0
+            parents.append({
+                key: task_detail[key] for key in ('gid', 'num_subtasks', 'project_name', 'team_name') if key in task_detail
+            })
+            yield task_detail
+        subtasks = self.get_subtasks_batched(parents, opt_fields, max_depth, max_workers)
+        if opt_fields:
+            yield from subtasks
+        else:
+            yield from self.get_task_details_batched(subtasks, max_workers=max_workers)
+
+
+    def get_custom_fields(self, workspace_id):
+        """
+        Get the custom field definitions of a workspace (gid, name and resource_subtype of each field).
+        """
+        def fetch():
+            return list(self.client.custom_fields.find_by_workspace(workspace_id, fields=['name', 'resource_subtype'], page_size=self.MAX_PAGE_SIZE))
+        return self.helper_cached('custom_fields', workspace_id, fetch)
+
+
+    def get_events(self, resource_gid, sync_token=None):
+        """
+        Get the events on a resource (a project or task) since sync_token, following has_more pages.
+        Returns (events, new sync_token, expired). Without a sync token, or with one older than Asana keeps (about a day),
+        Asana only hands out a fresh token: expired is then True and changes since the old token may have been missed.
+        """
+        events = []
+        while True:
+            params = {'resource': resource_gid, 'sync': sync_token} if sync_token else {'resource': resource_gid}
+            try:
+                # full_payload keeps the sync token and has_more next to the events
+                result = self.helper_call_with_rate_limit(self.client.get, '/events', params, full_payload=True)
+            except asana.error.InvalidTokenError as e:
+                return events, e.sync, True
+            events.extend(result.get('data') or [])
+            sync_token = result.get('sync', sync_token)
+            if not result.get('has_more'):
+                return events, sync_token, False
+
+
+    def create_webhook(self, resource_gid, target_url):
+        """
+        Subscribe target_url to the events of a resource (a project or task).
+        Asana confirms the target with a handshake while this request is in flight, so the receiver must already be running.
         """
-        return self.client.tasks.find_by_id(task_gid)
+        return self.helper_call_with_rate_limit(self.client.webhooks.create, {'resource': resource_gid, 'target': target_url})
+
+
+    def helper_batch_get(self, relative_paths, options=None):
+        """
+        GET up to MAX_BATCH_ACTIONS relative paths (e.g. '/tasks/123') in one batch API request, each with the same options
+        (e.g. {'fields': [...], 'limit': 100}). Returns the (status_code, body) of every action, in order.
+        """
+        actions = [{'method': 'get', 'relative_path': path, **({'options': options} if options else {})} for path in relative_paths]
+        # every action is charged to the rate limiter like a request of its own (the batch request itself is the last one),
+        # batching saves the round trips
+        for _ in range(len(actions) - 1):
+            self.rate_limiter.acquire()
+        results = self.helper_call_with_rate_limit(self.client.post, '/batch', {'actions': actions})
+        self.metrics.count('batch_actions', len(actions))
+        return [(result.get('status_code'), result.get('body') or {}) for result in results]
+
+
+    def helper_fetch_task_batch(self, task_chunk, opt_fields=None):
+        """
+        Get the details of up to MAX_BATCH_ACTIONS tasks with one batch request, in order (None for a task that is gone).
+        Cached details are not requested again, and actions that failed with a retryable status are fetched on their own.
+        """
+        task_details = [None] * len(task_chunk)
+        missing = []
+        for i, task in enumerate(task_chunk):
+            cached = None
+            if self.cache is not None and task.get('modified_at') and not opt_fields:
+                cached = self.cache.get('task', task['gid'], task['modified_at'])
+                self.metrics.count('cache_hits' if cached is not None else 'cache_misses')
+            if cached is None:
+                missing.append(i)
+            task_details[i] = cached
+        if not missing:
+            return task_details
+        results = self.helper_batch_get([f"/tasks/{task_chunk[i]['gid']}" for i in missing], {'fields': opt_fields} if opt_fields else None)
+        for i, (status_code, body) in zip(missing, results):
+            task = task_chunk[i]
+            if status_code == 200:
+                task_details[i] = body['data']
+            elif status_code in (403, 404):
+                logging.info(f"Task {task['gid']} no longer exists - skipping it")
+                continue
+            else:
+                # an action that failed on its own (e.g. a 500) is retried as a single request
+                options = {'fields': opt_fields} if opt_fields else {}
+                task_details[i] = self.helper_call_with_rate_limit(self.client.tasks.find_by_id, task['gid'], **options)
+            if self.cache is not None and task.get('modified_at') and not opt_fields:
+                self.cache.set('task', task['gid'], task_details[i], task['modified_at'])
+        return task_details
+
+
+    def helper_list_subtask_batch(self, task_chunk, fields):
+        """
+        List the direct subtasks of up to MAX_BATCH_ACTIONS tasks with one batch request, one list per task, in order.
+        A task with more than a page of subtasks (or a failed action) is listed on its own.
+        """
+        results = self.helper_batch_get([f"/tasks/{task['gid']}/subtasks" for task in task_chunk], {'fields': fields, 'limit': self.MAX_PAGE_SIZE})
+        subtask_lists = []
+        for task, (status_code, body) in zip(task_chunk, results):
+            if status_code == 200 and not body.get('next_page'):
+                subtask_lists.append(body['data'])
+            elif status_code in (403, 404):
+                subtask_lists.append([])
+            else:
+                subtask_lists.append(list(self.client.tasks.subtasks(task['gid'], fields=fields, page_size=self.MAX_PAGE_SIZE)))
+        return subtask_lists
+
+
+    def helper_map_bounded(self, function, items, max_workers):
+        """
+        Call function on every item of items with a pool of max_workers threads, yielding (item, result) as they complete.
+        Only a couple of items per worker are taken ahead, so items can be a lazy generator.
+        """
+        items = iter(items)
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while True:
+                while len(in_flight) < max_workers * 2:
+                    item = next(items, None)
+                    if item is None:
+                        break
+                    in_flight[executor.submit(function, item)] = item
+                if not in_flight:
+                    return
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item = in_flight.pop(future)
+                    yield item, future.result()
+
+
+    def helper_cached(self, resource, key, fetch, version=None):
+        """
+        Return the cached response for resource/key (and version), or call fetch and cache its result.
+        Without a cache this just calls fetch.
+        """
+        if self.cache is None:
+            return fetch()
+        value = self.cache.get(resource, key, version)
+        if value is None:
+            self.metrics.count('cache_misses')
+            value = fetch()
+            self.cache.set(resource, key, value, version)
+        else:
+            self.metrics.count('cache_hits')
+        return value
+
+
+    def helper_call_with_rate_limit(self, method, *args, **kwargs):
+        """
+        Call an Asana client method with this client's retry policy (every request already waits for the rate limiter).
+        On a 429 every worker pauses for Retry-After (see helper_record_response), server errors are retried with exponential backoff.
+        """
+        retry_count = 0
+        while True:
+            try:
+                # retries are handled here so a 429 is retried once the rate limiter's pause is over
+                return method(*args, max_retries=0, **kwargs)
+            except asana.error.RateLimitEnforcedError:
+                if retry_count >= self.max_retries:
+                    raise
+            except asana.error.RetryableAsanaError:
+                if retry_count >= self.max_retries:
+                    raise
+                time.sleep(2 ** retry_count)
+            retry_count += 1
+            self.metrics.count('asana_retries')
+
+
+    def helper_rate_limited(self, request):
+        """
+        Wrap the requests session's request method so every call first waits for a rate limiter token.
+        """
+        @functools.wraps(request)
+        def rate_limited_request(*args, **kwargs):
+            self.rate_limiter.acquire()
+            return request(*args, **kwargs)
+        return rate_limited_request
+
+
+    def helper_record_response(self, response, *args, **kwargs):
+        # requests response hook: latency, status and size of every Asana API call
+        self.metrics.record_request(
+            endpoint_from_url(response.request.method, response.url),
+            response.elapsed.total_seconds(),
+            response.status_code,
+            len(response.content),
+        )
+        # a 429 on any request (also a listing the asana client retries itself) pauses every worker for Retry-After,
+        # and with a SharedTokenBucket every process
+        if response.status_code == 429:
+            retry_after = float(response.headers.get('Retry-After') or 60)
+            self.metrics.count('asana_rate_limited')
+            logging.warning(f"Rate limit hit - pausing requests for {retry_after} seconds")
+            self.rate_limiter.pause(retry_after)
+        return response
 
 
     def helper_write_list_of_objects_to_json(self, list_of_objects, file_name):
@@ -69,6 +416,31 @@ class AsanaClient:
             json.dump(list_of_objects, f)
 
 
+    def helper_dedupe_by_gid(self, task_list):
+        """
+        Yield only the first task seen for each gid (tasks that belong to several projects are listed once per project).
+        """
+        seen_gids = set()
+        for task in task_list:
+            if task['gid'] not in seen_gids:
+                seen_gids.add(task['gid'])
+                yield task
+
+
+    def helper_chunk_iterable(self, iterable, chunk_size):
+        """
+        Yield lists of up to chunk_size items from any iterable (used to stream the pipeline in fixed-size batches).
+        """
+        chunk = []
+        for item in iterable:
+            chunk.append(item)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
     def helper_flatten_dict(self, d, parent_key='', sep='_'):
         """
             Used to flatten nested data (both nested dicts and nested lists of dicts)
@@ -92,8 +464,10 @@ class AsanaClient:
     def helper_clean_task_data(self, task):
         """
             Clean the task data by flattening the nested data.
+            Custom fields become one typed cf_<name> column each (see CustomFieldFlattener).
         """
-        task_flattened = self.helper_flatten_dict(task)
+        task_flattened = self.helper_flatten_dict({key: value for key, value in task.items() if key != 'custom_fields'})
+        task_flattened.update(CustomFieldFlattener().flatten(task))
         return task_flattened
 
 
@@ -0,0 +1,109 @@
+# Checkpoint.py
+
+import json
+import logging
+import os
+
+class CheckpointStore:
+    def __init__(self, directory, resume=False):
+        """
+        Append-only JSONL checkpoint of a crawl: the task listing of every finished project and every fetched task detail.
+        With resume=False the previous checkpoint is cleared, with resume=True it is loaded so finished work can be skipped.
+        """
+        self.directory = directory
+        self.projects_path = os.path.join(directory, 'projects.jsonl')
+        self.task_details_path = os.path.join(directory, 'task_details.jsonl')
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        if not resume:
+            self.clear()
+        for path in [self.projects_path, self.task_details_path]:
+            self.helper_terminate_last_line(path)
+
+        # finished project gid -> its listed tasks, and the (gid, project_name) of every stored task detail
+        self.projects = {record['project_gid']: record['tasks'] for record in self.helper_read_jsonl(self.projects_path)}
+        self.task_detail_keys = {self.helper_task_key(task_detail) for task_detail in self.helper_read_jsonl(self.task_details_path)}
+        if resume:
+            logging.info(f"Resuming from checkpoint - {len(self.projects)} projects and {len(self.task_detail_keys)} task details already done")
+
+
+    def get_project_tasks(self, project_gid):
+        """
+        Get the stored task listing of a finished project, or None if the project still has to be listed.
+        """
+        return self.projects.get(project_gid)
+
+
+    def add_project_tasks(self, project_gid, tasks):
+        """
+        Record that a project's tasks were fully listed.
+        """
+        self.helper_append_jsonl(self.projects_path, {'project_gid': project_gid, 'tasks': tasks})
+        self.projects[project_gid] = tasks
+
+
+    def has_task_detail(self, task):
+        """
+        Check whether the detail for a listed task (same gid and project) is already stored.
+        """
+        return self.helper_task_key(task) in self.task_detail_keys
+
+
+    def add_task_detail(self, task_detail):
+        """
+        Store a fetched task detail.
+        """
+        self.helper_append_jsonl(self.task_details_path, task_detail)
+        self.task_detail_keys.add(self.helper_task_key(task_detail))
+
+
+    def iter_task_details(self):
+        """
+        Stream the stored task details back from disk, one at a time (skipping repeats of the same gid and project).
+        """
+        seen = set()
+        for task_detail in self.helper_read_jsonl(self.task_details_path):
+            key = self.helper_task_key(task_detail)
+            if key not in seen:
+                seen.add(key)
+                yield task_detail
+
+
+    def clear(self):
+        """
+        Remove the stored checkpoint files.
+        """
+        for path in [self.projects_path, self.task_details_path]:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+    def helper_task_key(self, task):
+        return (task['gid'], task.get('project_name'))
+
+
+    def helper_append_jsonl(self, path, record):
+        # one line per record, flushed right away so a crash loses at most the line being written
+        with open(path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+
+    def helper_terminate_last_line(self, path):
+        # make sure a line cut short by a crash isn't glued to the next appended record
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'rb+') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    f.write(b'\n')
+
+
+    def helper_read_jsonl(self, path):
+        if not os.path.exists(path):
+            return
+        with open(path) as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # a line cut short by a crash mid-write
+                    logging.warning(f"Skipping incomplete checkpoint line in {path}")
@@ -0,0 +1,101 @@
+# EventQueue.py
+
+import os
+import sqlite3
+import threading
+import time
+
+class EventQueue:
+    def __init__(self, path='state/event_queue.sqlite', claim_timeout=600):
+        """
+        Durable queue of changed task gids in SQLite, filled from Asana events/webhooks and drained by a consumer.
+        A gid is queued once however often it changes; its latest action ('changed' or 'deleted') wins.
+        Taken items stay in the queue until they are acked, and are handed out again after claim_timeout seconds
+        (e.g. when the consumer crashed), so every change is delivered at least once.
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.claim_timeout = claim_timeout
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS queue (
+                gid TEXT PRIMARY KEY,
+                action TEXT,
+                project_gid TEXT,
+                enqueued_at REAL,
+                claimed_at REAL,
+                attempts INTEGER DEFAULT 0
+            )
+        """)
+
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM queue").fetchone()[0]
+
+
+    def put(self, gid, action='changed', project_gid=None):
+        """
+        Queue a task gid (or refresh it if it is already queued, even while a consumer holds it).
+        """
+        self.put_many([(gid, action, project_gid)])
+
+
+    def put_many(self, items):
+        """
+        Queue many (gid, action, project_gid) tuples in one transaction.
+        """
+        now = time.time()
+        with self.lock:
+            self.connection.execute("BEGIN")
+            self.connection.executemany("""
+                INSERT INTO queue (gid, action, project_gid, enqueued_at, claimed_at) VALUES (?, ?, ?, ?, NULL)
+                ON CONFLICT (gid) DO UPDATE SET
+                    action = excluded.action,
+                    project_gid = COALESCE(excluded.project_gid, queue.project_gid),
+                    enqueued_at = excluded.enqueued_at,
+                    claimed_at = NULL
+            """, [(str(gid), action, project_gid, now) for gid, action, project_gid in items])
+            self.connection.execute("COMMIT")
+
+
+    def take(self, max_items=100):
+        """
+        Claim up to max_items queued changes, oldest first, as dicts with gid, action, project_gid and enqueued_at.
+        """
+        now = time.time()
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            rows = self.connection.execute("""
+                SELECT gid, action, project_gid, enqueued_at FROM queue
+                WHERE claimed_at IS NULL OR claimed_at < ?
+                ORDER BY enqueued_at LIMIT ?
+            """, (now - self.claim_timeout, max_items)).fetchall()
+            self.connection.executemany(
+                "UPDATE queue SET claimed_at = ?, attempts = attempts + 1 WHERE gid = ?", [(now, row[0]) for row in rows]
+            )
+            self.connection.execute("COMMIT")
+        return [{'gid': gid, 'action': action, 'project_gid': project_gid, 'enqueued_at': enqueued_at} for gid, action, project_gid, enqueued_at in rows]
+
+
+    def ack(self, items):
+        """
+        Remove processed items, unless their gid changed again after it was taken (then it stays queued).
+        """
+        with self.lock:
+            self.connection.executemany(
+                "DELETE FROM queue WHERE gid = ? AND enqueued_at = ?", [(item['gid'], item['enqueued_at']) for item in items]
+            )
+
+
+    def release(self, items):
+        """
+        Hand taken items back to the queue right away (e.g. after a failed load).
+        """
+        with self.lock:
+            self.connection.executemany(
+                "UPDATE queue SET claimed_at = NULL WHERE gid = ? AND enqueued_at = ?", [(item['gid'], item['enqueued_at']) for item in items]
+            )
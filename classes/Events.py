@@ -0,0 +1,217 @@
+# Events.py
+
+import hashlib
+import hmac
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def task_changes_from_events(events, project_gid=None):
+    """
+    Turn Asana events (from the events API or a webhook payload) into (task gid, action, project_gid) tuples for an EventQueue.
+    A task event queues the task itself ('deleted' when the task was deleted, 'changed' otherwise); an event on a story
+    or attachment of a task (e.g. a new comment) queues its parent task. Events on other resources are skipped.
+    """
+    changes = []
+    for event in events:
+        resource = event.get('resource') or {}
+        parent = event.get('parent') or {}
+        if resource.get('resource_type') == 'task':
+            action = 'deleted' if event.get('action') == 'deleted' else 'changed'
+            # a task added to (or removed from) a project names the project as its parent
+            event_project_gid = parent.get('gid') if parent.get('resource_type') == 'project' else project_gid
+            changes.append((resource['gid'], action, event_project_gid))
+        elif parent.get('resource_type') == 'task':
+            changes.append((parent['gid'], 'changed', project_gid))
+    return changes
+
+
+def load_recorded_events(path):
+    """
+    Read recorded event payloads from a JSON lines file, one payload per line: a webhook body ({"events": [...]},
+    as WebhookReceiver records them), an events API page ({"data": [...]}) or a bare list of events.
+    Yields (events, project_gid) per payload; project_gid is taken from a "resource" key next to the events, if any.
+    """
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            payload = json.loads(line)
+            if isinstance(payload, list):
+                yield payload, None
+            else:
+                yield payload.get('events', payload.get('data')) or [], payload.get('resource')
+
+
+class EventPoller:
+    def __init__(self, client, queue, sync_state, section='events_sync'):
+        """
+        Poll the Asana events API of projects and push changed task gids into an EventQueue.
+        The sync token of every project is kept in sync_state (a SyncStateStore) under section, and saved only after
+        the changes it covers are in the queue, so a crash can repeat events but never lose them.
+        """
+        self.client = client
+        self.queue = queue
+        self.sync_state = sync_state
+        self.section = section
+
+
+    def poll(self, project_list):
+        """
+        Poll every project of project_list (dicts with a gid) once and return the number of changes queued.
+        A project without a sync token only gets one (run a full sync first, later polls pick up from there); a project
+        whose token expired has every task queued again, since events were missed.
+        """
+        queued = 0
+        for project in project_list:
+            project_gid = project['gid']
+            sync_token = self.sync_state.get(self.section, project_gid)
+            events, new_sync_token, expired = self.client.get_events(project_gid, sync_token)
+            if expired and sync_token:
+                logging.warning(f"Sync token of project {project_gid} expired - queueing all of its tasks (deleted tasks are only caught by a full sync)")
+                changes = [(task['gid'], 'changed', project_gid) for task in self.client.list_tasks_by_project(project_gid)]
+            else:
+                changes = task_changes_from_events(events, project_gid)
+            if changes:
+                self.queue.put_many(changes)
+                queued += len(changes)
+            self.sync_state.set(self.section, project_gid, new_sync_token)
+        self.sync_state.save()
+        return queued
+
+
+class WebhookReceiver:
+    def __init__(self, queue, sync_state, host='0.0.0.0', port=8090, record_path=None, section='webhook_secrets'):
+        """
+        Small HTTP server for Asana webhooks: POST /webhooks/<resource gid> answers the X-Hook-Secret handshake,
+        checks the X-Hook-Signature of every delivery and pushes the changed task gids into queue (an EventQueue).
+        A handshake is only accepted for a resource whose webhook is being created through subscribe, so nobody else can
+        swap in a secret of their own. Secrets are kept in sync_state (a SyncStateStore) under section, so deliveries still
+        verify after a restart.
+        With record_path every verified payload is also appended to that JSON lines file (see load_recorded_events).
+        """
+        self.queue = queue
+        self.sync_state = sync_state
+        self.host = host
+        self.port = port
+        self.record_path = record_path
+        self.section = section
+        self.lock = threading.Lock()
+        # resources with a create_webhook call in flight, the only ones whose handshake is accepted
+        self.pending_handshakes = set()
+        self.httpd = None
+
+
+    def start(self):
+        self.httpd = ThreadingHTTPServer((self.host, self.port), WebhookHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.receiver = self
+        self.port = self.httpd.server_address[1]
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        logging.info(f"Receiving Asana webhooks on http://{self.host}:{self.port}/webhooks/<resource gid>")
+        return self
+
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+
+    def __enter__(self):
+        return self.start()
+
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+    def subscribe(self, client, resource_gid, target_url):
+        """
+        Create the webhook of a resource through client (an AsanaClient), accepting its handshake while the request is in flight.
+        """
+        with self.lock:
+            self.pending_handshakes.add(resource_gid)
+        try:
+            return client.create_webhook(resource_gid, target_url)
+        finally:
+            with self.lock:
+                self.pending_handshakes.discard(resource_gid)
+
+
+    def handshake(self, resource_gid, secret):
+        """
+        Store the secret of a webhook handshake. Returns False (and stores nothing) unless subscribe is waiting for it.
+        """
+        with self.lock:
+            if resource_gid not in self.pending_handshakes:
+                logging.warning(f"Rejected webhook handshake for resource {resource_gid}: no webhook is being created for it")
+                return False
+            self.sync_state.set(self.section, resource_gid, secret)
+            self.sync_state.save()
+        logging.info(f"Webhook for resource {resource_gid} confirmed")
+        return True
+
+
+    def verify(self, resource_gid, body, signature):
+        secret = self.sync_state.get(self.section, resource_gid)
+        if not secret or not signature:
+            return False
+        expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(expected, signature)
+
+
+    def receive(self, resource_gid, payload):
+        """
+        Queue the task changes of one webhook delivery (Asana sends heartbeats with no events too).
+        """
+        events = payload.get('events') or []
+        if self.record_path:
+            with self.lock, open(self.record_path, 'a') as f:
+                f.write(json.dumps({'resource': resource_gid, 'events': events}) + "\n")
+        changes = task_changes_from_events(events, resource_gid)
+        if changes:
+            self.queue.put_many(changes)
+        return len(changes)
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        receiver = self.server.receiver
+        parts = self.path.strip('/').split('/')
+        if len(parts) != 2 or parts[0] != 'webhooks':
+            return self.send_status(404)
+        resource_gid = parts[1]
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        secret = self.headers.get('X-Hook-Secret')
+        if secret:
+            # the handshake is answered by echoing the secret back
+            if not receiver.handshake(resource_gid, secret):
+                return self.send_status(403)
+            return self.send_status(200, {'X-Hook-Secret': secret})
+        if not receiver.verify(resource_gid, body, self.headers.get('X-Hook-Signature')):
+            logging.warning(f"Rejected webhook delivery for resource {resource_gid} with a bad signature")
+            return self.send_status(401)
+        try:
+            payload = json.loads(body or b'{}')
+        except ValueError:
+            return self.send_status(400)
+        receiver.receive(resource_gid, payload)
+        self.send_status(200)
+
+
+    def send_status(self, status, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+
+
+    def log_message(self, format, *args):
+        # deliveries are logged through logging instead of stderr
+        logging.debug(f"Webhook {self.address_string()} - {format % args}")
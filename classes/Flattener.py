@@ -0,0 +1,231 @@
+# Flattener.py
+
+import re
+
+class TaskFlattener:
+    def __init__(self, columns, sep='_', list_sep=', '):
+        """
+        Extract only the given columns from task dicts, named the way helper_flatten_dict names them
+        (e.g. 'assignee_name', 'memberships_section_gid').
+        Each column is resolved to its chain of keys once, against the first task that has it, and compiled into a getter.
+        Values under lists (e.g. every follower's name) are all kept: joined with list_sep, or as a python list if list_sep is None.
+        """
+        self.columns = list(columns)
+        self.sep = sep
+        self.list_sep = list_sep
+        self.getters = {}
+
+
+    def flatten(self, task):
+        """
+        Flatten a single task to a dict with exactly the configured columns (None where the task has no value).
+        """
+        values = {}
+        for column in self.columns:
+            getter = self.get_getter([task], column)
+            values[column] = getter(task) if getter else None
+        return values
+
+
+    def flatten_batch(self, task_list):
+        """
+        Flatten many tasks into one list of values per column, ready for pd.DataFrame(..., columns=columns).
+        """
+        task_list = list(task_list)
+        values = {}
+        for column in self.columns:
+            getter = self.get_getter(task_list, column)
+            values[column] = [getter(task) for task in task_list] if getter else [None] * len(task_list)
+        return values
+
+
+    def get_getter(self, task_list, column):
+        """
+        Get the compiled getter for a column, resolving its key path against the first task that has it.
+        Returns None while no task so far has the column.
+        """
+        getter = self.getters.get(column)
+        if getter is None:
+            # a column missing from a whole batch (e.g. parent_gid while every parent is null) is looked for in every task,
+            # so tasks whose top-level key for it is missing or null are skipped with a few lookups
+            parts = column.split(self.sep)
+            top_level_keys = [self.sep.join(parts[:i]) for i in range(len(parts), 0, -1)]
+            for task in task_list:
+                if all(task.get(key) is None for key in top_level_keys):
+                    continue
+                path = self.resolve_path(task, column)
+                if path is not None:
+                    getter = self.getters[column] = self.compile_path(path)
+                    break
+        return getter
+
+
+    def resolve_path(self, task, column):
+        """
+        Split a column name into the keys it was built from, using the keys present in the task.
+        Returns None if the task can't tell (e.g. the key is missing, or the nested object is null).
+        """
+        path = []
+        remaining = column
+        node = task
+        while True:
+            # for lists of dicts, resolve against the first dict in the list
+            if isinstance(node, list):
+                node = next((item for item in node if isinstance(item, dict)), None)
+            if not isinstance(node, dict):
+                return None
+            if remaining in node:
+                return path + [remaining]
+            # prefer the longest matching key (so 'permalink_url' is not split as 'permalink' + 'url'); only the prefixes
+            # of remaining that end at a separator can match, which is a few lookups instead of a scan of every key
+            parts = remaining.split(self.sep)
+            prefixes = (self.sep.join(parts[:i]) for i in range(len(parts) - 1, 0, -1))
+            key = next((prefix for prefix in prefixes if prefix in node), None)
+            if key is None:
+                return None
+            path.append(key)
+            remaining = remaining[len(key) + len(self.sep):]
+            node = node[key]
+
+
+    def compile_path(self, path):
+        """
+        Build a function that follows path through nested dicts, collecting the values from every element of any list on the way.
+        """
+        key = path[0]
+        if len(path) == 1:
+            def getter(node):
+                value = node.get(key)
+                return self.join(value) if isinstance(value, list) else value
+            return getter
+        next_getter = self.compile_path(path[1:])
+        def getter(node):
+            value = node.get(key)
+            if isinstance(value, dict):
+                return next_getter(value)
+            if isinstance(value, list):
+                return self.join([next_getter(item) for item in value if isinstance(item, dict)])
+            return None
+        return getter
+
+
+    def join(self, values):
+        """
+        Combine the values found under a list, dropping nulls (None when nothing is left).
+        """
+        if self.list_sep is not None:
+            # nested lists were already joined to strings further down
+            flat = [str(value) for value in values if value is not None]
+            return self.list_sep.join(flat) if flat else None
+        flat = []
+        for value in values:
+            if isinstance(value, list):
+                flat.extend(value)
+            elif value is not None:
+                flat.append(value)
+        return flat or None
+
+
+class CustomFieldFlattener:
+    # the value key of each custom field type, and the column type it is loaded as
+    VALUE_TYPES = {
+        'text': 'text',
+        'number': 'number',
+        'enum': 'text',
+        'multi_enum': 'text',
+        'date': 'date',
+        'people': 'text',
+    }
+
+    def __init__(self, definitions=None, prefix='cf_', list_sep=', '):
+        """
+        Turn a task's custom_fields list into one typed column per field (named prefix + the field name, e.g. 'cf_priority'),
+        instead of helper_flatten_dict's custom_fields_* keys where only the last field survives.
+        Numbers stay numbers, dates are 'YYYY-MM-DD' strings, enum and people fields hold the option or people names
+        (joined with list_sep for multi-enum and people fields) and any other type its display_value.
+        With definitions (the workspace's custom fields, see AsanaClient.get_custom_fields) every defined field has a column,
+        also for tasks that don't have it; without them, columns come from the fields each task has.
+        """
+        self.prefix = prefix
+        self.list_sep = list_sep
+        self.names = {}
+        for field in definitions or []:
+            self.column_name(field)
+        self.fixed_columns = definitions is not None
+        self.types = {
+            self.names[field['gid']]: self.VALUE_TYPES.get(self.field_type(field), 'text') for field in definitions or []
+        }
+
+
+    @property
+    def columns(self):
+        return list(self.names.values())
+
+
+    def columns_of_type(self, value_type):
+        """
+        Get the defined columns loaded as value_type ('number', 'date' or 'text').
+        """
+        return [column for column, column_type in self.types.items() if column_type == value_type]
+
+
+    def flatten(self, task):
+        """
+        Get the custom field columns of a task (None for defined fields the task doesn't have).
+        """
+        values = dict.fromkeys(self.columns) if self.fixed_columns else {}
+        for field in task.get('custom_fields') or []:
+            if self.fixed_columns and field['gid'] not in self.names:
+                continue
+            values[self.column_name(field)] = self.field_value(field)
+        return values
+
+
+    def flatten_batch(self, task_list):
+        """
+        Flatten many tasks into one list of values per column, like TaskFlattener.flatten_batch.
+        """
+        rows = [self.flatten(task) for task in task_list]
+        return {column: [row.get(column) for row in rows] for column in self.columns}
+
+
+    def column_name(self, field):
+        """
+        Name the column of a field once per gid; a field whose name slugs to a taken column gets its gid appended.
+        """
+        name = self.names.get(field['gid'])
+        if name is None:
+            slug = re.sub(r'[^0-9a-z]+', '_', (field.get('name') or '').lower()).strip('_') or field['gid']
+            name = f"{self.prefix}{slug}"
+            if name in self.names.values():
+                name = f"{name}_{field['gid']}"
+            self.names[field['gid']] = name
+        return name
+
+
+    def field_type(self, field):
+        # resource_subtype replaced the older type key, tasks can still carry either
+        return field.get('resource_subtype') or field.get('type')
+
+
+    def field_value(self, field):
+        field_type = self.field_type(field)
+        if field_type == 'number':
+            return field.get('number_value')
+        if field_type == 'text':
+            return field.get('text_value', field.get('display_value'))
+        if field_type == 'enum':
+            return (field.get('enum_value') or {}).get('name')
+        if field_type == 'multi_enum':
+            return self.join([option.get('name') for option in field.get('multi_enum_values') or []])
+        if field_type == 'date':
+            date_value = field.get('date_value') or {}
+            return date_value.get('date') or (date_value.get('date_time') or '')[:10] or None
+        if field_type == 'people':
+            return self.join([person.get('name') for person in field.get('people_value') or []])
+        return field.get('display_value')
+
+
+    def join(self, values):
+        flat = [str(value) for value in values if value is not None]
+        return self.list_sep.join(flat) if flat else None
@@ -1,53 +1,174 @@
 #GoogleCloud
 
-from google.cloud import bigquery
-import google.api_core.exceptions as exceptions 
 import logging
-import pandas as pd
-from google.oauth2 import service_account
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from classes.Instrumentation import Metrics
+from classes.LazyImport import lazy_import
+
+# the Google Cloud libraries, pandas and pyarrow are only imported once a client uses them
+bigquery = lazy_import('google.cloud.bigquery')
+bigquery_storage = lazy_import('google.cloud.bigquery_storage')
+exceptions = lazy_import('google.api_core.exceptions')
+pd = lazy_import('pandas')
+pa = lazy_import('pyarrow')
+pq = lazy_import('pyarrow.parquet')
+service_account = lazy_import('google.oauth2.service_account')
 
 # LOG LEVEL INFO
 logging.basicConfig(level=logging.INFO)
 
 class GoogleCloudClient:
-    def __init__(self, service_account_path, write_disposition='WRITE_TRUNCATE', scopes=['https://www.googleapis.com/auth/cloud-platform']):
+    # optional staging table column with every row's position in the load, so of duplicate keys the first row is merged
+    STAGING_ROW_COLUMN = '_staging_row'
+
+    def __init__(self, service_account_path, write_disposition='WRITE_TRUNCATE', scopes=['https://www.googleapis.com/auth/cloud-platform'], source_format='PARQUET', load_chunk_size=250000, max_load_workers=4, max_read_streams=4, metrics=None):
         self.credentials = service_account.Credentials.from_service_account_file(service_account_path).with_scopes(scopes=scopes)
         self.bq_client = bigquery.Client(credentials=self.credentials)
+        # reads go through the Storage Read API (Arrow record batches) instead of the REST row iterator
+        self.bqstorage_client = bigquery_storage.BigQueryReadClient(credentials=self.credentials)
         self.write_disposition = write_disposition
+        # PARQUET (default) loads DataFrames as typed columns, CSV keeps the old text load
+        self.source_format = source_format
+        # DataFrames larger than load_chunk_size rows are appended as several concurrent load jobs (e.g. upsert's staging loads)
+        self.load_chunk_size = load_chunk_size
+        self.max_load_workers = max_load_workers
+        # table reads are split over up to max_read_streams streams that are read concurrently
+        self.max_read_streams = max_read_streams
+        # load jobs, queries and table reads are recorded in metrics (shared with AsanaClient)
+        self.metrics = metrics or Metrics()
 
 
-    def write_to_bigquery_tables(self, data):
+    def write_to_bigquery_tables(self, data, write_disposition=None):
         
         #get variables from data object
         df = pd.DataFrame(data.get("data"))    
         table_id = data.get("table_id")
-        cols= df.columns
+        partition_field = data.get("partition_field")
+        cluster_fields = data.get("cluster_fields")
+        
+        #build load schema (unless one is passed in, e.g. to keep appended chunks consistent)
+        load_schema = data.get("load_schema") or self.load_schema_builder(df)
+        
+        #create a partitioned/clustered table up front, a load job would create a plain one
+        if partition_field or cluster_fields:
+            self.create_table_if_missing(table_id, load_schema, partition_field, cluster_fields)
+        
+        #create job configs, the first chunk applies the write disposition and the rest are appended
+        #(partitioning and clustering are set on the table above, never on the load jobs)
+        job_config = self.bq_job_config(load_schema, write_disposition)
+        append_job_config = self.bq_job_config(load_schema, 'WRITE_APPEND')
         
-        #build load schema
-        load_schema = self.load_schema_builder(df)
+        #split large DataFrames into chunks when appending; a load that truncates (or expects an empty table) stays one
+        #atomic job, so a failed chunk can never leave the table truncated with only part of the data
+        appending = (write_disposition or self.write_disposition) == 'WRITE_APPEND'
+        chunk_size = (self.load_chunk_size if appending else None) or max(len(df), 1)
+        chunks = [df.iloc[start:start + chunk_size] for start in range(0, len(df), chunk_size)] or [df]
         
-        #create job config
-        job_config = self.bq_job_config(load_schema)
+        # Make the API requests: first chunk on its own (it may create the table), then the others concurrently
+        output_rows = self.helper_load_dataframe(chunks[0], table_id, job_config)
+        if len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=self.max_load_workers) as executor:
+                output_rows += sum(executor.map(lambda chunk: self.helper_load_dataframe(chunk, table_id, append_job_config), chunks[1:]))
         
-        # Make an API request.
-        job = self.bq_client.load_table_from_dataframe(df, table_id, job_config=job_config)  
+        # Write to log
+        load_info = f"Loaded {output_rows} rows and {len(load_schema)} columns to {table_id} in {len(chunks)} load job(s)"
+        logging.info(load_info)
         
-        # Wait for the job to complete.
-        job.result()  
+        return load_info
+
+
+    def helper_load_dataframe(self, df, table_id, job_config):
+        """
+        Run one load job for a DataFrame, wait for it and return the number of rows it loaded.
+        """
+        started_at = time.perf_counter()
+        job = self.bq_client.load_table_from_dataframe(df, table_id, job_config=job_config)
+        job.result()
+        self.metrics.record_request('bigquery.load', time.perf_counter() - started_at, job.state, job.output_bytes or 0)
+        return job.output_rows or 0
+
+
+    def add_missing_columns(self, table_id, schema):
+        """
+        Add the fields of schema that table_id doesn't have yet as new (NULLABLE) columns, e.g. a custom field added in Asana.
+        """
+        table = self.bq_client.get_table(table_id)
+        existing = {field.name for field in table.schema}
+        new_fields = [field for field in schema if field.name not in existing]
+        if new_fields:
+            table.schema = list(table.schema) + new_fields
+            self.bq_client.update_table(table, ['schema'])
+            logging.info(f"Added columns {[field.name for field in new_fields]} to {table_id}")
+        return new_fields
+
+
+    def create_table_if_missing(self, table_id, schema, partition_field=None, cluster_fields=None):
+        """
+        Create table_id with day partitioning on partition_field and clustering on cluster_fields, if it doesn't exist yet.
+        Partitioning can't be added to an existing table, so drop and reload a table to partition it.
+        """
+        table = bigquery.Table(table_id, schema=schema)
+        if partition_field:
+            table.time_partitioning = bigquery.TimePartitioning(type_=bigquery.TimePartitioningType.DAY, field=partition_field)
+        if cluster_fields:
+            table.clustering_fields = cluster_fields
+        self.bq_client.create_table(table, exists_ok=True)
 
-        # Make an API request.
-        table = self.bq_client.get_table(table_id)  
+
+    def write_record_batches_to_bigquery(self, table_id, record_batches, load_schema=None, write_disposition=None):
+        """
+        Load a stream of pyarrow RecordBatches into a BigQuery table without building a DataFrame.
+        The batches are written to one temporary Parquet file which is loaded in a single job.
+        """
+        with tempfile.TemporaryFile() as parquet_file:
+            writer = None
+            num_rows = 0
+            for batch in record_batches:
+                if writer is None:
+                    writer = pq.ParquetWriter(parquet_file, batch.schema)
+                    # build load schema from the (empty) first batch when none is given
+                    load_schema = load_schema or self.load_schema_builder(batch.schema.empty_table().to_pandas())
+                writer.write_batch(batch)
+                num_rows += batch.num_rows
+            if writer is None:
+                logging.info(f"No record batches to load to {table_id}")
+                return None
+            writer.close()
+            parquet_file.seek(0)
+            
+            #create job config
+            job_config = self.bq_job_config(load_schema, write_disposition, source_format='PARQUET')
+            
+            # Make an API request and wait for the job to complete.
+            started_at = time.perf_counter()
+            job = self.bq_client.load_table_from_file(parquet_file, table_id, job_config=job_config)
+            job.result()
+            self.metrics.record_request('bigquery.load', time.perf_counter() - started_at, job.state, job.output_bytes or 0)
         
         # Write to log
-        load_info = f"Loaded {table.num_rows} rows and {len(table.schema)} columns to {table_id}"
+        load_info = f"Loaded {num_rows} rows and {len(load_schema)} columns to {table_id}"
         logging.info(load_info)
         
         return load_info
 
 
-    def bq_job_config(self, load_schema):
+    def bq_job_config(self, load_schema, write_disposition=None, source_format=None):
+        # no time_partitioning/clustering_fields here: a load job that sets them is rejected by any existing table
+        # partitioned differently (or not at all), they are only set when create_table_if_missing creates the table
+        if (source_format or self.source_format) == 'PARQUET':
+            # the DataFrame/record batches are serialized to Parquet using load_schema, so none of the CSV options apply
+            return bigquery.LoadJobConfig(
+                write_disposition=write_disposition or self.write_disposition,
+                source_format=bigquery.SourceFormat.PARQUET,
+                create_disposition='CREATE_IF_NEEDED',
+                schema=load_schema,
+                autodetect=False,
+            )
         return bigquery.LoadJobConfig(
-            write_disposition=self.write_disposition,
+            write_disposition=write_disposition or self.write_disposition,
             source_format=bigquery.SourceFormat.CSV,
             create_disposition='CREATE_IF_NEEDED', 
             schema=load_schema,
@@ -62,16 +183,214 @@ class GoogleCloudClient:
         )
 
 
+    def upsert(self, data, key_column, insert_timestamp, change_column='modified_at', detect_deletes=True):
+        """
+        Upsert data into table_id with a server-side MERGE on key_column instead of downloading and rewriting the table.
+        The batch is loaded into a staging table of its own, then rows are flagged "new", "updated" (change_column differs) or "existing",
+        and with detect_deletes rows missing from the batch are flagged "deleted". last_change_seen is set to insert_timestamp
+        on every change and kept as it was for existing rows.
+        A new target table gets the "partition_field"/"cluster_fields" of the data object.
+        """
+        #get variables from data object
+        df = pd.DataFrame(data.get("data")).drop_duplicates(subset=[key_column], keep='first')
+        table_id = data.get("table_id")
+        staging_table_id = self.staging_table_id(table_id)
+        
+        #load the batch into the staging table (dropped again if the load fails, merge_from_staging drops it otherwise)
+        #the staging table is new, so the batch is appended: a large one loads as concurrent chunks (see write_to_bigquery_tables)
+        #and a failed chunk can't leave a partly loaded table behind
+        try:
+            self.write_to_bigquery_tables({"table_id": staging_table_id, "data": df, "load_schema": data.get("load_schema")}, write_disposition='WRITE_APPEND')
+        except BaseException:
+            self.bq_client.delete_table(staging_table_id, not_found_ok=True)
+            raise
+        
+        return self.merge_from_staging(table_id, staging_table_id, key_column, insert_timestamp, change_column, detect_deletes, data.get("partition_field"), data.get("cluster_fields"))
+
+
+    def merge_from_staging(self, table_id, staging_table_id, key_column, insert_timestamp, change_column='modified_at', detect_deletes=True, partition_field=None, cluster_fields=None):
+        """
+        MERGE an already loaded staging table into table_id (see upsert), then drop the staging table (also when the MERGE fails).
+        The staging table may hold duplicate keys (e.g. when it was appended to in chunks), only one row per key is merged:
+        the first one by STAGING_ROW_COLUMN if the staging table has it (the column itself is not merged), else the latest change_column.
+        If table_id doesn't exist yet it is created (partitioned/clustered when given) and every row is inserted as new.
+        """
+        try:
+            staging_schema = self.bq_client.get_table(staging_table_id).schema
+            order_column = next((field.name for field in staging_schema if field.name == self.STAGING_ROW_COLUMN), None)
+            staging_schema = [field for field in staging_schema if field.name != self.STAGING_ROW_COLUMN]
+            columns = [field.name for field in staging_schema]
+            
+            #first load creates the table, then every load merges into it
+            status_schema = [
+                bigquery.SchemaField(col, bigquery.enums.SqlTypeNames.STRING)
+                for col in ['change_status', 'last_change_seen'] if col not in columns
+            ]
+            self.create_table_if_missing(table_id, list(staging_schema) + status_schema, partition_field, cluster_fields)
+            self.add_missing_columns(table_id, staging_schema)
+            query = self.merge_query_builder(table_id, staging_table_id, key_column, columns, change_column, detect_deletes, order_column)
+            job_config = bigquery.QueryJobConfig(
+                query_parameters=[bigquery.ScalarQueryParameter('insert_timestamp', 'STRING', insert_timestamp)]
+            )
+            
+            # Make an API request and wait for the MERGE to complete.
+            started_at = time.perf_counter()
+            query_job = self.bq_client.query(query, job_config=job_config)
+            query_job.result()
+            self.metrics.record_request('bigquery.merge', time.perf_counter() - started_at, query_job.state, query_job.total_bytes_processed or 0)
+        finally:
+            # a failed MERGE would otherwise leave its staging table behind in the dataset
+            self.bq_client.delete_table(staging_table_id, not_found_ok=True)
+        
+        # Write to log
+        upsert_info = f"Upserted {staging_table_id} into {table_id} ({query_job.num_dml_affected_rows} rows affected)"
+        logging.info(upsert_info)
+        
+        return upsert_info
+
+
+    def staging_table_id(self, table_id):
+        """
+        Name a new staging table next to table_id. Every load gets its own, so concurrent jobs (e.g. the events consumer
+        and a full sync streaming into the same table) never truncate or drop each other's staging table.
+        """
+        return f"{table_id}_staging_{time.strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+
+    def mark_deleted(self, table_id, key_column, keys, insert_timestamp):
+        """
+        Flag the rows of table_id whose key_column is one of keys as "deleted" (e.g. tasks reported deleted by Asana events),
+        setting last_change_seen to insert_timestamp. Rows already flagged are left as they are.
+        """
+        keys = [str(key) for key in keys]
+        if not keys or not self.table_exists(table_id):
+            return None
+        query = f"""
+            UPDATE `{table_id}`
+            SET change_status = 'deleted', last_change_seen = @insert_timestamp
+            WHERE CAST(`{key_column}` AS STRING) IN UNNEST(@keys) AND change_status IS DISTINCT FROM 'deleted'"""
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ScalarQueryParameter('insert_timestamp', 'STRING', insert_timestamp),
+                bigquery.ArrayQueryParameter('keys', 'STRING', keys),
+            ]
+        )
+        started_at = time.perf_counter()
+        query_job = self.bq_client.query(query, job_config=job_config)
+        query_job.result()
+        self.metrics.record_request('bigquery.merge', time.perf_counter() - started_at, query_job.state, query_job.total_bytes_processed or 0)
+
+        # Write to log
+        delete_info = f"Marked {query_job.num_dml_affected_rows} rows of {table_id} as deleted"
+        logging.info(delete_info)
+
+        return delete_info
+
+
+    def dedupe_query_builder(self, table_id, key_column, order_by):
+        """
+        Select one row per key_column value from table_id, the first one by order_by (e.g. "`_staging_row`" or "`modified_at` DESC").
+        """
+        return f"SELECT * FROM `{table_id}` WHERE TRUE QUALIFY ROW_NUMBER() OVER (PARTITION BY `{key_column}` ORDER BY {order_by}) = 1"
+
+
+    def merge_query_builder(self, table_id, staging_table_id, key_column, columns, change_column='modified_at', detect_deletes=True, order_column=None):
+        """
+        Build the MERGE statement used by upsert (expects an @insert_timestamp query parameter).
+        Of duplicate keys in the staging table the row with the lowest order_column is merged, or without one the latest change_column.
+        """
+        order_by = f"`{order_column}`" if order_column else f"`{change_column}` DESC"
+        status_cols = ['change_status', 'last_change_seen']
+        data_cols = [col for col in columns if col not in status_cols]
+        # a previously deleted row that shows up again counts as updated
+        changed = f"(T.`{change_column}` IS DISTINCT FROM S.`{change_column}` OR T.change_status = 'deleted')"
+        update_set = ",\n                ".join(
+            [f"`{col}` = S.`{col}`" for col in data_cols if col != key_column]
+            + [f"change_status = IF({changed}, 'updated', 'existing')",
+               f"last_change_seen = IF({changed}, @insert_timestamp, T.last_change_seen)"]
+        )
+        insert_cols = ", ".join([f"`{col}`" for col in data_cols] + status_cols)
+        insert_values = ", ".join([f"S.`{col}`" for col in data_cols] + ["'new'", "@insert_timestamp"])
+        query = f"""
+            MERGE `{table_id}` T
+            USING ({self.dedupe_query_builder(staging_table_id, key_column, order_by)}) S
+            ON T.`{key_column}` = S.`{key_column}`
+            WHEN MATCHED THEN UPDATE SET
+                {update_set}
+            WHEN NOT MATCHED BY TARGET THEN
+                INSERT ({insert_cols}) VALUES ({insert_values})"""
+        if detect_deletes:
+            query += """
+            WHEN NOT MATCHED BY SOURCE AND T.change_status IS DISTINCT FROM 'deleted' THEN
+                UPDATE SET change_status = 'deleted', last_change_seen = @insert_timestamp"""
+        return query
+
+
     def query_bq_table(self, query_string):
         """
         Query BigQuery table and return results as a pandas dataframe
         """
+        started_at = time.perf_counter()
         query_job = self.bq_client.query(query_string)
         results = query_job.result()
-        df = results.to_dataframe()
+        df = results.to_dataframe(bqstorage_client=self.bqstorage_client)
+        self.metrics.record_request('bigquery.query', time.perf_counter() - started_at, query_job.state, query_job.total_bytes_processed or 0)
+        return df
+
+
+    def read_bq_table(self, table_id, columns=None, row_filter=None, as_stream=False):
+        """
+        Read a table through the BigQuery Storage Read API, fetching only the given columns and the rows matching row_filter
+        (a SQL condition without the WHERE, e.g. "modified_at >= '2023-01-01'"; on the partition column it skips whole partitions).
+        Returns a DataFrame, or with as_stream a generator of pyarrow RecordBatches so the table never has to fit in memory.
+        """
+        session = self.helper_create_read_session(table_id, columns, row_filter, 1 if as_stream else self.max_read_streams)
+        if as_stream:
+            return (batch for stream in session.streams for batch in self.helper_read_stream(session, stream))
+        
+        # read all streams concurrently into one arrow table
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_read_streams) as executor:
+            stream_batches = executor.map(lambda stream: list(self.helper_read_stream(session, stream)), session.streams)
+            batches = [batch for batch_list in stream_batches for batch in batch_list]
+        schema = pa.ipc.read_schema(pa.py_buffer(session.arrow_schema.serialized_schema))
+        self.metrics.record_request('bigquery.read', time.perf_counter() - started_at, None, sum(batch.nbytes for batch in batches))
+        df = pa.Table.from_batches(batches, schema=schema).to_pandas()
+        logging.info(f"Read {len(df)} rows and {len(df.columns)} columns from {table_id}")
         return df
 
 
+    def helper_create_read_session(self, table_id, columns=None, row_filter=None, max_stream_count=1):
+        table = bigquery.TableReference.from_string(table_id, default_project=self.bq_client.project)
+        requested_session = bigquery_storage.types.ReadSession(
+            table=f"projects/{table.project}/datasets/{table.dataset_id}/tables/{table.table_id}",
+            data_format=bigquery_storage.types.DataFormat.ARROW,
+            read_options=bigquery_storage.types.ReadSession.TableReadOptions(
+                selected_fields=list(columns or []),
+                row_restriction=row_filter or '',
+            ),
+        )
+        return self.bqstorage_client.create_read_session(
+            parent=f"projects/{self.bq_client.project}",
+            read_session=requested_session,
+            max_stream_count=max_stream_count,
+        )
+
+
+    def helper_read_stream(self, session, stream):
+        # each page of a stream is one arrow record batch
+        for page in self.bqstorage_client.read_rows(stream.name).rows(session).pages:
+            yield page.to_arrow()
+
+
+    def in_filter_builder(self, column, values):
+        """
+        Build a read_bq_table row_filter that matches rows whose column is one of values (compared as strings).
+        """
+        quoted = ", ".join("'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'" for value in values)
+        return f"{column} IN ({quoted})"
+
+
     def table_exists(self, table_id):
         try:
             self.bq_client.get_table(table_id)
@@ -89,6 +408,9 @@ class GoogleCloudClient:
                 table_schema.append(bigquery.SchemaField(col, bigquery.enums.SqlTypeNames.FLOAT64))
             elif str(df.dtypes[col]) == "bool":
                 table_schema.append(bigquery.SchemaField(col, bigquery.enums.SqlTypeNames.BOOL))
+            elif str(df.dtypes[col]).startswith("datetime64[ns, "):
+                # tz-aware datetimes are points in time
+                table_schema.append(bigquery.SchemaField(col, bigquery.enums.SqlTypeNames.TIMESTAMP))
             elif str(df.dtypes[col]).startswith("datetime"):
                 table_schema.append(bigquery.SchemaField(col, bigquery.enums.SqlTypeNames.DATETIME))
             else:
@@ -0,0 +1,234 @@
+# Instrumentation.py
+
+import contextlib
+import json
+import logging
+import re
+import threading
+import time
+
+class Metrics:
+    # upper bounds (in seconds) of the request latency histogram buckets
+    LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+    def __init__(self, prefix='asana_export'):
+        """
+        Thread-safe run metrics shared by AsanaClient and GoogleCloudClient: per-endpoint request counts, latency histograms
+        and bytes, event counters (retries, 429s) and per-stage wall time (teams, projects, tasks, details, flatten, diff, load).
+        Print them with log_summary at the end of a run, or export them as JSON or Prometheus text.
+        """
+        self.prefix = prefix
+        self.endpoints = {}
+        self.counters = {}
+        self.stage_seconds = {}
+        self.started_at = time.perf_counter()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+
+    def record_request(self, endpoint, seconds, status=None, num_bytes=0):
+        """
+        Record one request to an endpoint (e.g. 'GET /tasks/{gid}' or 'bigquery.load'): its latency, status and size.
+        """
+        with self.lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = {
+                    'count': 0, 'seconds': 0.0, 'bytes': 0, 'statuses': {}, 'buckets': [0] * len(self.LATENCY_BUCKETS),
+                }
+            stats['count'] += 1
+            stats['seconds'] += seconds
+            stats['bytes'] += num_bytes
+            if status is not None:
+                stats['statuses'][str(status)] = stats['statuses'].get(str(status), 0) + 1
+            stats['buckets'][next(i for i, bound in enumerate(self.LATENCY_BUCKETS) if seconds <= bound)] += 1
+
+
+    def count(self, name, n=1):
+        """
+        Increment an event counter (e.g. 'asana_retries', 'asana_rate_limited').
+        """
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Time a block as a pipeline stage. Stages nest: while an inner stage runs in the same thread the outer one is paused,
+        so stage times add up to the run time even when streamed stages pull from each other.
+        """
+        stack = self.local.__dict__.setdefault('stack', [])
+        now = time.perf_counter()
+        if stack:
+            self.helper_add_stage_time(stack[-1][0], now - stack[-1][1])
+        stack.append([name, now])
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            stage_name, started_at = stack.pop()
+            self.helper_add_stage_time(stage_name, now - started_at)
+            if stack:
+                stack[-1][1] = now
+
+
+    def timed(self, name, iterable):
+        """
+        Yield from iterable, counting the time spent producing each item as stage name (for lazily streamed stages).
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                item = next(iterator, StopIteration)
+            if item is StopIteration:
+                return
+            yield item
+
+
+    def to_dict(self):
+        """
+        Get every metric as a JSON serializable dict.
+        """
+        with self.lock:
+            return {
+                'run_seconds': time.perf_counter() - self.started_at,
+                'stages': dict(self.stage_seconds),
+                'counters': dict(self.counters),
+                'endpoints': {
+                    endpoint: {
+                        'count': stats['count'],
+                        'seconds': stats['seconds'],
+                        'bytes': stats['bytes'],
+                        'statuses': dict(stats['statuses']),
+                        'latency_buckets': {str(bound): n for bound, n in zip(self.LATENCY_BUCKETS, stats['buckets'])},
+                    }
+                    for endpoint, stats in self.endpoints.items()
+                },
+            }
+
+
+    def to_prometheus(self):
+        """
+        Render the metrics in the Prometheus text exposition format (e.g. for a node_exporter textfile collector).
+        """
+        metrics = self.to_dict()
+        p = self.prefix
+        lines = [f"# TYPE {p}_run_seconds gauge", f"{p}_run_seconds {metrics['run_seconds']:.6f}"]
+        lines.append(f"# TYPE {p}_stage_seconds_total counter")
+        lines += [f'{p}_stage_seconds_total{{stage="{stage}"}} {seconds:.6f}' for stage, seconds in metrics['stages'].items()]
+        lines.append(f"# TYPE {p}_events_total counter")
+        lines += [f'{p}_events_total{{event="{name}"}} {n}' for name, n in metrics['counters'].items()]
+        lines.append(f"# TYPE {p}_requests_total counter")
+        for endpoint, stats in metrics['endpoints'].items():
+            for status, n in stats['statuses'].items():
+                lines.append(f'{p}_requests_total{{endpoint="{endpoint}",status="{status}"}} {n}')
+        lines.append(f"# TYPE {p}_response_bytes_total counter")
+        lines += [f'{p}_response_bytes_total{{endpoint="{endpoint}"}} {stats["bytes"]}' for endpoint, stats in metrics['endpoints'].items()]
+        lines.append(f"# TYPE {p}_request_duration_seconds histogram")
+        for endpoint, stats in metrics['endpoints'].items():
+            cumulative = 0
+            for bound, n in zip(self.LATENCY_BUCKETS, stats['latency_buckets'].values()):
+                cumulative += n
+                le = '+Inf' if bound == float('inf') else bound
+                lines.append(f'{p}_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{le}"}} {cumulative}')
+            lines.append(f'{p}_request_duration_seconds_sum{{endpoint="{endpoint}"}} {stats["seconds"]:.6f}')
+            lines.append(f'{p}_request_duration_seconds_count{{endpoint="{endpoint}"}} {stats["count"]}')
+        return "\n".join(lines) + "\n"
+
+
+    def export(self, path):
+        """
+        Write the metrics to path, as Prometheus text if it ends in .prom and as JSON otherwise.
+        """
+        with open(path, 'w') as f:
+            if path.endswith('.prom'):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.to_dict(), f, indent=2)
+
+
+    def summary(self):
+        """
+        Build a human readable end-of-run summary: stage times, event counters and per-endpoint latency.
+        """
+        metrics = self.to_dict()
+        lines = [f"Run took {metrics['run_seconds']:.1f}s"]
+        for stage, seconds in sorted(metrics['stages'].items(), key=lambda item: -item[1]):
+            lines.append(f"  stage {stage:<10} {seconds:10.1f}s")
+        for name, n in sorted(metrics['counters'].items()):
+            lines.append(f"  {name:<16} {n:10}")
+        for endpoint, stats in sorted(metrics['endpoints'].items(), key=lambda item: -item[1]['seconds']):
+            mean = stats['seconds'] / stats['count']
+            p95 = self.helper_bucket_quantile(list(stats['latency_buckets'].values()), 0.95)
+            lines.append(
+                f"  {endpoint:<40} {stats['count']:8} calls  mean {mean * 1000:8.1f}ms  p95 <= {p95}s  "
+                f"{stats['bytes'] / 2**20:8.1f} MiB  statuses {stats['statuses']}"
+            )
+        return "\n".join(lines)
+
+
+    def log_summary(self):
+        logging.info(f"Run metrics:\n{self.summary()}")
+
+
+    def helper_add_stage_time(self, name, seconds):
+        with self.lock:
+            self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + seconds
+
+
+    def helper_bucket_quantile(self, bucket_counts, quantile):
+        # upper bound of the histogram bucket the quantile falls in
+        threshold = quantile * sum(bucket_counts)
+        cumulative = 0
+        for bound, n in zip(self.LATENCY_BUCKETS, bucket_counts):
+            cumulative += n
+            if cumulative >= threshold:
+                return bound
+        return self.LATENCY_BUCKETS[-1]
+
+
+class ProgressLogger:
+    def __init__(self, label, total=None, interval=10.0):
+        """
+        Log the progress of a loop at most once every interval seconds, instead of once per item.
+        """
+        self.label = label
+        self.total = total
+        self.interval = interval
+        self.count = 0
+        self.started_at = self.logged_at = time.monotonic()
+
+
+    def update(self, n=1):
+        """
+        Count n more processed items, logging if the interval has passed since the last log line.
+        """
+        self.count += n
+        now = time.monotonic()
+        if now - self.logged_at >= self.interval:
+            self.logged_at = now
+            self.helper_log(now)
+
+
+    def done(self):
+        """
+        Log the final count.
+        """
+        self.helper_log(time.monotonic())
+
+
+    def helper_log(self, now):
+        elapsed = now - self.started_at
+        rate = self.count / elapsed if elapsed > 0 else 0.0
+        total = self.total if self.total is not None else 'unknown'
+        logging.info(f"{self.label} - Processed {self.count} out of {total} ({rate:.1f}/s)")
+
+
+def endpoint_from_url(method, url):
+    """
+    Name an Asana request by method and path, with gids replaced so all tasks share one endpoint (e.g. 'GET /tasks/{gid}').
+    """
+    path = re.sub(r'^https?://[^/]+', '', url).split('?')[0]
+    path = re.sub(r'^/api/1\.0', '', path)
+    return f"{method} {re.sub(r'/[0-9]+', '/{gid}', path)}"
@@ -0,0 +1,47 @@
+# LazyImport.py
+
+import importlib
+import threading
+
+class LazyModule:
+    def __init__(self, name):
+        """
+        Stand-in for a module that is only imported when one of its attributes is first used
+        (see lazy_import). Importing pandas, pyarrow, asana and the Google Cloud libraries takes up to a few seconds,
+        which every entry point would otherwise pay at startup, even on code paths that never use them.
+        """
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+        self.__dict__['_lock'] = threading.Lock()
+
+
+    def __getattr__(self, attribute):
+        return getattr(self.helper_load(), attribute)
+
+
+    def __setattr__(self, attribute, value):
+        setattr(self.helper_load(), attribute, value)
+
+
+    def __repr__(self):
+        state = 'loaded' if self.__dict__['_module'] is not None else 'not loaded'
+        return f"<lazy module '{self.__dict__['_name']}' ({state})>"
+
+
+    def helper_load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            # worker threads can touch the module at the same time, it is imported once
+            with self.__dict__['_lock']:
+                module = self.__dict__['_module']
+                if module is None:
+                    module = self.__dict__['_module'] = importlib.import_module(self.__dict__['_name'])
+        return module
+
+
+def lazy_import(name):
+    """
+    Return a module that is imported on first attribute access, e.g. pd = lazy_import('pandas') instead of import pandas as pd.
+    A missing optional dependency then only fails on the code path that needs it.
+    """
+    return LazyModule(name)
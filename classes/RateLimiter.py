@@ -0,0 +1,69 @@
+# RateLimiter.py
+
+import multiprocessing
+import threading
+import time
+
+class TokenBucket:
+    def __init__(self, requests_per_minute=1500, burst=None):
+        """
+        Thread-safe token bucket shared by every worker that calls the Asana API.
+        Asana allows 150 requests per minute on free workspaces and 1500 on paid ones.
+        """
+        self.rate = requests_per_minute / 60.0
+        self.capacity = burst or max(1, int(self.rate))
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+
+    def acquire(self):
+        """
+        Block until a request token is available (and any Retry-After pause has passed).
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                    self.updated_at = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+    def pause(self, seconds):
+        """
+        Stop handing out tokens for the given number of seconds (used when Asana answers with a 429 and Retry-After).
+        """
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.updated_at = self.paused_until
+            self.tokens = 0.0
+
+
+def shared_field(index):
+    # a float attribute stored in the bucket's shared memory array
+    return property(lambda self: self.state[index], lambda self, value: self.state.__setitem__(index, value))
+
+
+class SharedTokenBucket(TokenBucket):
+    tokens = shared_field(0)
+    updated_at = shared_field(1)
+    paused_until = shared_field(2)
+
+    def __init__(self, requests_per_minute=1500, burst=None):
+        """
+        Token bucket kept in shared memory, so several worker processes (e.g. the shards of sharded_runner.py) draw from
+        one global request budget, and a Retry-After pause in one process pauses them all.
+        Create it in the parent process and hand it to the workers when they start (e.g. as a pool initializer argument).
+        """
+        self.rate = requests_per_minute / 60.0
+        self.capacity = burst or max(1, int(self.rate))
+        self.state = multiprocessing.Array('d', [float(self.capacity), time.monotonic(), 0.0], lock=False)
+        self.lock = multiprocessing.Lock()
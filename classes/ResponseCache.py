@@ -0,0 +1,100 @@
+# ResponseCache.py
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+class ResponseCache:
+    # how long (in seconds) each kind of response stays fresh
+    DEFAULT_TTLS = {
+        'me': 24 * 3600,
+        'teams': 24 * 3600,
+        'projects': 3600,
+        'custom_fields': 3600,
+        'task': 30 * 24 * 3600,
+    }
+
+    def __init__(self, path='cache/asana_responses.sqlite', ttls=None, max_entries=500000):
+        """
+        On-disk cache of Asana API responses in SQLite, used by AsanaClient(cache=...).
+        Entries expire after a per-resource TTL, and once there are more than max_entries the least recently used are dropped.
+        An entry stored with a version (e.g. a task's modified_at) is only returned for that same version.
+        Any object with the same get/set methods can be passed to AsanaClient instead.
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.ttls = {**self.DEFAULT_TTLS, **(ttls or {})}
+        self.max_entries = max_entries
+        self.sets_since_eviction = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                resource TEXT,
+                key TEXT,
+                version TEXT,
+                value TEXT,
+                stored_at REAL,
+                accessed_at REAL,
+                PRIMARY KEY (resource, key)
+            )
+        """)
+        self.connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+
+
+    def get(self, resource, key, version=None):
+        """
+        Get a cached response, or None if it is missing, expired or stored for another version.
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT version, value, stored_at FROM responses WHERE resource = ? AND key = ?", (resource, str(key))
+            ).fetchone()
+            if row is None:
+                return None
+            stored_version, value, stored_at = row
+            if stored_version != version or time.time() - stored_at > self.ttls.get(resource, 0):
+                return None
+            self.connection.execute(
+                "UPDATE responses SET accessed_at = ? WHERE resource = ? AND key = ?", (time.time(), resource, str(key))
+            )
+        return json.loads(value)
+
+
+    def set(self, resource, key, value, version=None):
+        """
+        Store a response (anything JSON serializable), replacing any previous entry for the same key.
+        """
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (resource, str(key), version, json.dumps(value), now, now),
+            )
+            # only check the size every so often, the cap doesn't need to be exact
+            self.sets_since_eviction += 1
+            if self.sets_since_eviction >= 1000:
+                self.sets_since_eviction = 0
+                self.evict()
+
+
+    def evict(self):
+        """
+        Drop the least recently used entries above max_entries (call with the lock held).
+        """
+        self.connection.execute(
+            "DELETE FROM responses WHERE rowid IN (SELECT rowid FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+
+    def clear(self):
+        """
+        Remove every cached response.
+        """
+        with self.lock:
+            self.connection.execute("DELETE FROM responses")
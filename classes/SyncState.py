@@ -0,0 +1,66 @@
+# SyncState.py
+
+import json
+import os
+
+try:
+    import fcntl
+except ImportError:
+    # no advisory file locks (Windows): saves still merge, but two processes saving at the same instant can race
+    fcntl = None
+
+class SyncStateStore:
+    def __init__(self, path):
+        """
+        Persist sync state between runs in a local JSON file, grouped by section
+        (e.g. the last seen modified_at for each project).
+        Several processes can share a file: save only writes back the keys this store set, merged into what is on disk.
+        """
+        self.path = path
+        self.state = self.helper_read()
+        # (section, key) pairs set since the last save
+        self.changed = set()
+
+
+    def get(self, section, key, default=None):
+        """
+        Get the stored value for a key within a section.
+        """
+        return self.state.get(section, {}).get(key, default)
+
+
+    def set(self, section, key, value):
+        """
+        Set the value for a key within a section (kept in memory until save is called).
+        """
+        self.state.setdefault(section, {})[key] = value
+        self.changed.add((section, key))
+
+
+    def save(self):
+        """
+        Write the keys set since the last save to disk, on top of the file as it is now (so values other processes saved
+        in the meantime are kept and picked up), replacing the previous file in one step so a crash never leaves it half written.
+        """
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(f"{self.path}.lock", 'w') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            state = self.helper_read()
+            for section, key in self.changed:
+                state.setdefault(section, {})[key] = self.state[section][key]
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(state, f)
+            os.replace(temp_path, self.path)
+        self.state = state
+        self.changed = set()
+
+
+    def helper_read(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path) as f:
+            return json.load(f)
@@ -0,0 +1,95 @@
+# TaskStore.py
+
+import sys
+
+from classes.LazyImport import lazy_import
+
+pd = lazy_import('pandas')
+
+class TaskStore:
+    def __init__(self, flatten, columns=None, intern_max_length=64):
+        """
+        Compact in-memory store of flattened tasks, kept as one list per column instead of one nested dict per task.
+        flatten turns a raw task into a flat dict (e.g. AsanaClient.helper_clean_task_data or TaskFlattener(cols).flatten),
+        so the raw task can be dropped as soon as it is added.
+        Strings up to intern_max_length characters are interned, so values repeated across tasks
+        (workspace_name, team_name, assignee_name, ...) are stored once.
+        With columns the store keeps exactly those columns, otherwise columns are added in the order they first appear.
+        """
+        self.flatten = flatten
+        self.fixed_columns = columns is not None
+        self.columns = {column: [] for column in (columns or [])}
+        self.intern_max_length = intern_max_length
+        self.num_rows = 0
+
+
+    def __len__(self):
+        return self.num_rows
+
+
+    def append(self, task):
+        """
+        Flatten a raw task and add its values to the columns.
+        """
+        values = self.flatten(task)
+        for column, value in values.items():
+            column_values = self.columns.get(column)
+            if column_values is None:
+                if self.fixed_columns:
+                    continue
+                # a column first seen now is None for every earlier task
+                column_values = self.columns[column] = [None] * self.num_rows
+            if type(value) is str and len(value) <= self.intern_max_length:
+                value = sys.intern(value)
+            column_values.append(value)
+        self.num_rows += 1
+        # columns the task didn't have are None for it
+        for column_values in self.columns.values():
+            if len(column_values) < self.num_rows:
+                column_values.append(None)
+
+
+    def extend(self, task_list):
+        """
+        Add every task of a list or generator.
+        """
+        for task in task_list:
+            self.append(task)
+        return self
+
+
+    def extend_columns(self, values):
+        """
+        Add a batch of already flattened tasks, given as one list of values per column (e.g. TaskFlattener.flatten_batch).
+        """
+        num_rows = len(next(iter(values.values()), []))
+        for column, batch_values in values.items():
+            column_values = self.columns.get(column)
+            if column_values is None:
+                if self.fixed_columns:
+                    continue
+                column_values = self.columns[column] = [None] * self.num_rows
+            column_values.extend(
+                sys.intern(value) if type(value) is str and len(value) <= self.intern_max_length else value
+                for value in batch_values
+            )
+        self.num_rows += num_rows
+        # columns the batch didn't have are None for its tasks
+        for column_values in self.columns.values():
+            if len(column_values) < self.num_rows:
+                column_values.extend([None] * (self.num_rows - len(column_values)))
+        return self
+
+
+    def column(self, column):
+        """
+        Get the values of one column (a list with one value per task).
+        """
+        return self.columns[column]
+
+
+    def to_dataframe(self):
+        """
+        Build a DataFrame with one row per task and the columns in store order.
+        """
+        return pd.DataFrame(self.columns, columns=list(self.columns))
@@ -0,0 +1,29 @@
+# Transforms.py
+
+from classes.LazyImport import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+
+def to_datetime_columns(df, columns, floor='D'):
+    """
+    Parse date columns in one vectorized pass each, into tz-naive UTC datetime64 columns (loaded to BigQuery as DATETIME).
+    Values that can't be parsed become NaT instead of raising. With floor (default 'D') the time of day is dropped,
+    like the old '%Y-%m-%d' strings; pass floor=None to keep full timestamps.
+    """
+    for column in columns:
+        values = pd.to_datetime(df[column], errors='coerce', utc=True).dt.tz_localize(None)
+        df[column] = values.dt.floor(floor) if floor else values
+    return df
+
+
+def weeks_ago_buckets(dates, now=None, max_weeks=4):
+    """
+    Bucket a datetime column by whole weeks before now: '0', '1', ... up to str(max_weeks), then f'{max_weeks}+'.
+    dates should be tz-naive UTC (see to_datetime_columns); missing dates give None.
+    """
+    now = now or pd.Timestamp.now(tz='UTC').tz_localize(None)
+    weeks = (now - pd.to_datetime(dates)).dt.days // 7
+    buckets = np.where(weeks > max_weeks, f'{max_weeks}+', weeks.fillna(0).astype(int).astype(str))
+    return pd.Series(buckets, index=dates.index, dtype=object).where(weeks.notna(), None)
@@ -0,0 +1,179 @@
+# Event-driven version of example.py: instead of crawling every project, changed task gids come from the Asana events API
+# (poll mode) or from Asana webhooks (webhook mode) into a durable local queue, and a consumer loads just those tasks into
+# BigQuery in micro-batches (one staging load and MERGE per batch). replay mode feeds recorded event payloads instead.
+# Run a full sync with example.py first, then from the repository root:
+#   python -m example_job.events poll
+#   python -m example_job.events webhook --public-url https://example.com --port 8090
+#   python -m example_job.events replay recorded_events.jsonl
+
+import argparse
+import datetime
+import logging
+import os
+import time
+from classes.GoogleCloud import GoogleCloudClient
+from classes.Asana import AsanaClient
+from classes.EventQueue import EventQueue
+from classes.Flattener import CustomFieldFlattener
+from classes.Events import EventPoller, WebhookReceiver, load_recorded_events, task_changes_from_events
+from classes.Instrumentation import Metrics
+from classes.SyncState import SyncStateStore
+from dotenv import load_dotenv
+
+from example_job.example import add_last_update_n_weeks_ago, clean_task_details, cluster_fields, partition_field, report_metrics
+
+load_dotenv()
+logging.basicConfig(level=logging.INFO)
+
+
+##### HELPER FUNCTIONS #####
+
+def enrich_task_detail(task_detail, project_gid, project_index):
+    #project_name/team_name as the crawl sets them, from the project the event came from or else the task's first known project
+    project_gids = [project_gid] + [project['gid'] for project in task_detail.get('projects') or []]
+    project = next((project_index[gid] for gid in project_gids if gid in project_index), None)
+    if project:
+        task_detail['project_name'] = project['name']
+        task_detail['team_name'] = project['team_name']
+    return task_detail
+
+
+def process_batch(client, gcc, items, table_id, project_index, max_workers=10, custom_fields=None):
+    #fetch the details of one micro-batch of queued changes and load it: tasks that still exist are merged by permalink_url,
+    #tasks that can no longer be fetched are flagged deleted by gid. A 'deleted' event is fetched too and only counts once
+    #Asana answers 404 for the task, so an event alone (e.g. a forged delivery) never flags a task deleted
+    #details come through the batch API, 10 tasks per request; tasks that are gone (404/403) are left out of the result
+    insert_timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    with gcc.metrics.stage('details'):
+        fetched = {task_detail['gid']: task_detail for task_detail in client.get_task_details_batched(items, max_workers=max_workers, enrich_keys=())}
+    deleted_gids = []
+    task_details = []
+    for item in items:
+        if item['gid'] in fetched:
+            task_details.append(enrich_task_detail(fetched[item['gid']], item['project_gid'], project_index))
+        else:
+            deleted_gids.append(item['gid'])
+    if task_details:
+        with gcc.metrics.stage('flatten'):
+            df = clean_task_details(client, task_details, custom_fields)
+            df = add_last_update_n_weeks_ago(df)
+        data = { "table_id": table_id, "data": df, "partition_field": partition_field, "cluster_fields": cluster_fields }
+        with gcc.metrics.stage('load'):
+            #only the changed tasks are in the batch, so nothing else is marked deleted
+            gcc.upsert(data, 'permalink_url', insert_timestamp, detect_deletes=False)
+    if deleted_gids:
+        with gcc.metrics.stage('load'):
+            gcc.mark_deleted(table_id, 'gid', deleted_gids, insert_timestamp)
+    gcc.metrics.count('event_tasks_loaded', len(task_details))
+    gcc.metrics.count('event_tasks_deleted', len(deleted_gids))
+
+
+def drain_queue(client, gcc, queue, table_id, project_index, batch_size=500, max_workers=10, custom_fields=None):
+    #process micro-batches until the queue is empty; a failed batch goes back to the queue and stops the drain
+    processed = 0
+    while True:
+        items = queue.take(batch_size)
+        if not items:
+            return processed
+        try:
+            process_batch(client, gcc, items, table_id, project_index, max_workers, custom_fields)
+        except Exception:
+            queue.release(items)
+            raise
+        queue.ack(items)
+        processed += len(items)
+        logging.info(f"Loaded {len(items)} queued changes ({len(queue)} left in the queue)")
+
+
+def run_rounds(run_round, poll_interval, max_rounds=None, metrics=None, max_backoff=600):
+    #call run_round every poll_interval seconds. A failed round (e.g. a BigQuery or Asana outage) is logged and retried
+    #after a backoff that doubles with every failure in a row, up to max_backoff; its batch is still in the queue
+    rounds = 0
+    failures = 0
+    while max_rounds is None or rounds < max_rounds:
+        try:
+            run_round()
+            failures = 0
+        except Exception:
+            failures += 1
+            logging.exception(f"Round failed ({failures} in a row), the queued changes are retried")
+            if metrics:
+                metrics.count('event_round_errors')
+        rounds += 1
+        if max_rounds is None or rounds < max_rounds:
+            time.sleep(min(poll_interval * 2 ** failures, max(max_backoff, poll_interval)))
+    return rounds
+
+
+##### CORE JOB #####
+
+def main(mode, workspace, token, replay_path=None, queue_path='state/event_queue.sqlite', state_path='state/events_state.json', poll_interval=30, batch_size=500, max_workers=10, public_url=None, host='0.0.0.0', port=8090, record_path=None, max_rounds=None, metrics_path=None):
+
+    metrics = Metrics()
+    client = AsanaClient(token, max_workers=max_workers, metrics=metrics)
+    gid_for_workspace = client.get_workspace_id_by_workspace_name(workspace)
+
+    #project names and teams for the changed tasks, from one workspace listing
+    project_list = client.get_projects_with_team_from_workspace(gid_for_workspace)
+    project_index = {project['gid']: project for project in project_list}
+    #the same typed cf_ columns as the full sync
+    custom_fields = CustomFieldFlattener(client.get_custom_fields(gid_for_workspace))
+
+    queue = EventQueue(queue_path)
+    #sync tokens and webhook secrets live apart from example.py's modified_at high-water marks (state/sync_state.json)
+    sync_state = SyncStateStore(state_path)
+    table_id = f"{os.getenv('BIGQUERY_PROJECT_ID')}.{os.getenv('BIGQUERY_DATASET_ID')}.{os.getenv('BIGQUERY_TABLE_ID')}"
+    gcc = GoogleCloudClient(service_account_path='service_accounts/sa.json', write_disposition='WRITE_TRUNCATE', metrics=metrics)
+
+    #replay queues recorded payloads and loads them once
+    if mode == 'replay':
+        for events, project_gid in load_recorded_events(replay_path):
+            queue.put_many(task_changes_from_events(events, project_gid))
+        drain_queue(client, gcc, queue, table_id, project_index, batch_size, max_workers, custom_fields)
+        report_metrics(metrics, metrics_path)
+        return
+
+    receiver = None
+    if mode == 'webhook':
+        receiver = WebhookReceiver(queue, sync_state, host, port, record_path).start()
+        #subscribe every project that has no confirmed webhook yet (the handshake needs the receiver running)
+        if public_url:
+            for project in project_list:
+                if not sync_state.get(receiver.section, project['gid']):
+                    receiver.subscribe(client, project['gid'], f"{public_url.rstrip('/')}/webhooks/{project['gid']}")
+    poller = EventPoller(client, queue, sync_state) if mode == 'poll' else None
+
+    #each round polls (in poll mode) and loads whatever is queued, then waits for poll_interval
+    def run_round():
+        if poller:
+            with metrics.stage('events'):
+                poller.poll(project_list)
+        drain_queue(client, gcc, queue, table_id, project_index, batch_size, max_workers, custom_fields)
+
+    try:
+        run_rounds(run_round, poll_interval, max_rounds, metrics)
+    except KeyboardInterrupt:
+        logging.info("Stopping")
+    finally:
+        if receiver:
+            receiver.stop()
+        report_metrics(metrics, metrics_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load changed Asana tasks into BigQuery from the events API, webhooks or recorded events.")
+    parser.add_argument('mode', choices=['poll', 'webhook', 'replay'])
+    parser.add_argument('replay_path', nargs='?', help="JSON lines file of recorded event payloads (replay mode)")
+    parser.add_argument('--workspace', default="3Q Digital")
+    parser.add_argument('--interval', type=float, default=30, help="seconds between polls / queue drains")
+    parser.add_argument('--batch-size', type=int, default=500, help="queued changes loaded per BigQuery MERGE")
+    parser.add_argument('--public-url', help="public base URL of the webhook receiver, to subscribe every project (webhook mode)")
+    parser.add_argument('--port', type=int, default=8090, help="port of the webhook receiver")
+    parser.add_argument('--record', help="append received webhook payloads to this file, for replay")
+    parser.add_argument('--metrics-path', help="export run metrics here (.prom for Prometheus text, otherwise JSON)")
+    args = parser.parse_args()
+    if args.mode == 'replay' and not args.replay_path:
+        parser.error("replay mode needs a replay_path")
+
+    ASANA_PERSONAL_ACCESS_TOKEN = os.getenv('ASANA_PERSONAL_ACCESS_TOKEN')
+    main(args.mode, args.workspace, ASANA_PERSONAL_ACCESS_TOKEN, replay_path=args.replay_path, poll_interval=args.interval, batch_size=args.batch_size, public_url=args.public_url, port=args.port, record_path=args.record, metrics_path=args.metrics_path)
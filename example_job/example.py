@@ -3,12 +3,20 @@
 
 import logging
 import os
-import pandas as pd 
 import datetime 
 from classes.GoogleCloud import GoogleCloudClient
 from classes.Asana import AsanaClient
+from classes.ResponseCache import ResponseCache
+from classes.Flattener import CustomFieldFlattener, TaskFlattener
+from classes.Instrumentation import Metrics, ProgressLogger
+from classes.LazyImport import lazy_import
+from classes.SyncState import SyncStateStore
+from classes.TaskStore import TaskStore
+from classes.Transforms import to_datetime_columns, weeks_ago_buckets
 from dotenv import load_dotenv
 
+pd = lazy_import('pandas')
+
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
 
@@ -18,6 +26,14 @@ logging.basicConfig(level=logging.INFO)
 #date cols
 date_cols_to_convert = ['modified_at', 'created_at', 'completed_at', 'due_on']
 
+#date cols kept at full timestamp resolution instead of the day: the upsert MERGE and compare_dfs tell a changed row
+#by its modified_at, so an edit later on the same day has to change it
+timestamp_cols = ['modified_at']
+
+#new tables are partitioned by day of modified_at and clustered, so queries on recent or team/project slices scan less
+partition_field = 'modified_at'
+cluster_fields = ['team_name', 'projects_gid']
+
 #get speciifc cols
 cols = [
     'gid',
@@ -41,13 +57,55 @@ cols = [
     'memberships_section_gid',
     'memberships_section_name',
     'resource_type',
+    'parent_gid',
+    'subtask_level',
+]
+
+#fields requested on the project task listing so the cols above come back without a per-task detail call
+#(nested objects always include their gid, team_name is added from the project)
+task_opt_fields = [
+    'assignee.name',
+    'workspace.name',
+    'projects.name',
+    'name',
+    'notes',
+    'permalink_url',
+    'completed',
+    'modified_at',
+    'created_at',
+    'completed_at',
+    'due_on',
+    'followers.name',
+    'memberships.section.name',
+    'resource_type',
+    'parent.name',
+    'num_subtasks',
+    'custom_fields.name',
+    'custom_fields.resource_subtype',
+    'custom_fields.display_value',
+    'custom_fields.text_value',
+    'custom_fields.number_value',
+    'custom_fields.enum_value.name',
+    'custom_fields.multi_enum_values.name',
+    'custom_fields.date_value.date',
+    'custom_fields.people_value.name',
 ]
 
 ##### HELPER FUNCTIONS #####
 
+def get_all_teams(client, workspace, output_dir=None, export=True):
+    teams_object = client.get_teams(workspace)
+    team_list = list(teams_object)
+    logging.info(f"Number of teams: {len(team_list)}")
+    if export:
+        client.helper_write_list_of_objects_to_json(team_list, f'{output_dir}/teams.json')
+    return team_list
+
+
 def get_projects_for_team(client, team_list):
-    for i, team in enumerate(team_list):
-        logging.info(f"Getting Projects - Processed {i} teams out of {len(team_list)}")
+    progress = ProgressLogger("Getting Projects", len(team_list))
+    for team in team_list:
+        progress.update()
         projects_object = client.get_projects_from_team(team['gid'])
         projects_list = list(projects_object)
         # if projects exist, then append team to each item and yield
@@ -55,172 +113,301 @@ def get_projects_for_team(client, team_list):
             for project in projects_list:
                 project['team_name'] = team['name']
                 yield project     
+    progress.done()
 
 
-def get_tasks_from_project_list(client, projects_list):
-    for i, project in enumerate(projects_list):
-        logging.info(f"Getting Tasks - Processed {i} projects out of {len(projects_list)}")
-        tasks_object = client.list_tasks_by_project(project['gid'])
+def get_tasks_from_project_list(client, projects_list, opt_fields=None, sync_state=None):
+    progress = ProgressLogger("Getting Tasks", len(projects_list))
+    for project in projects_list:
+        progress.update()
+        # with sync_state, only ask for tasks modified since the project's high-water mark and advance it
+        modified_since = sync_state.get('modified_at', project['gid']) if sync_state else None
+        tasks_object = client.list_tasks_by_project(project['gid'], opt_fields, modified_since)
         tasks_list = list(tasks_object)
+        if sync_state:
+            modified_at_values = [task['modified_at'] for task in tasks_list if task.get('modified_at')]
+            if modified_at_values:
+                sync_state.set('modified_at', project['gid'], max(modified_at_values + [modified_since or '']))
         if len(tasks_list) > 0:
             for task in tasks_list:
                 # add the project and team name to the task
                 task['project_name'] = project['name']
                 task['team_name'] = project['team_name']
                 yield task
+    progress.done()
 
 
-def get_task_details_from_task_list(client, task_list):
-    for i, task in enumerate(task_list):
-        logging.info(f"Task Details - Processed {i} tasks out of {len(task_list)}")
-        task_detail = client.get_task_details_by_gid(task['gid'])
-        task_detail['project_name'] = task['project_name']
-        task_detail['team_name'] = task['team_name']
-        yield task_detail
+def get_task_details_from_task_list(client, task_list, max_workers=None, batch=False):
+    # fetch details with a pool of workers when max_workers is set, otherwise one task at a time
+    # with batch, 10 tasks are fetched per request through the batch API (max_workers requests at a time)
+    # task_list can also be a generator when the pipeline is streamed
+    progress = ProgressLogger("Task Details", len(task_list) if hasattr(task_list, '__len__') else None)
+    if batch:
+        for task_detail in client.get_task_details_batched(task_list, max_workers=max_workers):
+            progress.update()
+            yield task_detail
+    elif max_workers:
+        for task_detail in client.get_task_details_concurrently(task_list, max_workers=max_workers):
+            progress.update()
+            yield task_detail
+    else:
+        for task in task_list:
+            progress.update()
+            task_detail = client.get_task_details_by_gid(task['gid'], task.get('modified_at'))
+            task_detail['project_name'] = task['project_name']
+            task_detail['team_name'] = task['team_name']
+            yield task_detail
+    progress.done()
 
 
 def compare_dfs(df1, df2, col_unique_identifier, insert_timestamp):
 
-    # Get a list of unique values for the unique identifier column from both dataframes
-    unique_identifier_values = list(set(df1[col_unique_identifier].tolist() + df2[col_unique_identifier].tolist()))
-    
-    # create final cols
-    newcols = ['change_status', 'last_change_seen']
-    
-    # convert df1.columns to column list and add new cols
-    cols = df1.columns.tolist() + newcols
-    
-    # create an empty df to store the results
-    result = pd.DataFrame(columns=cols)
-
-    # Iterate through the unique identifier values
-    for unique_id in unique_identifier_values:
-        # check if unique_id is in df1
-        if df1[col_unique_identifier].isin([unique_id]).any():
-            # check if unique_id is in df2
-            if df2[col_unique_identifier].isin([unique_id]).any():
-                # check if modified_at is the same
-                d1_value = df1[df1[col_unique_identifier] == unique_id]['modified_at'].values[0]
-                d2_value = df2[df2[col_unique_identifier] == unique_id]['modified_at'].values[0]
-                if d1_value == d2_value:
-                    # If the values are equal, set the change status to "existing"
-                    temp_df = df1[df1[col_unique_identifier] == unique_id]
-                    temp_df.loc[:, 'change_status'] = 'existing'
-                    result = pd.concat([result, temp_df], ignore_index=True)
-                else:
-                    # If the values are not equal, set the change status to "updated"
-                    temp_df = df1[df1[col_unique_identifier] == unique_id]
-                    temp_df.loc[:, 'change_status'] = 'updated'
-                    temp_df.loc[:, 'last_change_seen'] = insert_timestamp
-                    result = pd.concat([result, temp_df], ignore_index=True)
-            else:
-                # If the unique identifier (asana url) exists in df1 but not in df2, set the change status to "new"
-                temp_df = df1[df1[col_unique_identifier] == unique_id]
-                temp_df.loc[:, 'change_status'] = 'new'
-                temp_df.loc[:, 'last_change_seen'] = insert_timestamp
-                result = pd.concat([result, temp_df], ignore_index=True)
-        else:
-            # If the unique identifier (asana url) exists in df2 but not in df1, set the change status to "deleted"
-            temp_df = df2[df2[col_unique_identifier] == unique_id]
-            temp_df.loc[:, 'change_status'] = 'deleted'
-            temp_df.loc[:, 'last_change_seen'] = insert_timestamp            
-            result = pd.concat([result, temp_df], ignore_index=True)
-    return result
+    # line up the first modified_at per unique id from both dataframes in a single outer merge
+    keys = df1[[col_unique_identifier, 'modified_at']].drop_duplicates(subset=[col_unique_identifier]).merge(
+        df2[[col_unique_identifier, 'modified_at']].drop_duplicates(subset=[col_unique_identifier]),
+        on=col_unique_identifier,
+        how='outer',
+        suffixes=('_new', '_old'),
+        indicator=True,
+    )
+    
+    # ids in both with the same modified_at are "existing", otherwise "updated" (a missing modified_at never matches, not even
+    # another missing one, as NaN/NaT never compared equal row by row either)
+    # ids only in df1 (new data) are "new", ids only in df2 (asana urls no longer returned) are "deleted"
+    unchanged = keys['modified_at_new'] == keys['modified_at_old']
+    keys['change_status'] = 'updated'
+    keys.loc[unchanged, 'change_status'] = 'existing'
+    keys.loc[keys['_merge'] == 'left_only', 'change_status'] = 'new'
+    keys.loc[keys['_merge'] == 'right_only', 'change_status'] = 'deleted'
+    keys = keys[[col_unique_identifier, 'change_status']]
+    
+    # every row of df1 gets its status, only the deleted rows are taken from df2
+    current = df1.merge(keys, on=col_unique_identifier, how='left')
+    current['last_change_seen'] = insert_timestamp
+    current['last_change_seen'] = current['last_change_seen'].where(current['change_status'] != 'existing')
+    deleted = df2[df2[col_unique_identifier].isin(keys.loc[keys['change_status'] == 'deleted', col_unique_identifier])]
+    deleted = deleted.assign(change_status='deleted', last_change_seen=insert_timestamp)
+    
+    return pd.concat([current, deleted], ignore_index=True)
 
 
 def last_updated_in_n_weeks(df, last_modified_date):
-    # check modified col and create a new col called "last_update_n_weeks_ago" and include 1, 2, 3, 4, or 4+ weeks ago
-    df['last_update_n_weeks_ago'] = df[last_modified_date].apply(lambda x: (datetime.datetime.now() - x).days // 7)
-    df['last_update_n_weeks_ago'] = df['last_update_n_weeks_ago'].apply(lambda x: '4+' if x > 4 else x)
+    # check modified col and create a new col called "last_update_n_weeks_ago" and include 0, 1, 2, 3, 4, or 4+ weeks ago
+    df['last_update_n_weeks_ago'] = weeks_ago_buckets(df[last_modified_date])
     return df
 
 
-def try_to_convert_to_formatted_date(x):
+def clean_task_details(client, task_detail_list, custom_fields=None, flatten_batch_size=5000):
+    #flatten only cols out of the task details, flatten_batch_size tasks at a time straight into columns (flatten_batch),
+    #kept in a compact column store, so a list or generator of raw task dicts never has to be held at once
+    #(list values such as every follower or membership are kept, comma separated)
+    #with custom_fields (a CustomFieldFlattener of the workspace's fields) every custom field gets a typed cf_ column
+    task_flattener = TaskFlattener(cols)
+    custom_fields = custom_fields or CustomFieldFlattener([])
+    task_store = TaskStore(None, columns=cols + custom_fields.columns)
+    for task_detail_chunk in client.helper_chunk_iterable(task_detail_list, flatten_batch_size):
+        task_store.extend_columns({**task_flattener.flatten_batch(task_detail_chunk), **custom_fields.flatten_batch(task_detail_chunk)})
+    df = task_store.to_dataframe()
+    
+    #top-level tasks are level 0, so the column is an INTEGER in every batch
+    df['subtask_level'] = df['subtask_level'].fillna(0).astype('int64')
+    
+    #number custom fields are loaded as FLOAT even when a batch has no values for them
+    for col in custom_fields.columns_of_type('number'):
+        df[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
+    
+    #convert date cols to datetime (unparseable values become NaT), loaded as DATETIME
+    #timestamp_cols keep the time of day, the other date cols are the day only
+    df = to_datetime_columns(df, timestamp_cols, floor=None)
+    day_cols = [col for col in date_cols_to_convert if col not in timestamp_cols]
+    return to_datetime_columns(df, day_cols + custom_fields.columns_of_type('date'))
+
+
+def add_last_update_n_weeks_ago(df):
+    #modified_at is already a datetime col (see clean_task_details)
+    return last_updated_in_n_weeks(df, 'modified_at')
+
+
+def read_rows_by_key(gcc, table_id, key_column, keys, chunk_size=1000):
+    #read the full stored rows for the given keys, a thousand keys per read so each row filter stays small
+    keys = list(keys)
+    df_list = [
+        gcc.read_bq_table(table_id, row_filter=gcc.in_filter_builder(key_column, keys[start:start + chunk_size]))
+        for start in range(0, len(keys), chunk_size)
+    ]
+    return pd.concat(df_list, ignore_index=True) if df_list else pd.DataFrame()
+
+
+def stream_task_details_to_bigquery(client, gcc, task_detail_list, table_id, insert_timestamp, chunk_size, detect_deletes=True, custom_fields=None):
+    # task details are cleaned and appended to a staging table in chunks of chunk_size, so memory stays bounded
+    # by the chunk size; change detection then runs as one MERGE from the staging table into table_id
+    # if a fetch or load fails part way, the staging table is dropped (merge_from_staging drops it after the MERGE)
+    # the staging table is new (see staging_table_id), so every chunk is appended and one above gcc.load_chunk_size loads concurrently
+    # rows are numbered across chunks so that of a task listed twice the MERGE keeps the first one, as upsert does
+    staging_table_id = gcc.staging_table_id(table_id)
+    load_schema = None
+    row_offset = 0
     try:
-        return pd.to_datetime(x).strftime('%Y-%m-%d')
-    except:
-        return None 
+        for i, task_detail_chunk in enumerate(client.helper_chunk_iterable(task_detail_list, chunk_size)):
+            with gcc.metrics.stage('flatten'):
+                df = clean_task_details(client, task_detail_chunk, custom_fields)
+                df = df.drop_duplicates(subset=['permalink_url'], keep='first')
+                df = add_last_update_n_weeks_ago(df)
+                df[gcc.STAGING_ROW_COLUMN] = range(row_offset, row_offset + len(df))
+                row_offset += len(df)
+            # every chunk is loaded with the schema of the first one so the appends line up
+            load_schema = load_schema or gcc.load_schema_builder(df)
+            data = { "table_id": staging_table_id, "data": df, "load_schema": load_schema }
+            with gcc.metrics.stage('load'):
+                gcc.write_to_bigquery_tables(data, write_disposition='WRITE_APPEND')
+    except BaseException:
+        gcc.bq_client.delete_table(staging_table_id, not_found_ok=True)
+        raise
+    if load_schema is None:
+        logging.info("No task details to load.")
+        return None
+    with gcc.metrics.stage('diff'):
+        return gcc.merge_from_staging(table_id, staging_table_id, 'permalink_url', insert_timestamp, detect_deletes=detect_deletes, partition_field=partition_field, cluster_fields=cluster_fields)
+
+
+def report_metrics(metrics, metrics_path=None):
+    #log the end-of-run summary and optionally export the metrics (.prom for Prometheus text, otherwise JSON)
+    metrics.log_summary()
+    if metrics_path:
+        metrics.export(metrics_path)
 
 
 ##### CORE JOB #####
 
-def main(workspace, output_dir, token):
+def main(workspace, output_dir, token, max_workers=None, opt_fields=None, incremental=False, state_path='state/sync_state.json', merge_upsert=False, chunk_size=None, cache_path=None, workspace_bulk=False, metrics_path=None, batch=False, subtasks=False):
     
     #timestamp for job
     insert_timestamp=datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     
+    #request counts, latencies and stage times of both clients are summarized at the end (and exported to metrics_path)
+    metrics = Metrics()
+    
     #initialize the AsanaClient
-    client = AsanaClient(token)
+    #with cache_path, responses are cached on disk so repeated or restarted runs skip unchanged teams, projects and tasks
+    cache = ResponseCache(cache_path) if cache_path else None
+    client = AsanaClient(token, cache=cache, metrics=metrics)
     
     #get the gid for the workspace
     gid_for_workspace = client.get_workspace_id_by_workspace_name(workspace)
     
-    #get all teams in org
-    team_list = get_all_teams(client, gid_for_workspace, output_dir)
+    #every custom field of the workspace is a typed cf_ column, also for tasks that don't have it
+    custom_fields = CustomFieldFlattener(client.get_custom_fields(gid_for_workspace))
+    
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    
+    #with workspace_bulk, all projects (with their team) come from one workspace listing instead of one call per team
+    if workspace_bulk:
+        with metrics.stage('projects'):
+            project_list = client.get_projects_with_team_from_workspace(gid_for_workspace)
+    else:
+        #get all teams in org
+        with metrics.stage('teams'):
+            team_list = get_all_teams(client, gid_for_workspace, output_dir)
 
-    #get all projects for each team
-    project_list_generator = get_projects_for_team(client, team_list)
-    project_list = list(project_list_generator)
+        #get all projects for each team
+        project_list_generator = get_projects_for_team(client, team_list)
+        project_list = list(metrics.timed('projects', project_list_generator))
 
-    #get all tasks for each project    
-    task_list_generator = get_tasks_from_project_list(client, project_list)
-    task_list = list(task_list_generator)
+    #in incremental mode only tasks modified since the last successful run are fetched
+    #(the listing needs modified_at to advance the per-project high-water mark, and to check cached task details)
+    sync_state = SyncStateStore(state_path) if incremental else None
+    listing_fields = opt_fields or (['modified_at'] if incremental or cache else None)
 
-    #get all task details for each task
-    task_detail_list_generator = get_task_details_from_task_list(client, task_list)
-    task_detail_list = list(task_detail_list_generator)
-    
-    #map the helper function to each task detail
-    task_details_df = pd.DataFrame(map(client.helper_clean_task_data, task_detail_list))
-    
-    #filter task details df to cols
-    df = task_details_df[cols]
-    
-    # #convert date cols to datetime
-    for col in date_cols_to_convert:
-        df[col] = df[col].apply(try_to_convert_to_formatted_date)
+    #get all tasks for each project    
+    task_list_generator = metrics.timed('tasks', get_tasks_from_project_list(client, project_list, listing_fields, sync_state))
     
-    # add "insert_timestamp" column
-    df.assign(insert_timestamp=insert_timestamp)
+    #tasks in several projects are only detailed once in workspace_bulk mode
+    if workspace_bulk:
+        task_list_generator = client.helper_dedupe_by_gid(task_list_generator)
     
     # get table_id
     table_id = f"{os.getenv('BIGQUERY_PROJECT_ID')}.{os.getenv('BIGQUERY_DATASET_ID')}.{os.getenv('BIGQUERY_TABLE_ID')}"
     
-    #query current table if exists
-    df_database = None
+    #initialize the GoogleCloudClient
+    gcc = GoogleCloudClient(service_account_path='service_accounts/sa.json', write_disposition='WRITE_TRUNCATE', metrics=metrics)
+    
+    #with chunk_size the tasks are streamed to BigQuery in chunks instead of being held in memory
+    if chunk_size:
+        task_detail_generator = task_list_generator if opt_fields else metrics.timed('details', get_task_details_from_task_list(client, task_list_generator, max_workers, batch))
+        if subtasks:
+            task_detail_generator = metrics.timed('subtasks', client.get_task_details_with_subtasks(task_detail_generator, opt_fields, max_workers=max_workers))
+        stream_task_details_to_bigquery(client, gcc, task_detail_generator, table_id, insert_timestamp, chunk_size, detect_deletes=not incremental, custom_fields=custom_fields)
+        if sync_state:
+            sync_state.save()
+        report_metrics(metrics, metrics_path)
+        return
     
-    try: 
-        df_database = pd.read_gbq(f"SELECT * FROM `{table_id}`", project_id=os.getenv('BIGQUERY_PROJECT_ID'))
-    except:
-        pass
+    task_list = list(task_list_generator)
     
-    #compare current table to new table
-    if df_database is not None:
-        df = compare_dfs(df, df_database, 'permalink_url', insert_timestamp)
+    if incremental and len(task_list) == 0:
+        logging.info("No tasks modified since the last run.")
+        report_metrics(metrics, metrics_path)
+        return
+
+    #get all task details for each task (not needed when the listing already returned opt_fields)
+    if opt_fields:
+        task_detail_list = task_list
     else:
-        df.loc[:, 'change_status'] = 'new'
-        df.loc[:, 'last_change_seen'] = insert_timestamp
+        task_detail_list = metrics.timed('details', get_task_details_from_task_list(client, task_list, max_workers, batch))
+    
+    #with subtasks, the subtasks of every task (any level deep) are listed through the batch API and added as rows
+    #of their own, with parent_gid and subtask_level
+    if subtasks:
+        task_detail_list = metrics.timed('subtasks', client.get_task_details_with_subtasks(task_detail_list, opt_fields, max_workers=max_workers))
+    
+    #flatten the task details and keep cols
+    with metrics.stage('flatten'):
+        df = clean_task_details(client, task_detail_list, custom_fields)
+    
+    # add "insert_timestamp" column
+    df.assign(insert_timestamp=insert_timestamp)
+    
+    #with merge_upsert the change detection runs server-side in a BigQuery MERGE, so the table is not downloaded
+    #an incremental batch only holds the changed tasks, so it is always merged and every other row stays in BigQuery as it is
+    merge_upsert = merge_upsert or incremental
+    if not merge_upsert:
+        with metrics.stage('diff'):
+            #compare current table (if it exists) to new table
+            if gcc.table_exists(table_id):
+                #only the cols change detection needs are read, full rows only for the stored tasks missing from the batch,
+                #which are the ones a full sync flags as "deleted"
+                df_database = gcc.read_bq_table(table_id, columns=['gid', 'permalink_url', 'modified_at'])
+                in_batch = df_database['permalink_url'].isin(df['permalink_url'])
+                df_deleted = read_rows_by_key(gcc, table_id, 'permalink_url', df_database.loc[~in_batch, 'permalink_url'])
+                df = compare_dfs(df, pd.concat([df_database[in_batch], df_deleted], ignore_index=True), 'permalink_url', insert_timestamp)
+            else:
+                df.loc[:, 'change_status'] = 'new'
+                df.loc[:, 'last_change_seen'] = insert_timestamp
     
     #drop duplicates based on permalink_url
     df = df.drop_duplicates(subset=['permalink_url'], keep='first')
     
-    #create modified_at_datetime col then add last updated weeks ago
-    df['modified_at_datetime'] = df['modified_at'].apply(lambda x: datetime.datetime.strptime(x, '%Y-%m-%d'))
-    df = last_updated_in_n_weeks(df, 'modified_at_datetime')
-    
-    #drop col modified_at_datetime
-    df = df.drop(columns=['modified_at_datetime'])
+    #add last updated weeks ago
+    df = add_last_update_n_weeks_ago(df)
     
     #create a dictionary to pass to the write_to_bigquery_tables method
-    data = { "table_id": table_id, "data": df }
-
-    #initialize the GoogleCloudClient
-    gcc = GoogleCloudClient(service_account_path='service_accounts/sa.json', write_disposition='WRITE_TRUNCATE')
+    data = { "table_id": table_id, "data": df, "partition_field": partition_field, "cluster_fields": cluster_fields }
 
-    #write the data to BigQuery
-    gcc.write_to_bigquery_tables(data)
+    #write the data to BigQuery (upserting only marks tasks missing from the batch as deleted on a full sync)
+    with metrics.stage('load'):
+        if merge_upsert:
+            gcc.upsert(data, 'permalink_url', insert_timestamp, detect_deletes=not incremental)
+        else:
+            gcc.write_to_bigquery_tables(data)
+    
+    #only advance the high-water marks once the load succeeded
+    if sync_state:
+        sync_state.save()
+    
+    report_metrics(metrics, metrics_path)
 
 
 if __name__ == '__main__':
     ASANA_PERSONAL_ACCESS_TOKEN = os.getenv('ASANA_PERSONAL_ACCESS_TOKEN')
-    main(workspace="3Q Digital", output_dir="export_data", token=ASANA_PERSONAL_ACCESS_TOKEN)
\ No newline at end of file
+    main(workspace="3Q Digital", output_dir="export_data", token=ASANA_PERSONAL_ACCESS_TOKEN, max_workers=10, opt_fields=task_opt_fields, merge_upsert=True, chunk_size=5000, workspace_bulk=True)
\ No newline at end of file
@@ -1,24 +1,29 @@
-import pandas as pd
 from classes.GoogleCloud import GoogleCloudClient
+from classes.LazyImport import lazy_import
 import os
 from dotenv import load_dotenv
 
+pd = lazy_import('pandas')
+
 load_dotenv()
 
-# Load the example file
-df = pd.read_csv('export_data/task_details.csv')
 
-# load sevice account
-service_account = 'service_accounts/sa.json'
+def main(csv_path='export_data/task_details.csv', service_account='service_accounts/sa.json'):
+    # Load the example file
+    df = pd.read_csv(csv_path)
+
+    # Create a dictionary to pass to the write_to_bigquery_tables method
+    data = {
+        "table_id": f"{os.getenv('BIGQUERY_PROJECT_ID')}.{os.getenv('BIGQUERY_DATASET_ID')}.{os.getenv('BIGQUERY_TABLE_ID')}",
+        "data": df
+    }
+
+    # Initialize the GoogleCloudClient
+    gcc = GoogleCloudClient(service_account_path=service_account, write_disposition='WRITE_TRUNCATE')
 
-# Create a dictionary to pass to the write_to_bigquery_tables method
-data = {
-    "table_id": f"{os.getenv('BIGQUERY_PROJECT_ID')}.{os.getenv('BIGQUERY_DATASET_ID')}.{os.getenv('BIGQUERY_TABLE_ID')}",
-    "data": df
-}
+    # Write the data to BigQuery
+    return gcc.write_to_bigquery_tables(data)
 
-# Initialize the GoogleCloudClient
-gcc = GoogleCloudClient(service_account_path=service_account, write_disposition='WRITE_TRUNCATE')
 
-# Write the data to BigQuery
-gcc.write_to_bigquery_tables(data)
\ No newline at end of file
+if __name__ == '__main__':
+    main()
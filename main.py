@@ -2,9 +2,15 @@
 # Docs for Asana Tasks API - https://developers.asana.com/reference/tasks
 
 from classes.Asana import AsanaClient
+from classes.Checkpoint import CheckpointStore
+from classes.Instrumentation import Metrics, ProgressLogger
+from classes.ResponseCache import ResponseCache
+from classes.TaskStore import TaskStore
+import argparse
+import csv
 import logging
 import os
-import pandas as pd 
+import zlib
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -21,8 +27,9 @@ def get_all_teams(client, workspace, output_dir=None, export=True):
 
 
 def get_projects_for_team(client, team_list):
-    for i, team in enumerate(team_list):
-        logging.info(f"Getting Projects - Processed {i} teams out of {len(team_list)}")
+    progress = ProgressLogger("Getting Projects", len(team_list))
+    for team in team_list:
+        progress.update()
         projects_object = client.get_projects_from_team(team['gid'])
         projects_list = list(projects_object)
         # if projects exist, then append team to each item and yield
@@ -30,64 +37,209 @@ def get_projects_for_team(client, team_list):
             for project in projects_list:
                 project['team_name'] = team['name']
                 yield project     
+    progress.done()
 
 
-def get_tasks_from_project_list(client, projects_list):
-    for i, project in enumerate(projects_list):
-        logging.info(f"Getting Tasks - Processed {i} projects out of {len(projects_list)}")
-        tasks_object = client.list_tasks_by_project(project['gid'])
-        tasks_list = list(tasks_object)
-        if len(tasks_list) > 0:
+def get_tasks_from_project_list(client, projects_list, opt_fields=None, checkpoint=None):
+    progress = ProgressLogger("Getting Tasks", len(projects_list))
+    for project in projects_list:
+        progress.update()
+        # projects already listed in a previous (failed) run are read back from the checkpoint
+        tasks_list = checkpoint.get_project_tasks(project['gid']) if checkpoint else None
+        if tasks_list is None:
+            tasks_object = client.list_tasks_by_project(project['gid'], opt_fields)
+            tasks_list = list(tasks_object)
             for task in tasks_list:
                 # add the project and team name to the task
                 task['project_name'] = project['name']
                 task['team_name'] = project['team_name']
-                yield task
+            if checkpoint:
+                checkpoint.add_project_tasks(project['gid'], tasks_list)
+        for task in tasks_list:
+            yield task
+    progress.done()
 
 
-def get_task_details_from_task_list(client, task_list):
-    for i, task in enumerate(task_list):
-        logging.info(f"Task Details - Processed {i} tasks out of {len(task_list)}")
-        task_detail = client.get_task_details_by_gid(task['gid'])
-        task_detail['project_name'] = task['project_name']
-        task_detail['team_name'] = task['team_name']
-        yield task_detail
+def get_task_details_from_task_list(client, task_list, max_workers=None, batch=False):
+    # fetch details with a pool of workers when max_workers is set, otherwise one task at a time
+    # with batch, 10 tasks are fetched per request through the batch API (max_workers requests at a time)
+    # task_list can also be a generator when the pipeline is streamed
+    progress = ProgressLogger("Task Details", len(task_list) if hasattr(task_list, '__len__') else None)
+    if batch:
+        for task_detail in client.get_task_details_batched(task_list, max_workers=max_workers):
+            progress.update()
+            yield task_detail
+    elif max_workers:
+        for task_detail in client.get_task_details_concurrently(task_list, max_workers=max_workers):
+            progress.update()
+            yield task_detail
+    else:
+        for task in task_list:
+            progress.update()
+            task_detail = client.get_task_details_by_gid(task['gid'], task.get('modified_at'))
+            task_detail['project_name'] = task['project_name']
+            task_detail['team_name'] = task['team_name']
+            yield task_detail
+    progress.done()
 
 
-def main(workspace, output_dir, token):
+def get_task_details_with_checkpoint(client, task_list, checkpoint, max_workers=None, batch=False):
+    # fetch only the details missing from the checkpoint, appending each to it as it arrives,
+    # then stream them all back from the checkpoint store
+    remaining_task_list = [task for task in task_list if not checkpoint.has_task_detail(task)]
+    for task_detail in client.metrics.timed('details', get_task_details_from_task_list(client, remaining_task_list, max_workers, batch)):
+        checkpoint.add_task_detail(task_detail)
+    return checkpoint.iter_task_details()
+
+
+def stream_task_details_to_csv(client, task_list, csv_path, chunk_size, max_workers=None, opt_fields=None, batch=False, subtasks=False, checkpoint=None):
+    # tasks flow through detail fetch and flattening in chunks of chunk_size and each chunk is appended to the csv,
+    # so memory stays bounded by the chunk size instead of the workspace size
+    # with a checkpoint the details are fetched into it first (so a resumed run only fetches the missing ones) and streamed from disk
+    if opt_fields:
+        task_detail_generator = task_list
+    elif checkpoint:
+        task_detail_generator = get_task_details_with_checkpoint(client, task_list, checkpoint, max_workers, batch)
+    else:
+        task_detail_generator = client.metrics.timed('details', get_task_details_from_task_list(client, task_list, max_workers, batch))
+    if subtasks:
+        task_detail_generator = client.metrics.timed('subtasks', client.get_task_details_with_subtasks(task_detail_generator, opt_fields, max_workers=max_workers))
+    # a column can first show up in any chunk (e.g. the first assigned task, or a subtask's parent_gid), so every chunk is
+    # written with the columns seen so far, which only ever grow at the end, and the header is rewritten once at the end
+    csv_columns = None
+    header_columns = None
+    for i, task_detail_chunk in enumerate(client.helper_chunk_iterable(task_detail_generator, chunk_size)):
+        with client.metrics.stage('flatten'):
+            chunk_df = TaskStore(client.helper_clean_task_data).extend(task_detail_chunk).to_dataframe()
+        csv_columns = chunk_df.columns if csv_columns is None else csv_columns.union(chunk_df.columns, sort=False)
+        if header_columns is None:
+            header_columns = csv_columns
+        with client.metrics.stage('load'):
+            chunk_df.reindex(columns=csv_columns).to_csv(csv_path, mode='a' if i else 'w', header=not i, index=False)
+        logging.info(f"Streaming - Wrote chunk {i} ({len(chunk_df)} tasks) to {csv_path}")
+    if csv_columns is not None and len(csv_columns) > len(header_columns):
+        with client.metrics.stage('load'):
+            rewrite_csv_header(csv_path, list(csv_columns))
+
+
+def rewrite_csv_header(csv_path, columns):
+    # replace the header with columns and pad the rows written before the later columns existed, one row at a time
+    temp_path = f"{csv_path}.tmp"
+    with open(csv_path, newline='') as source, open(temp_path, 'w', newline='') as target:
+        reader = csv.reader(source)
+        # the same line endings pandas' to_csv wrote
+        writer = csv.writer(target, lineterminator=os.linesep)
+        next(reader, None)
+        writer.writerow(columns)
+        for row in reader:
+            writer.writerow(row + [''] * (len(columns) - len(row)))
+    os.replace(temp_path, csv_path)
+    logging.info(f"Streaming - Rewrote the header of {csv_path} with {len(columns)} columns")
+
+
+def in_team_shard(team_name, team_shard):
+    #team_shard is (shard index, shard count); teams are assigned by a stable hash of their name
+    shard_index, shard_count = team_shard
+    return zlib.crc32((team_name or '').encode()) % shard_count == shard_index
+
+
+def report_metrics(metrics, metrics_path=None):
+    #log the end-of-run summary and optionally export the metrics (.prom for Prometheus text, otherwise JSON)
+    metrics.log_summary()
+    if metrics_path:
+        metrics.export(metrics_path)
+
+
+def main(workspace, output_dir, token, max_workers=None, opt_fields=None, chunk_size=None, cache_path=None, checkpoint_dir=None, resume=False, workspace_bulk=False, metrics_path=None, requests_per_minute=1500, client_options=None, rate_limiter=None, team_shard=None, batch=False, subtasks=False):
     
-    client = AsanaClient(token)
+    #with cache_path, responses are cached on disk so repeated or restarted runs skip unchanged teams, projects and tasks
+    cache = ResponseCache(cache_path) if cache_path else None
+    #request counts, latencies and stage times are summarized at the end (and exported to metrics_path, .json or .prom)
+    metrics = Metrics()
+    #requests_per_minute is the Asana quota of the workspace, client_options go to the asana client (e.g. a mock base_url)
+    #rate_limiter (e.g. a SharedTokenBucket) lets several processes share one quota, see sharded_runner.py
+    client = AsanaClient(token, requests_per_minute=requests_per_minute, cache=cache, metrics=metrics, client_options=client_options, rate_limiter=rate_limiter)
     
     gid_for_workspace = client.get_workspace_id_by_workspace_name(workspace)
     
-    #get all teams in org
-    team_list = get_all_teams(client, gid_for_workspace, output_dir)
-    
     if gid_for_workspace is None:
         logging.error(f"Workspace with the name {workspace} does not exist.")
         return
     
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
+    
+    #with checkpoint_dir, finished projects and fetched task details are appended to disk as the crawl goes,
+    #and resume=True skips whatever a previous (failed) run already finished
+    checkpoint = CheckpointStore(checkpoint_dir, resume=resume) if checkpoint_dir else None
+    
+    #with workspace_bulk, all projects (with their team) come from one workspace listing instead of one call per team
+    if workspace_bulk:
+        with metrics.stage('projects'):
+            project_list = client.get_projects_with_team_from_workspace(gid_for_workspace)
+        #with team_shard only the projects of this shard's teams are crawled
+        if team_shard:
+            project_list = [project for project in project_list if in_team_shard(project['team_name'], team_shard)]
+    else:
+        #get all teams in org (or only this shard's teams)
+        with metrics.stage('teams'):
+            team_list = get_all_teams(client, gid_for_workspace, output_dir)
+            if team_shard:
+                team_list = [team for team in team_list if in_team_shard(team['name'], team_shard)]
 
-    #get all projects for each team
-    project_list_generator = get_projects_for_team(client, team_list)
-    project_list = list(project_list_generator)
+        #get all projects for each team
+        project_list_generator = get_projects_for_team(client, team_list)
+        project_list = list(metrics.timed('projects', project_list_generator))
+    
+    #get all tasks for each project (with a cache, modified_at is listed too so unchanged task details come from the cache)
+    listing_fields = opt_fields or (['name', 'modified_at'] if cache else None)
+    task_list_generator = metrics.timed('tasks', get_tasks_from_project_list(client, project_list, listing_fields, checkpoint))
+    
+    #tasks in several projects are only detailed once in workspace_bulk mode
+    if workspace_bulk:
+        task_list_generator = client.helper_dedupe_by_gid(task_list_generator)
+    
+    if chunk_size:
+        stream_task_details_to_csv(client, task_list_generator, f'{output_dir}/task_details_test2.csv', chunk_size, max_workers, opt_fields, batch, subtasks, checkpoint)
+        report_metrics(metrics, metrics_path)
+        return
     
-    #get all tasks for each project
-    task_list_generator = get_tasks_from_project_list(client, project_list)
     task_list = list(task_list_generator)
 
-    #get all task details for each task
-    task_detail_list_generator = get_task_details_from_task_list(client, task_list)
-    task_detail_list = list(task_detail_list_generator)
+    #get all task details for each task (not needed when the listing already returned opt_fields)
+    if opt_fields:
+        task_detail_list = task_list
+    elif checkpoint:
+        #fetch only the details missing from the checkpoint, then read them all back from the checkpoint store
+        task_detail_list = get_task_details_with_checkpoint(client, task_list, checkpoint, max_workers, batch)
+    else:
+        task_detail_list = metrics.timed('details', get_task_details_from_task_list(client, task_list, max_workers, batch))
+    
+    #with subtasks, the subtasks of every task (any level deep) are listed through the batch API and added as rows
+    #of their own, with parent_gid/parent_name and subtask_level
+    if subtasks:
+        task_detail_list = metrics.timed('subtasks', client.get_task_details_with_subtasks(task_detail_list, opt_fields, max_workers=max_workers))
     
-    #map the helper function to each task detail
-    task_details_df = pd.DataFrame(map(client.helper_clean_task_data, task_detail_list))
+    #flatten each task detail into a compact column store as it arrives, instead of holding every raw task dict
+    with metrics.stage('flatten'):
+        task_store = TaskStore(client.helper_clean_task_data).extend(task_detail_list)
+        task_details_df = task_store.to_dataframe()
     
     #write task details to csv in output_dir
-    task_details_df.to_csv(f'{output_dir}/task_details_test2.csv', index=False)
+    with metrics.stage('load'):
+        task_details_df.to_csv(f'{output_dir}/task_details_test2.csv', index=False)
+    
+    report_metrics(metrics, metrics_path)
     
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export the task details of an Asana workspace to CSV.")
+    parser.add_argument('--resume', action='store_true', help="skip the projects and task details a previous (failed) run already checkpointed")
+    parser.add_argument('--checkpoint-dir', default='export_data/checkpoint', help="where the crawl checkpoint is kept")
+    parser.add_argument('--workspace-bulk', action='store_true', help="list all projects from one workspace call and fetch each task once")
+    parser.add_argument('--batch', action='store_true', help="fetch task details 10 per request through the Asana batch API")
+    parser.add_argument('--subtasks', action='store_true', help="also export the subtasks of every task (listed through the batch API)")
+    parser.add_argument('--metrics-path', help="export run metrics to this file (.prom for Prometheus text, otherwise JSON)")
+    args = parser.parse_args()
+    
     ASANA_PERSONAL_ACCESS_TOKEN = os.getenv('ASANA_PERSONAL_ACCESS_TOKEN')
-    main(workspace="3Q Digital", output_dir="export_data", token=ASANA_PERSONAL_ACCESS_TOKEN)
\ No newline at end of file
+    main(workspace="3Q Digital", output_dir="export_data", token=ASANA_PERSONAL_ACCESS_TOKEN, max_workers=10, cache_path="cache/asana_responses.sqlite", checkpoint_dir=args.checkpoint_dir, resume=args.resume, workspace_bulk=args.workspace_bulk, metrics_path=args.metrics_path, batch=args.batch, subtasks=args.subtasks)
\ No newline at end of file
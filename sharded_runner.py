@@ -0,0 +1,150 @@
+# Runs main.py's crawl for several workspaces (and/or team shards of a workspace) in parallel processes
+# that share one Asana request budget, then merges the shard outputs into one CSV (and optionally one BigQuery load).
+
+from classes.Asana import AsanaClient
+from classes.GoogleCloud import GoogleCloudClient
+from classes.LazyImport import lazy_import
+from classes.RateLimiter import SharedTokenBucket
+from collections import deque
+from multiprocessing.connection import wait
+import argparse
+import logging
+import multiprocessing
+import os
+import re
+from dotenv import load_dotenv
+
+import main
+
+pd = lazy_import('pandas')
+
+load_dotenv()
+logging.basicConfig(level=logging.INFO)
+
+# the shared rate limiter of a worker process, set by init_worker when the process starts
+worker_rate_limiter = None
+
+
+def init_worker(rate_limiter):
+    global worker_rate_limiter
+    worker_rate_limiter = rate_limiter
+
+
+def shard_process(rate_limiter, *run_shard_args):
+    #entry point of a shard's own process; an exception (or a crash) shows up as a non-zero exit code of that process only
+    init_worker(rate_limiter)
+    run_shard(*run_shard_args)
+
+
+def build_shards(workspaces, team_shards=1):
+    #one shard per workspace, or team_shards shards per workspace that split its teams by a hash of the team name
+    shards = []
+    for workspace in workspaces:
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', workspace).strip('_')
+        if team_shards > 1:
+            for i in range(team_shards):
+                shards.append({'name': f"{slug}-{i}of{team_shards}", 'workspace': workspace, 'team_shard': (i, team_shards)})
+        else:
+            shards.append({'name': slug, 'workspace': workspace, 'team_shard': None})
+    return shards
+
+
+def run_shard(shard, output_dir, token, resume, main_kwargs):
+    #crawl one shard into its own directory, checkpointed so a retry only redoes what the failed attempt didn't finish
+    shard_dir = os.path.join(output_dir, 'shards', shard['name'])
+    main.main(
+        workspace=shard['workspace'],
+        output_dir=shard_dir,
+        token=token,
+        checkpoint_dir=os.path.join(shard_dir, 'checkpoint'),
+        resume=resume,
+        metrics_path=os.path.join(shard_dir, 'metrics.json'),
+        rate_limiter=worker_rate_limiter,
+        team_shard=shard['team_shard'],
+        **main_kwargs,
+    )
+    csv_path = shard_csv_path(output_dir, shard)
+    if not os.path.exists(csv_path):
+        raise RuntimeError(f"Shard {shard['name']} finished without writing {csv_path}")
+    return csv_path
+
+
+def shard_csv_path(output_dir, shard):
+    return os.path.join(output_dir, 'shards', shard['name'], 'task_details_test2.csv')
+
+
+def run_shards(shards, output_dir, token, processes=4, requests_per_minute=1500, max_shard_retries=2, main_kwargs=None):
+    #run every shard in a process of its own, up to processes at a time; a failed (or crashed) shard is retried on its own,
+    #resuming from its checkpoint. With one process per shard (instead of a pool, where one crashed worker breaks every
+    #shard in flight) a crash only ever costs the shard that crashed an attempt
+    rate_limiter = SharedTokenBucket(requests_per_minute)
+    csv_paths = {}
+    attempts = {shard['name']: 0 for shard in shards}
+    pending = deque(shards)
+    running = {}
+    while pending or running:
+        while pending and len(running) < processes:
+            shard = pending.popleft()
+            args = (rate_limiter, shard, output_dir, token, attempts[shard['name']] > 0, main_kwargs or {})
+            process = multiprocessing.Process(target=shard_process, args=args, name=f"shard-{shard['name']}")
+            process.start()
+            running[process.sentinel] = (process, shard)
+        for sentinel in wait(list(running)):
+            process, shard = running.pop(sentinel)
+            process.join()
+            if process.exitcode == 0:
+                csv_paths[shard['name']] = shard_csv_path(output_dir, shard)
+                logging.info(f"Shard {shard['name']} done")
+                continue
+            attempts[shard['name']] += 1
+            logging.error(f"Shard {shard['name']} failed (attempt {attempts[shard['name']]}, exit code {process.exitcode})")
+            if attempts[shard['name']] <= max_shard_retries:
+                pending.append(shard)
+    missing = [shard['name'] for shard in shards if shard['name'] not in csv_paths]
+    if missing:
+        raise RuntimeError(f"Shards failed after {max_shard_retries} retries: {missing}")
+    return [csv_paths[shard['name']] for shard in shards]
+
+
+def merge_shard_outputs(csv_paths, merged_path, dedupe_gids=False):
+    #concatenate the shard csvs (columns are unioned, shards can flatten to different columns)
+    df = pd.concat([pd.read_csv(csv_path, low_memory=False) for csv_path in csv_paths], ignore_index=True)
+    if dedupe_gids:
+        df = df.drop_duplicates(subset=['gid'], keep='first')
+    df.to_csv(merged_path, index=False)
+    logging.info(f"Merged {len(csv_paths)} shards into {merged_path} ({len(df)} tasks)")
+    return df
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export several Asana workspaces (or team shards of one) in parallel processes.")
+    parser.add_argument('--workspaces', nargs='*', help="workspace names (default: every workspace of the token)")
+    parser.add_argument('--team-shards', type=int, default=1, help="split each workspace's teams into this many shards")
+    parser.add_argument('--processes', type=int, default=4, help="shards crawled at the same time")
+    parser.add_argument('--requests-per-minute', type=int, default=1500, help="Asana request budget shared by all shards")
+    parser.add_argument('--max-workers', type=int, default=10, help="detail fetch threads per shard")
+    parser.add_argument('--retries', type=int, default=2, help="times a failed shard is retried")
+    parser.add_argument('--output-dir', default='export_data', help="merged csv goes here, shard outputs under shards/")
+    parser.add_argument('--workspace-bulk', action='store_true', help="list projects per workspace and fetch each task once")
+    parser.add_argument('--batch', action='store_true', help="fetch task details 10 per request through the Asana batch API")
+    parser.add_argument('--subtasks', action='store_true', help="also export the subtasks of every task")
+    parser.add_argument('--load', action='store_true', help="load the merged csv into the BIGQUERY_* table")
+    args = parser.parse_args()
+
+    ASANA_PERSONAL_ACCESS_TOKEN = os.getenv('ASANA_PERSONAL_ACCESS_TOKEN')
+    workspaces = args.workspaces or [workspace['name'] for workspace in AsanaClient(ASANA_PERSONAL_ACCESS_TOKEN).workspace_id_list]
+
+    shards = build_shards(workspaces, args.team_shards)
+    csv_paths = run_shards(
+        shards, args.output_dir, ASANA_PERSONAL_ACCESS_TOKEN, args.processes, args.requests_per_minute, args.retries,
+        main_kwargs={'max_workers': args.max_workers, 'workspace_bulk': args.workspace_bulk, 'batch': args.batch, 'subtasks': args.subtasks},
+    )
+    df = merge_shard_outputs(csv_paths, os.path.join(args.output_dir, 'task_details.csv'), dedupe_gids=args.workspace_bulk)
+
+    if args.load:
+        gcc = GoogleCloudClient(service_account_path='service_accounts/sa.json', write_disposition='WRITE_TRUNCATE')
+        data = {
+            "table_id": f"{os.getenv('BIGQUERY_PROJECT_ID')}.{os.getenv('BIGQUERY_DATASET_ID')}.{os.getenv('BIGQUERY_TABLE_ID')}",
+            "data": df,
+        }
+        gcc.write_to_bigquery_tables(data)
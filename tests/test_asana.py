@@ -0,0 +1,154 @@
+# test_asana.py
+
+import pytest
+
+from benchmarks.mock_asana import MockAsanaHandler, MockAsanaServer, MockWorkspace
+from classes.Asana import AsanaClient
+from classes.ResponseCache import ResponseCache
+from classes.SyncState import SyncStateStore
+from example_job.example import get_tasks_from_project_list
+
+
+@pytest.fixture
+def workspace():
+    # 3 projects of 30 tasks
+    return MockWorkspace(90, tasks_per_project=30)
+
+
+@pytest.fixture
+def server(workspace):
+    with MockAsanaServer(workspace) as server:
+        yield server
+
+
+def make_client(server, **kwargs):
+    return AsanaClient('token', client_options={'base_url': server.base_url}, **kwargs)
+
+
+def listed_tasks(client, workspace, p=0):
+    # a project's task listing with the project and team names, the way the jobs enrich it
+    project = workspace.projects[p]
+    return [
+        {**task, 'project_name': project['name'], 'team_name': project['team']['name']}
+        for task in client.list_tasks_by_project(project['gid'])
+    ]
+
+
+def test_concurrent_detail_fetch(server, workspace):
+    client = make_client(server, max_workers=4)
+    tasks = listed_tasks(client, workspace)
+
+    # the task list can be a generator
+    details = list(client.get_task_details_concurrently(iter(tasks)))
+    assert sorted(detail['gid'] for detail in details) == sorted(task['gid'] for task in tasks)
+    for detail in details:
+        assert detail.pop('project_name') == 'Project 0'
+        assert detail.pop('team_name') == 'Team 0'
+        assert detail == workspace.task(int(detail['gid']) - 1000000)
+
+
+def test_batched_detail_fetch(server, workspace):
+    client = make_client(server, max_workers=2)
+    tasks = listed_tasks(client, workspace)
+    # a task deleted since it was listed is skipped
+    tasks.insert(5, {'gid': '1999999', 'project_name': 'Project 0', 'team_name': 'Team 0'})
+    requests = server.request_count
+
+    details = list(client.get_task_details_batched(tasks))
+    # 31 tasks, 10 per batch request
+    assert server.request_count - requests == 4
+    assert sorted(detail['gid'] for detail in details) == sorted(task['gid'] for task in tasks if task['gid'] != '1999999')
+    for detail in details:
+        assert (detail.pop('project_name'), detail.pop('team_name')) == ('Project 0', 'Team 0')
+        assert detail == workspace.task(int(detail['gid']) - 1000000)
+
+
+def test_batched_subtask_listing(server, workspace):
+    client = make_client(server)
+    subtasks = list(client.get_subtasks_batched(listed_tasks(client, workspace), ['name']))
+
+    # every 10th task has 2 subtasks, the first of which has a subtask of its own
+    assert sorted((subtask['gid'], subtask['parent']['gid'], subtask['subtask_level']) for subtask in subtasks) == sorted(
+        [(str(5000000 + i * 10 + s), str(1000000 + i), 1) for i in (0, 10, 20) for s in (0, 1)]
+        + [(str(6000000 + i * 10), str(5000000 + i * 10), 2) for i in (0, 10, 20)]
+    )
+    assert {subtask['project_name'] for subtask in subtasks} == {'Project 0'}
+
+
+def test_a_429_pauses_the_rate_limiter(workspace):
+    with MockAsanaServer(workspace, rate_limit_every=7, retry_after=0.2) as server:
+        client = make_client(server, max_workers=4)
+        pauses = []
+        pause = client.rate_limiter.pause
+
+        def record_pause(seconds):
+            pauses.append(seconds)
+            pause(seconds)
+
+        client.rate_limiter.pause = record_pause
+        details = list(client.get_task_details_concurrently(listed_tasks(client, workspace)))
+
+    assert len(details) == 30
+    assert server.rate_limited_count > 0
+    # every worker waits out the Retry-After the server sent
+    assert pauses and set(pauses) == {0.2}
+    assert client.metrics.counters['asana_rate_limited'] > 0
+
+
+def test_unchanged_task_details_come_from_the_cache(server, tmp_path):
+    client = make_client(server, cache=ResponseCache(str(tmp_path / 'cache.sqlite')))
+    detail = client.get_task_details_by_gid('1000001', '2024-01-01T00:00:00.000Z')
+    requests = server.request_count
+
+    assert client.get_task_details_by_gid('1000001', '2024-01-01T00:00:00.000Z') == detail
+    assert server.request_count == requests
+    # a task modified since it was cached is fetched again
+    client.get_task_details_by_gid('1000001', '2024-01-02T00:00:00.000Z')
+    assert server.request_count == requests + 1
+
+
+def test_incremental_listing_advances_the_high_water_mark(server, workspace, tmp_path):
+    client = make_client(server)
+    sync_state = SyncStateStore(str(tmp_path / 'sync_state.json'))
+    project = {'gid': workspace.projects[0]['gid'], 'name': 'Project 0', 'team_name': 'Team 0'}
+
+    first = list(get_tasks_from_project_list(client, [project], ['modified_at'], sync_state))
+    high_water_mark = sync_state.get('modified_at', project['gid'])
+    assert len(first) == 30
+    assert high_water_mark == max(task['modified_at'] for task in first)
+
+    # the next run only lists the tasks modified since the mark
+    second = list(get_tasks_from_project_list(client, [project], ['modified_at'], sync_state))
+    assert 0 < len(second) < 30
+    assert [task['gid'] for task in second] == [task['gid'] for task in first if task['modified_at'] >= high_water_mark]
+    assert sync_state.get('modified_at', project['gid']) == high_water_mark
+
+
+def test_get_events_follows_the_sync_token(server, workspace, monkeypatch):
+    client = make_client(server)
+    project_gid = workspace.projects[0]['gid']
+
+    # without a sync token Asana only hands out a fresh one
+    events, sync_token, expired = client.get_events(project_gid)
+    assert (events, expired) == ([], True)
+
+    workspace.touch(0)
+    workspace.touch(31)
+    workspace.touch(1, 'deleted')
+    # pages of one event, so has_more is followed
+    monkeypatch.setattr(MockAsanaHandler, 'MAX_EVENTS', 1)
+    events, sync_token, expired = client.get_events(project_gid, sync_token)
+    assert not expired
+    assert [(event['action'], event['resource']['gid']) for event in events] == [('changed', '1000000'), ('deleted', '1000001')]
+
+    assert client.get_events(project_gid, sync_token) == ([], sync_token, False)
+
+
+def test_get_events_with_an_expired_sync_token(server, workspace):
+    client = make_client(server)
+    workspace.touch(0)
+
+    events, sync_token, expired = client.get_events(workspace.projects[0]['gid'], 'sync-999')
+    assert (events, expired) == ([], True)
+    # the fresh token picks up from now
+    assert client.get_events(workspace.projects[0]['gid'], sync_token) == ([], sync_token, False)
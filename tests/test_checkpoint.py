@@ -0,0 +1,76 @@
+# test_checkpoint.py
+
+import pandas as pd
+
+import main
+from benchmarks.mock_asana import MockAsanaServer, MockWorkspace
+from classes.Checkpoint import CheckpointStore
+
+
+def task_detail(gid, project_name='Project A'):
+    return {'gid': gid, 'name': f"Task {gid}", 'project_name': project_name}
+
+
+def test_resume_skips_finished_work(tmp_path):
+    checkpoint = CheckpointStore(tmp_path)
+    checkpoint.add_project_tasks('1', [{'gid': '11'}, {'gid': '12'}])
+    checkpoint.add_task_detail(task_detail('11'))
+
+    resumed = CheckpointStore(tmp_path, resume=True)
+    assert resumed.get_project_tasks('1') == [{'gid': '11'}, {'gid': '12'}]
+    assert resumed.get_project_tasks('2') is None
+    assert resumed.has_task_detail({'gid': '11', 'project_name': 'Project A'})
+    assert not resumed.has_task_detail({'gid': '11', 'project_name': 'Project B'})
+    assert not resumed.has_task_detail({'gid': '12', 'project_name': 'Project A'})
+
+
+def test_without_resume_the_checkpoint_is_cleared(tmp_path):
+    checkpoint = CheckpointStore(tmp_path)
+    checkpoint.add_project_tasks('1', [])
+    checkpoint.add_task_detail(task_detail('11'))
+
+    fresh = CheckpointStore(tmp_path)
+    assert fresh.get_project_tasks('1') is None
+    assert list(fresh.iter_task_details()) == []
+
+
+def test_iter_task_details_skips_repeats(tmp_path):
+    checkpoint = CheckpointStore(tmp_path)
+    checkpoint.add_task_detail(task_detail('11'))
+    checkpoint.add_task_detail(task_detail('11'))
+    checkpoint.add_task_detail(task_detail('11', 'Project B'))
+
+    assert [(task['gid'], task['project_name']) for task in checkpoint.iter_task_details()] == [('11', 'Project A'), ('11', 'Project B')]
+
+
+def test_truncated_last_line_is_skipped_and_not_glued_to_the_next_record(tmp_path):
+    checkpoint = CheckpointStore(tmp_path)
+    checkpoint.add_task_detail(task_detail('11'))
+    # a crash in the middle of writing the second record
+    with open(checkpoint.task_details_path, 'a') as f:
+        f.write('{"gid": "12", "name": "Tas')
+
+    resumed = CheckpointStore(tmp_path, resume=True)
+    assert resumed.has_task_detail(task_detail('11'))
+    assert not resumed.has_task_detail(task_detail('12'))
+
+    resumed.add_task_detail(task_detail('12'))
+    again = CheckpointStore(tmp_path, resume=True)
+    assert [task['gid'] for task in again.iter_task_details()] == ['11', '12']
+
+
+def test_streamed_run_resumes_from_the_checkpoint(tmp_path):
+    def run(server, resume):
+        main.main('3Q Digital', str(tmp_path / 'out'), 'token', chunk_size=7, checkpoint_dir=str(tmp_path / 'checkpoint'), resume=resume,
+                  requests_per_minute=10**7, client_options={'base_url': server.base_url})
+        return pd.read_csv(tmp_path / 'out' / 'task_details_test2.csv')
+
+    with MockAsanaServer(MockWorkspace(30, tasks_per_project=10)) as server:
+        first = run(server, resume=False)
+        first_run_requests = server.request_count
+        resumed = run(server, resume=True)
+
+        # the resumed run lists the teams and projects again, but no task listing or task detail
+        assert server.request_count - first_run_requests < 10
+    assert len(first) == 30
+    assert sorted(resumed['gid']) == sorted(first['gid'])
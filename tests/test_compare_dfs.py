@@ -0,0 +1,97 @@
+# test_compare_dfs.py
+
+import random
+
+import pandas as pd
+
+from example_job.example import compare_dfs
+
+
+def baseline_compare_dfs(df1, df2, col_unique_identifier, insert_timestamp):
+    # the original row-by-row implementation, kept as the reference for the vectorized compare_dfs
+    unique_identifier_values = list(set(df1[col_unique_identifier].tolist() + df2[col_unique_identifier].tolist()))
+    cols = df1.columns.tolist() + ['change_status', 'last_change_seen']
+    result = pd.DataFrame(columns=cols)
+    for unique_id in unique_identifier_values:
+        if df1[col_unique_identifier].isin([unique_id]).any():
+            temp_df = df1[df1[col_unique_identifier] == unique_id].copy()
+            if df2[col_unique_identifier].isin([unique_id]).any():
+                d1_value = df1[df1[col_unique_identifier] == unique_id]['modified_at'].values[0]
+                d2_value = df2[df2[col_unique_identifier] == unique_id]['modified_at'].values[0]
+                if d1_value == d2_value:
+                    temp_df.loc[:, 'change_status'] = 'existing'
+                else:
+                    temp_df.loc[:, 'change_status'] = 'updated'
+                    temp_df.loc[:, 'last_change_seen'] = insert_timestamp
+            else:
+                temp_df.loc[:, 'change_status'] = 'new'
+                temp_df.loc[:, 'last_change_seen'] = insert_timestamp
+        else:
+            temp_df = df2[df2[col_unique_identifier] == unique_id].copy()
+            temp_df.loc[:, 'change_status'] = 'deleted'
+            temp_df.loc[:, 'last_change_seen'] = insert_timestamp
+        result = pd.concat([result, temp_df], ignore_index=True)
+    return result
+
+
+def random_frames(rng):
+    # small id space so ids overlap, repeat within a frame and go missing on either side
+    n_ids = rng.randint(1, 12)
+    dates = ['2024-01-01', '2024-01-02', '2024-01-03', None]
+    # modified_at is a datetime col as in the pipeline (missing values NaT) or a string col (missing values NaN)
+    as_datetime = rng.random() < 0.5
+
+    def frame(n_rows, name):
+        ids = [f"https://app.asana.com/0/0/{rng.randrange(n_ids)}/f" for _ in range(n_rows)]
+        modified_at = pd.Series([rng.choice(dates) for _ in range(n_rows)], dtype=object)
+        return pd.DataFrame({
+            'permalink_url': pd.Series(ids, dtype=object),
+            'name': [f"{name} {i}" for i in range(n_rows)],
+            'modified_at': pd.to_datetime(modified_at) if as_datetime else modified_at.fillna(float('nan')),
+        })
+
+    df1 = frame(rng.randint(0, 15), 'new')
+    df2 = frame(rng.randint(0, 15), 'stored')
+    if rng.random() < 0.5:
+        # the stored table carries the status columns of the previous run
+        df2['change_status'] = 'existing'
+        df2['last_change_seen'] = '2023-12-31 00:00:00'
+    return df1, df2
+
+
+def normalized(df):
+    # compare_dfs doesn't promise a row order, so rows are compared sorted, with every missing value as None
+    columns = sorted(df.columns)
+    rows = [tuple(None if pd.isna(value) else value for value in row) for row in df[columns].itertuples(index=False)]
+    return columns, sorted(rows, key=repr)
+
+
+def test_compare_dfs_matches_baseline_on_random_frames():
+    rng = random.Random(0)
+    mismatches = []
+    for case in range(200):
+        df1, df2 = random_frames(rng)
+        expected = baseline_compare_dfs(df1, df2, 'permalink_url', '2024-01-04 00:00:00')
+        result = compare_dfs(df1, df2, 'permalink_url', '2024-01-04 00:00:00')
+        if normalized(result) != normalized(expected):
+            mismatches.append(case)
+    assert mismatches == []
+
+
+def test_compare_dfs_statuses():
+    df1 = pd.DataFrame({'permalink_url': ['a', 'b', 'c'], 'modified_at': ['2024-01-01', '2024-01-02', '2024-01-01']})
+    df2 = pd.DataFrame({'permalink_url': ['a', 'b', 'd'], 'modified_at': ['2024-01-01', '2024-01-01', '2024-01-01']})
+
+    result = compare_dfs(df1, df2, 'permalink_url', 'now').set_index('permalink_url')
+    assert result['change_status'].to_dict() == {'a': 'existing', 'b': 'updated', 'c': 'new', 'd': 'deleted'}
+    assert pd.isna(result.loc['a', 'last_change_seen'])
+    assert (result.loc[['b', 'c', 'd'], 'last_change_seen'] == 'now').all()
+
+
+def test_compare_dfs_missing_modified_at_is_updated():
+    df1 = pd.DataFrame({'permalink_url': ['a', 'b'], 'modified_at': pd.to_datetime([None, '2024-01-01'])})
+    df2 = pd.DataFrame({'permalink_url': ['a', 'b'], 'modified_at': pd.to_datetime([None, None])})
+
+    result = compare_dfs(df1, df2, 'permalink_url', 'now').set_index('permalink_url')
+    # without a modified_at on either side there is nothing to tell the row unchanged by
+    assert result['change_status'].to_dict() == {'a': 'updated', 'b': 'updated'}
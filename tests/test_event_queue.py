@@ -0,0 +1,70 @@
+# test_event_queue.py
+
+import time
+
+from classes.EventQueue import EventQueue
+
+
+def test_a_gid_is_queued_once_and_its_latest_action_wins(tmp_path):
+    queue = EventQueue(str(tmp_path / 'queue.sqlite'))
+    queue.put('1', project_gid='10')
+    queue.put('2')
+    queue.put('1', 'deleted')
+
+    assert len(queue) == 2
+    items = {item['gid']: item for item in queue.take(10)}
+    assert items['1']['action'] == 'deleted'
+    # a change without a project keeps the one already known
+    assert items['1']['project_gid'] == '10'
+
+
+def test_taken_items_are_not_handed_out_twice_until_acked(tmp_path):
+    queue = EventQueue(str(tmp_path / 'queue.sqlite'))
+    queue.put_many([(str(gid), 'changed', None) for gid in range(5)])
+
+    first = queue.take(3)
+    second = queue.take(10)
+    assert len(first) == 3 and len(second) == 2
+    assert not {item['gid'] for item in first} & {item['gid'] for item in second}
+    assert queue.take(10) == []
+
+    queue.ack(first + second)
+    assert len(queue) == 0
+
+
+def test_a_change_while_taken_survives_the_ack(tmp_path):
+    queue = EventQueue(str(tmp_path / 'queue.sqlite'))
+    queue.put('1')
+    queue.put('2')
+    items = queue.take(10)
+    time.sleep(0.01)
+    queue.put('1')
+
+    queue.ack(items)
+    assert [item['gid'] for item in queue.take(10)] == ['1']
+
+
+def test_released_items_are_handed_out_again(tmp_path):
+    queue = EventQueue(str(tmp_path / 'queue.sqlite'))
+    queue.put('1')
+    items = queue.take(10)
+
+    queue.release(items)
+    assert [item['gid'] for item in queue.take(10)] == ['1']
+
+
+def test_unacked_items_come_back_after_the_claim_timeout(tmp_path):
+    queue = EventQueue(str(tmp_path / 'queue.sqlite'), claim_timeout=0.05)
+    queue.put('1')
+    queue.take(10)
+    assert queue.take(10) == []
+
+    time.sleep(0.1)
+    assert [item['gid'] for item in queue.take(10)] == ['1']
+
+
+def test_the_queue_is_durable(tmp_path):
+    path = str(tmp_path / 'queue.sqlite')
+    EventQueue(path).put('1', project_gid='10')
+
+    assert [(item['gid'], item['project_gid']) for item in EventQueue(path).take(10)] == [('1', '10')]
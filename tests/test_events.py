@@ -0,0 +1,141 @@
+# test_events.py
+
+import hashlib
+import hmac
+import json
+import os
+import urllib.error
+import urllib.request
+
+import pytest
+
+from classes.EventQueue import EventQueue
+from classes.Events import WebhookReceiver, load_recorded_events, task_changes_from_events
+from classes.Instrumentation import Metrics
+from classes.SyncState import SyncStateStore
+from example_job import events
+
+RECORDED_EVENTS_PATH = os.path.join(os.path.dirname(__file__), 'data', 'recorded_events.jsonl')
+
+
+def test_load_recorded_events_reads_every_payload_shape():
+    payloads = list(load_recorded_events(RECORDED_EVENTS_PATH))
+
+    assert [(len(events), project_gid) for events, project_gid in payloads] == [
+        (2, '1201000000000001'),  # webhook body
+        (0, '1201000000000001'),  # webhook heartbeat
+        (2, None),                # events API page
+        (2, None),                # bare list of events
+    ]
+
+
+def test_task_changes_from_recorded_events():
+    changes = [change for events, project_gid in load_recorded_events(RECORDED_EVENTS_PATH) for change in task_changes_from_events(events, project_gid)]
+
+    assert changes == [
+        # a task edit
+        ('1202000000000001', 'changed', '1201000000000001'),
+        # a comment queues its task
+        ('1202000000000002', 'changed', '1201000000000001'),
+        # a task added to a project names the project as its parent; the section event is skipped
+        ('1202000000000003', 'changed', '1201000000000002'),
+        ('1202000000000004', 'deleted', None),
+        # an attachment queues its task
+        ('1202000000000004', 'changed', None),
+    ]
+
+
+def test_task_changes_use_the_given_project_gid():
+    events = [{'action': 'changed', 'resource': {'gid': '1', 'resource_type': 'task'}, 'parent': None}]
+
+    assert task_changes_from_events(events, '10') == [('1', 'changed', '10')]
+
+
+def post(url, body=b'', headers=None):
+    request = urllib.request.Request(url, data=body, headers=headers or {})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, response.headers
+    except urllib.error.HTTPError as error:
+        return error.code, error.headers
+
+
+@pytest.fixture
+def receiver(tmp_path):
+    queue = EventQueue(str(tmp_path / 'queue.sqlite'))
+    sync_state = SyncStateStore(str(tmp_path / 'state.json'))
+    with WebhookReceiver(queue, sync_state, '127.0.0.1', 0, str(tmp_path / 'recorded.jsonl')) as receiver:
+        receiver.url = f"http://127.0.0.1:{receiver.port}/webhooks/1201000000000001"
+        yield receiver
+
+
+class HandshakeClient:
+    # stands in for AsanaClient.create_webhook: Asana answers the create request by sending the handshake to the target
+    def __init__(self, secret):
+        self.secret = secret
+
+    def create_webhook(self, resource_gid, target_url):
+        status, headers = post(target_url, headers={'X-Hook-Secret': self.secret})
+        assert status == 200
+        return headers['X-Hook-Secret']
+
+
+def test_unsolicited_handshake_is_rejected(receiver):
+    status, _ = post(receiver.url, headers={'X-Hook-Secret': 'forged'})
+
+    assert status == 403
+    assert receiver.sync_state.get('webhook_secrets', '1201000000000001') is None
+
+
+def test_subscribe_accepts_the_handshake_and_verifies_deliveries(receiver, tmp_path):
+    assert receiver.subscribe(HandshakeClient('secret'), '1201000000000001', receiver.url) == 'secret'
+    assert receiver.pending_handshakes == set()
+    # the secret is saved, so deliveries still verify after a restart
+    assert SyncStateStore(str(tmp_path / 'state.json')).get('webhook_secrets', '1201000000000001') == 'secret'
+
+    with open(RECORDED_EVENTS_PATH) as f:
+        body = f.readline().encode()
+    signature = hmac.new(b'secret', body, hashlib.sha256).hexdigest()
+    status, _ = post(receiver.url, body, {'X-Hook-Signature': signature})
+    assert status == 200
+    assert sorted(item['gid'] for item in receiver.queue.take(10)) == ['1202000000000001', '1202000000000002']
+    assert [len(events) for events, _ in load_recorded_events(str(tmp_path / 'recorded.jsonl'))] == [2]
+
+    # a handshake after subscribe returned is rejected again
+    status, _ = post(receiver.url, headers={'X-Hook-Secret': 'forged'})
+    assert status == 403
+    assert receiver.sync_state.get('webhook_secrets', '1201000000000001') == 'secret'
+
+
+def test_delivery_with_a_bad_signature_is_rejected(receiver):
+    receiver.subscribe(HandshakeClient('secret'), '1201000000000001', receiver.url)
+    body = json.dumps({'events': [{'action': 'changed', 'resource': {'gid': '1', 'resource_type': 'task'}}]}).encode()
+    signature = hmac.new(b'forged', body, hashlib.sha256).hexdigest()
+
+    assert post(receiver.url, body, {'X-Hook-Signature': signature})[0] == 401
+    assert post(receiver.url, body)[0] == 401
+    assert len(receiver.queue) == 0
+
+
+def test_delivery_for_an_unknown_resource_is_rejected(receiver):
+    body = b'{"events": []}'
+    signature = hmac.new(b'secret', body, hashlib.sha256).hexdigest()
+
+    assert post(f"http://127.0.0.1:{receiver.port}/webhooks/999", body, {'X-Hook-Signature': signature})[0] == 401
+
+
+def test_run_rounds_backs_off_after_a_failed_round_and_continues(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(events.time, 'sleep', sleeps.append)
+    outcomes = [RuntimeError('BigQuery is down'), RuntimeError('BigQuery is down'), None, None]
+
+    def run_round():
+        outcome = outcomes.pop(0)
+        if outcome:
+            raise outcome
+
+    metrics = Metrics()
+    assert events.run_rounds(run_round, 30, max_rounds=4, metrics=metrics, max_backoff=100) == 4
+    # the backoff doubles per failure in a row (capped at max_backoff) and drops back to the interval after a good round
+    assert sleeps == [60, 100, 30]
+    assert metrics.counters['event_round_errors'] == 2
@@ -0,0 +1,75 @@
+# test_example.py
+
+import pandas as pd
+import pytest
+
+from classes.Asana import AsanaClient
+from classes.Instrumentation import Metrics
+from example_job.example import clean_task_details, stream_task_details_to_bigquery
+
+
+def test_clean_task_details_keeps_the_time_of_modified_at():
+    tasks = [
+        {'gid': '1', 'modified_at': '2024-03-04T09:00:00.000Z', 'created_at': '2024-03-01T08:00:00.000Z', 'due_on': '2024-03-08'},
+        {'gid': '2', 'modified_at': '2024-03-04T17:30:00.000Z', 'created_at': '2024-03-01T12:00:00.000Z', 'due_on': None},
+    ]
+
+    df = clean_task_details(AsanaClient.__new__(AsanaClient), tasks, flatten_batch_size=1)
+    # two edits on the same day stay apart, so the upsert sees the later one as a change
+    assert list(df['modified_at']) == [pd.Timestamp('2024-03-04 09:00:00'), pd.Timestamp('2024-03-04 17:30:00')]
+    # the other date cols are the day only
+    assert list(df['created_at']) == [pd.Timestamp('2024-03-01'), pd.Timestamp('2024-03-01')]
+    assert df['due_on'][0] == pd.Timestamp('2024-03-08') and pd.isna(df['due_on'][1])
+    assert list(df['subtask_level']) == [0, 0]
+
+
+class FakeGoogleCloudClient:
+    # records the staging loads, fail_on_load makes that load (1-based) raise
+    metrics = Metrics()
+    STAGING_ROW_COLUMN = '_staging_row'
+
+    def __init__(self, fail_on_load=None):
+        self.bq_client = self
+        self.fail_on_load = fail_on_load
+        self.deleted = []
+        self.loaded = []
+
+    def staging_table_id(self, table_id):
+        return f"{table_id}_staging_1"
+
+    def load_schema_builder(self, df):
+        return list(df.columns)
+
+    def write_to_bigquery_tables(self, data, write_disposition=None):
+        self.loaded.append(data)
+        if len(self.loaded) == self.fail_on_load:
+            raise RuntimeError('load job failed')
+
+    def merge_from_staging(self, table_id, staging_table_id, key_column, insert_timestamp, **kwargs):
+        return table_id
+
+    def delete_table(self, table_id, not_found_ok=False):
+        self.deleted.append(table_id)
+
+
+def streamed_tasks(gids):
+    return [{'gid': str(gid), 'permalink_url': f"https://app.asana.com/0/0/{gid}/f", 'modified_at': '2024-03-04T09:00:00.000Z'} for gid in gids]
+
+
+def test_a_failed_streamed_load_drops_the_staging_table():
+    gcc = FakeGoogleCloudClient(fail_on_load=2)
+    with pytest.raises(RuntimeError):
+        stream_task_details_to_bigquery(AsanaClient.__new__(AsanaClient), gcc, streamed_tasks(range(3)), 'p.d.tasks', '2024-03-04 10:00:00', chunk_size=2)
+    assert [data['table_id'] for data in gcc.loaded] == ['p.d.tasks_staging_1', 'p.d.tasks_staging_1']
+    assert gcc.deleted == ['p.d.tasks_staging_1']
+
+
+def test_streamed_rows_are_numbered_across_chunks():
+    gcc = FakeGoogleCloudClient()
+    # task 1 is listed twice, in different chunks: its first row has the lower number, so the MERGE keeps that one
+    stream_task_details_to_bigquery(AsanaClient.__new__(AsanaClient), gcc, streamed_tasks([0, 1, 2, 1, 3]), 'p.d.tasks', '2024-03-04 10:00:00', chunk_size=2)
+
+    rows = pd.concat([data['data'] for data in gcc.loaded], ignore_index=True)
+    assert list(rows['_staging_row']) == [0, 1, 2, 3, 4]
+    assert list(rows['gid']) == ['0', '1', '2', '1', '3']
+    assert gcc.deleted == []
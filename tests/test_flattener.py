@@ -0,0 +1,143 @@
+# test_flattener.py
+
+from classes.Asana import AsanaClient
+from classes.Flattener import CustomFieldFlattener, TaskFlattener
+
+
+def make_task(gid, **overrides):
+    task = {
+        'gid': gid,
+        'name': f"Task {gid}",
+        'permalink_url': f"https://app.asana.com/0/0/{gid}/f",
+        'assignee': {'gid': '100', 'name': 'Ada'},
+        'parent': None,
+        'followers': [{'gid': '100', 'name': 'Ada'}, {'gid': '101', 'name': 'Grace'}],
+        'memberships': [
+            {'project': {'gid': '10', 'name': 'Roadmap'}, 'section': {'gid': '20', 'name': 'Doing'}},
+            {'project': {'gid': '11', 'name': 'Bugs'}, 'section': {'gid': '21', 'name': 'Triage'}},
+        ],
+        'workspace': {'gid': '1', 'name': 'Acme'},
+    }
+    task.update(overrides)
+    return task
+
+
+def test_flatten_nested_dicts_and_lists():
+    flattener = TaskFlattener(['gid', 'assignee_name', 'workspace_gid', 'followers_name', 'memberships_section_name', 'memberships_project_gid'])
+
+    assert flattener.flatten(make_task('1')) == {
+        'gid': '1',
+        'assignee_name': 'Ada',
+        'workspace_gid': '1',
+        'followers_name': 'Ada, Grace',
+        'memberships_section_name': 'Doing, Triage',
+        'memberships_project_gid': '10, 11',
+    }
+
+
+def test_column_names_follow_helper_flatten_dict():
+    # columns outside lists hold the same value helper_flatten_dict gives them
+    task = make_task('1', parent={'gid': '0', 'name': 'Task 0'})
+    flat = AsanaClient.__new__(AsanaClient).helper_flatten_dict(task)
+    columns = [column for column in flat if not column.startswith(('followers', 'memberships'))]
+
+    assert TaskFlattener(columns).flatten(task) == {column: flat[column] for column in columns}
+
+
+def test_the_longest_key_wins():
+    # permalink_url is a key of its own, not permalink + url
+    flattener = TaskFlattener(['permalink_url'])
+
+    assert flattener.flatten(make_task('1')) == {'permalink_url': 'https://app.asana.com/0/0/1/f'}
+
+
+def test_missing_and_null_values_are_none():
+    flattener = TaskFlattener(['parent_gid', 'assignee_name', 'due_on', 'followers_name'])
+
+    assert flattener.flatten(make_task('1', assignee=None, followers=[])) == {
+        'parent_gid': None,
+        'assignee_name': None,
+        'due_on': None,
+        'followers_name': None,
+    }
+
+
+def test_a_column_is_resolved_by_the_first_task_that_has_it():
+    flattener = TaskFlattener(['parent_gid', 'parent_name'])
+    tasks = [make_task('1'), make_task('2', parent={'gid': '1', 'name': 'Task 1'}), make_task('3')]
+
+    assert flattener.flatten_batch(tasks) == {'parent_gid': [None, '1', None], 'parent_name': [None, 'Task 1', None]}
+
+
+def test_flatten_batch_matches_flatten():
+    columns = ['gid', 'name', 'permalink_url', 'assignee_gid', 'parent_gid', 'followers_gid', 'memberships_section_gid', 'workspace_name']
+    tasks = [make_task(str(gid)) for gid in range(5)]
+    tasks[1]['assignee'] = None
+    tasks[3]['parent'] = {'gid': '0', 'name': 'Task 0'}
+    del tasks[4]['followers']
+
+    batch = TaskFlattener(columns).flatten_batch(tasks)
+    single = TaskFlattener(columns)
+    assert [dict(zip(columns, row)) for row in zip(*batch.values())] == [single.flatten(task) for task in tasks]
+
+
+def test_list_values_as_python_lists():
+    flattener = TaskFlattener(['followers_name', 'memberships_section_gid'], list_sep=None)
+
+    assert flattener.flatten(make_task('1')) == {'followers_name': ['Ada', 'Grace'], 'memberships_section_gid': ['20', '21']}
+
+
+DEFINITIONS = [
+    {'gid': '7001', 'name': 'Priority', 'resource_subtype': 'enum'},
+    {'gid': '7002', 'name': 'Estimate (h)', 'resource_subtype': 'number'},
+    {'gid': '7003', 'name': 'Launch date', 'resource_subtype': 'date'},
+    {'gid': '7004', 'name': 'Reviewers', 'resource_subtype': 'people'},
+    {'gid': '7005', 'name': 'priority', 'resource_subtype': 'text'},
+]
+
+
+def test_custom_fields_are_typed_columns():
+    flattener = CustomFieldFlattener(DEFINITIONS)
+    task = {'custom_fields': [
+        {'gid': '7001', 'resource_subtype': 'enum', 'enum_value': {'name': 'High'}},
+        {'gid': '7002', 'resource_subtype': 'number', 'number_value': 2.5},
+        {'gid': '7003', 'resource_subtype': 'date', 'date_value': {'date': None, 'date_time': '2024-03-04T10:00:00.000Z'}},
+        {'gid': '7004', 'resource_subtype': 'people', 'people_value': [{'name': 'Ada'}, {'name': 'Grace'}]},
+        {'gid': '7999', 'resource_subtype': 'text', 'text_value': 'not defined'},
+    ]}
+
+    assert flattener.flatten(task) == {
+        'cf_priority': 'High',
+        'cf_estimate_h': 2.5,
+        'cf_launch_date': '2024-03-04',
+        'cf_reviewers': 'Ada, Grace',
+        'cf_priority_7005': None,
+    }
+    assert flattener.columns_of_type('number') == ['cf_estimate_h']
+    assert flattener.columns_of_type('date') == ['cf_launch_date']
+
+
+def test_custom_fields_without_definitions_follow_the_tasks():
+    flattener = CustomFieldFlattener()
+    tasks = [
+        {'custom_fields': [{'gid': '7001', 'name': 'Priority', 'type': 'enum', 'enum_value': None}]},
+        {'custom_fields': [{'gid': '7006', 'name': 'Tags', 'resource_subtype': 'multi_enum', 'multi_enum_values': [{'name': 'a'}, {'name': 'b'}]}]},
+        {},
+    ]
+
+    assert [flattener.flatten(task) for task in tasks] == [{'cf_priority': None}, {'cf_tags': 'a, b'}, {}]
+    assert flattener.columns == ['cf_priority', 'cf_tags']
+
+
+def test_custom_fields_flatten_batch_matches_flatten():
+    tasks = [
+        {'custom_fields': [{'gid': '7001', 'resource_subtype': 'enum', 'enum_value': {'name': 'High'}}]},
+        {'custom_fields': [{'gid': '7002', 'resource_subtype': 'number', 'number_value': 1}]},
+        {},
+    ]
+
+    for definitions in [DEFINITIONS, None]:
+        batch = CustomFieldFlattener(definitions).flatten_batch(tasks)
+        single = CustomFieldFlattener(definitions)
+        rows = [single.flatten(task) for task in tasks]
+        assert batch == {column: [row.get(column) for row in rows] for column in single.columns}
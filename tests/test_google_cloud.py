@@ -0,0 +1,175 @@
+# test_google_cloud.py
+
+import threading
+
+import pandas as pd
+import pytest
+
+from classes.GoogleCloud import GoogleCloudClient
+from classes.Instrumentation import Metrics
+
+
+def query_builder_client():
+    # the query builders don't touch BigQuery, so the client is built without credentials
+    return GoogleCloudClient.__new__(GoogleCloudClient)
+
+
+def squash(query):
+    return ' '.join(query.split())
+
+
+def test_merge_query_builder():
+    gcc = query_builder_client()
+    query = squash(gcc.merge_query_builder(
+        'p.d.tasks', 'p.d.tasks_staging', 'permalink_url', ['permalink_url', 'name', 'modified_at', 'change_status', 'last_change_seen']
+    ))
+
+    changed = "(T.`modified_at` IS DISTINCT FROM S.`modified_at` OR T.change_status = 'deleted')"
+    assert query == squash(f"""
+        MERGE `p.d.tasks` T
+        USING (SELECT * FROM `p.d.tasks_staging` WHERE TRUE QUALIFY ROW_NUMBER() OVER (PARTITION BY `permalink_url` ORDER BY `modified_at` DESC) = 1) S
+        ON T.`permalink_url` = S.`permalink_url`
+        WHEN MATCHED THEN UPDATE SET
+            `name` = S.`name`,
+            `modified_at` = S.`modified_at`,
+            change_status = IF({changed}, 'updated', 'existing'),
+            last_change_seen = IF({changed}, @insert_timestamp, T.last_change_seen)
+        WHEN NOT MATCHED BY TARGET THEN
+            INSERT (`permalink_url`, `name`, `modified_at`, change_status, last_change_seen)
+            VALUES (S.`permalink_url`, S.`name`, S.`modified_at`, 'new', @insert_timestamp)
+        WHEN NOT MATCHED BY SOURCE AND T.change_status IS DISTINCT FROM 'deleted' THEN
+            UPDATE SET change_status = 'deleted', last_change_seen = @insert_timestamp
+    """)
+
+
+def test_merge_query_builder_without_delete_detection():
+    gcc = query_builder_client()
+    query = squash(gcc.merge_query_builder('p.d.tasks', 'p.d.tasks_staging', 'gid', ['gid', 'updated_at'], change_column='updated_at', detect_deletes=False))
+
+    assert 'NOT MATCHED BY SOURCE' not in query
+    assert "T.`updated_at` IS DISTINCT FROM S.`updated_at`" in query
+    # the key is matched on, never updated
+    assert 'UPDATE SET `updated_at` = S.`updated_at`, change_status' in query
+
+
+def test_merge_query_builder_keeps_the_first_staged_row_per_key():
+    gcc = query_builder_client()
+    query = squash(gcc.merge_query_builder(
+        'p.d.tasks', 'p.d.tasks_staging', 'permalink_url', ['permalink_url', 'modified_at'], order_column=gcc.STAGING_ROW_COLUMN
+    ))
+
+    assert "QUALIFY ROW_NUMBER() OVER (PARTITION BY `permalink_url` ORDER BY `_staging_row`) = 1) S" in query
+    # the row number only picks the row, it isn't merged into the target
+    assert 'S.`_staging_row`' not in query
+
+
+def test_staging_table_ids_are_unique_per_load():
+    gcc = query_builder_client()
+    staging_table_ids = {gcc.staging_table_id('p.d.tasks') for _ in range(100)}
+
+    assert len(staging_table_ids) == 100
+    assert all(staging_table_id.startswith('p.d.tasks_staging_') for staging_table_id in staging_table_ids)
+
+
+def test_in_filter_builder_quotes_values():
+    gcc = query_builder_client()
+
+    assert gcc.in_filter_builder('gid', [1, '2']) == "gid IN ('1', '2')"
+    assert gcc.in_filter_builder('name', ["it's", 'a\\b']) == "name IN ('it\\'s', 'a\\\\b')"
+
+
+class FailingBigQueryClient:
+    # fails every call except delete_table, which records the deleted tables
+    def __init__(self):
+        self.deleted = []
+
+    def get_table(self, table_id):
+        raise RuntimeError('BigQuery is down')
+
+    def delete_table(self, table_id, not_found_ok=False):
+        self.deleted.append(table_id)
+
+
+def test_a_failed_merge_drops_the_staging_table():
+    gcc = query_builder_client()
+    gcc.bq_client = FailingBigQueryClient()
+
+    with pytest.raises(RuntimeError):
+        gcc.merge_from_staging('p.d.tasks', 'p.d.tasks_staging_1', 'permalink_url', '2024-03-04 00:00:00')
+    assert gcc.bq_client.deleted == ['p.d.tasks_staging_1']
+
+
+def test_a_failed_staging_load_drops_the_staging_table():
+    gcc = query_builder_client()
+    gcc.bq_client = FailingBigQueryClient()
+    loaded = []
+
+    def write_to_bigquery_tables(data, write_disposition=None):
+        loaded.append(data['table_id'])
+        raise RuntimeError('load job failed')
+
+    gcc.write_to_bigquery_tables = write_to_bigquery_tables
+    with pytest.raises(RuntimeError):
+        gcc.upsert({'table_id': 'p.d.tasks', 'data': pd.DataFrame({'permalink_url': ['a']})}, 'permalink_url', '2024-03-04 00:00:00')
+    assert gcc.bq_client.deleted == loaded
+
+
+class LoadJob:
+    state = 'DONE'
+    output_bytes = 0
+
+    def __init__(self, rows):
+        self.output_rows = rows
+
+    def result(self):
+        return self
+
+
+class RecordingBigQueryClient:
+    # records the (first row, rows, write disposition) of every load job
+    def __init__(self):
+        self.loads = []
+        self.lock = threading.Lock()
+
+    def load_table_from_dataframe(self, df, table_id, job_config):
+        with self.lock:
+            self.loads.append((int(df['gid'].iloc[0]), len(df), job_config))
+        return LoadJob(len(df))
+
+
+def load_client(load_chunk_size):
+    gcc = query_builder_client()
+    gcc.bq_client = RecordingBigQueryClient()
+    gcc.metrics = Metrics()
+    gcc.write_disposition = 'WRITE_TRUNCATE'
+    gcc.load_chunk_size = load_chunk_size
+    gcc.max_load_workers = 2
+    # the job config is only passed through to the client here, so the write disposition stands in for it
+    gcc.bq_job_config = lambda load_schema, write_disposition=None: write_disposition or gcc.write_disposition
+    return gcc
+
+
+def test_appended_frames_load_in_concurrent_chunks():
+    gcc = load_client(load_chunk_size=4)
+    data = {'table_id': 'p.d.tasks_staging_1', 'data': pd.DataFrame({'gid': range(10)}), 'load_schema': ['gid']}
+
+    assert gcc.write_to_bigquery_tables(data, write_disposition='WRITE_APPEND').endswith('in 3 load job(s)')
+    assert sorted(gcc.bq_client.loads) == [(0, 4, 'WRITE_APPEND'), (4, 4, 'WRITE_APPEND'), (8, 2, 'WRITE_APPEND')]
+
+
+def test_a_truncating_load_stays_one_job():
+    gcc = load_client(load_chunk_size=4)
+    data = {'table_id': 'p.d.tasks', 'data': pd.DataFrame({'gid': range(10)}), 'load_schema': ['gid']}
+
+    gcc.write_to_bigquery_tables(data)
+    assert gcc.bq_client.loads == [(0, 10, 'WRITE_TRUNCATE')]
+
+
+def test_upsert_appends_the_batch_to_its_staging_table():
+    gcc = load_client(load_chunk_size=4)
+    merged = []
+    gcc.merge_from_staging = lambda table_id, staging_table_id, *args: merged.append(staging_table_id)
+
+    gcc.upsert({'table_id': 'p.d.tasks', 'data': pd.DataFrame({'gid': range(10)}), 'load_schema': ['gid']}, 'gid', '2024-03-04 00:00:00')
+    assert sorted(gcc.bq_client.loads) == [(0, 4, 'WRITE_APPEND'), (4, 4, 'WRITE_APPEND'), (8, 2, 'WRITE_APPEND')]
+    assert len(merged) == 1 and merged[0].startswith('p.d.tasks_staging_')
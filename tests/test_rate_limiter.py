@@ -0,0 +1,66 @@
+# test_rate_limiter.py
+
+import multiprocessing
+import time
+
+from classes.RateLimiter import SharedTokenBucket, TokenBucket
+
+
+def timed_acquires(bucket, n):
+    start = time.monotonic()
+    for _ in range(n):
+        bucket.acquire()
+    return time.monotonic() - start
+
+
+def test_burst_is_free_then_tokens_come_at_the_rate():
+    bucket = TokenBucket(requests_per_minute=1200, burst=5)
+    assert timed_acquires(bucket, 5) < 0.2
+    # 20 tokens per second
+    assert timed_acquires(bucket, 10) >= 0.45
+
+
+def test_pause_holds_every_token():
+    bucket = TokenBucket(requests_per_minute=60000, burst=10)
+    bucket.pause(0.3)
+    assert timed_acquires(bucket, 1) >= 0.29
+
+
+def test_shorter_pause_does_not_cut_a_longer_one():
+    bucket = TokenBucket(requests_per_minute=60000)
+    bucket.pause(0.3)
+    bucket.pause(0.05)
+    assert timed_acquires(bucket, 1) >= 0.29
+
+
+def acquire_in_process(bucket, n, done):
+    for _ in range(n):
+        bucket.acquire()
+    done.put(time.monotonic())
+
+
+def test_shared_bucket_is_one_budget_across_processes():
+    # 20 tokens per second shared by 2 processes taking 6 each: 12 tokens, the first one free
+    bucket = SharedTokenBucket(requests_per_minute=1200, burst=1)
+    done = multiprocessing.Queue()
+    start = time.monotonic()
+    processes = [multiprocessing.Process(target=acquire_in_process, args=(bucket, 6, done)) for _ in range(2)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(10)
+        assert process.exitcode == 0
+    finished_at = max(done.get(timeout=1) for _ in processes)
+    assert finished_at - start >= 0.5
+
+
+def test_shared_bucket_pause_reaches_other_processes():
+    bucket = SharedTokenBucket(requests_per_minute=60000, burst=10)
+    bucket.pause(0.3)
+    done = multiprocessing.Queue()
+    start = time.monotonic()
+    process = multiprocessing.Process(target=acquire_in_process, args=(bucket, 1, done))
+    process.start()
+    process.join(10)
+    assert process.exitcode == 0
+    assert done.get(timeout=1) - start >= 0.29
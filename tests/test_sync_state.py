@@ -0,0 +1,41 @@
+# test_sync_state.py
+
+import json
+
+from classes.SyncState import SyncStateStore
+
+
+def test_sync_state_round_trip(tmp_path):
+    path = str(tmp_path / 'state' / 'sync_state.json')
+    store = SyncStateStore(path)
+    store.set('modified_at', '10', '2024-03-04T10:00:00Z')
+    store.save()
+
+    assert SyncStateStore(path).get('modified_at', '10') == '2024-03-04T10:00:00Z'
+    assert SyncStateStore(path).get('modified_at', '11', 'never') == 'never'
+
+
+def test_sync_state_is_kept_in_memory_until_saved(tmp_path):
+    path = str(tmp_path / 'sync_state.json')
+    store = SyncStateStore(path)
+    store.set('modified_at', '10', '2024-03-04T10:00:00Z')
+
+    assert SyncStateStore(path).get('modified_at', '10') is None
+    store.save()
+    with open(path) as f:
+        assert json.load(f) == {'modified_at': {'10': '2024-03-04T10:00:00Z'}}
+
+
+def test_saves_merge_with_other_stores(tmp_path):
+    path = str(tmp_path / 'sync_state.json')
+    first = SyncStateStore(path)
+    second = SyncStateStore(path)
+    first.set('events_sync', '10', 'sync-a')
+    second.set('events_sync', '11', 'sync-b')
+    first.save()
+    second.save()
+
+    # neither save drops the other's key, and the later one picks up what was saved in the meantime
+    assert second.get('events_sync', '10') == 'sync-a'
+    assert SyncStateStore(path).state == {'events_sync': {'10': 'sync-a', '11': 'sync-b'}}
+
@@ -0,0 +1,61 @@
+# test_task_store.py
+
+from classes.TaskStore import TaskStore
+
+
+def test_task_store_adds_columns_as_they_appear():
+    store = TaskStore(lambda task: task)
+    store.extend([{'gid': '1'}, {'gid': '2', 'parent_gid': '1'}, {'gid': '3', 'assignee_name': 'Ada'}])
+
+    assert len(store) == 3
+    assert store.column('parent_gid') == [None, '1', None]
+    assert store.to_dataframe().to_dict('list') == {
+        'gid': ['1', '2', '3'],
+        'parent_gid': [None, '1', None],
+        'assignee_name': [None, None, 'Ada'],
+    }
+
+
+def test_task_store_flattens_each_task():
+    store = TaskStore(lambda task: {'gid': task['gid'], 'assignee_name': (task.get('assignee') or {}).get('name')})
+    store.append({'gid': '1', 'assignee': {'gid': '100', 'name': 'Ada'}})
+    store.append({'gid': '2', 'assignee': None})
+
+    assert store.to_dataframe().to_dict('list') == {'gid': ['1', '2'], 'assignee_name': ['Ada', None]}
+
+
+def test_task_store_with_fixed_columns():
+    store = TaskStore(lambda task: task, columns=['gid', 'name'])
+    store.extend([{'gid': '1', 'notes': 'x'}, {'name': 'Task 2'}])
+
+    assert store.to_dataframe().to_dict('list') == {'gid': ['1', None], 'name': [None, 'Task 2']}
+
+
+def test_task_store_interns_short_strings():
+    store = TaskStore(lambda task: task, intern_max_length=8)
+    store.extend({'team_name': ''.join(['Ops', name])} for name in ['Team', 'Team', 'Team, but longer', 'Team, but longer'])
+
+    values = store.column('team_name')
+    assert values[0] is values[1]
+    assert values[2] == values[3] and values[2] is not values[3]
+
+
+def test_extend_columns_adds_flattened_batches():
+    store = TaskStore(lambda task: task)
+    store.extend([{'gid': '1'}, {'gid': '2', 'parent_gid': '1'}])
+    store.extend_columns({'gid': ['3', '4'], 'assignee_name': ['Ada', None]})
+
+    assert len(store) == 4
+    assert store.to_dataframe().to_dict('list') == {
+        'gid': ['1', '2', '3', '4'],
+        'parent_gid': [None, '1', None, None],
+        'assignee_name': [None, None, 'Ada', None],
+    }
+
+
+def test_extend_columns_with_fixed_columns():
+    store = TaskStore(None, columns=['gid', 'name'])
+    store.extend_columns({'gid': ['1', '2'], 'notes': ['x', 'y']})
+    store.extend_columns({'name': ['Task 3']})
+
+    assert store.to_dataframe().to_dict('list') == {'gid': ['1', '2', None], 'name': [None, None, 'Task 3']}
@@ -0,0 +1,28 @@
+# test_transforms.py
+
+import pandas as pd
+
+from classes.Transforms import to_datetime_columns, weeks_ago_buckets
+
+
+def test_to_datetime_columns_floors_to_the_day_by_default():
+    df = pd.DataFrame({'due_on': ['2024-03-04', '2024-03-05T17:30:00.000Z', 'not a date', None]})
+
+    values = to_datetime_columns(df, ['due_on'])['due_on']
+    assert list(values[:2]) == [pd.Timestamp('2024-03-04'), pd.Timestamp('2024-03-05')]
+    assert values[2:].isna().all()
+
+
+def test_to_datetime_columns_keeps_full_timestamps_without_floor():
+    df = pd.DataFrame({'modified_at': ['2024-03-04T09:00:00.000Z', '2024-03-04T17:30:00.000+01:00']})
+
+    values = to_datetime_columns(df, ['modified_at'], floor=None)['modified_at']
+    # tz-naive UTC
+    assert list(values) == [pd.Timestamp('2024-03-04 09:00:00'), pd.Timestamp('2024-03-04 16:30:00')]
+
+
+def test_weeks_ago_buckets():
+    now = pd.Timestamp('2024-03-29')
+    dates = pd.Series(pd.to_datetime(['2024-03-28', '2024-03-15', '2024-02-20', None]))
+
+    assert list(weeks_ago_buckets(dates, now)) == ['0', '2', '4+', None]